@@ -2,6 +2,7 @@
 
 from printify_client import PrintifyClient
 from logic import get_gemini_vision_pro_model  # Reusing the Gemini logic
+from llm_cache import llm_cache
 
 def generate_ad_copy(product_id: str, platform: str):
     """
@@ -34,11 +35,11 @@ def generate_ad_copy(product_id: str, platform: str):
 
     try:
         model = get_gemini_vision_pro_model()
-        response = model.generate_content([prompt, {"url": image_url}])
+        response_text = llm_cache.generate_text(model, [prompt, {"url": image_url}])
         
         # Extracting and parsing the JSON from the response
         import json
-        clean_response = response.text.strip().replace("```json", "").replace("```", "")
+        clean_response = response_text.strip().replace("```json", "").replace("```", "")
         ad_copy = json.loads(clean_response)
         
         return ad_copy
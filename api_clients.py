@@ -2,15 +2,30 @@
 
 import os
 import requests
-import google.generativeai as genai
+from llm_cache import llm_cache
+from model_registry import model_registry
+from image_store import image_store
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+class PrintifyApiError(Exception):
+    """A Printify request the API rejected; the message starts with "HTTP <status>"."""
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
 class PrintifyApiClient:
-    """A client to handle all communications with the Printify API."""
-    def __init__(self):
+    """
+    A client to handle all communications with the Printify API.
+    Failed requests return None, or raise when `raise_errors` is set (PrintifyApiError
+    for rejected requests, the requests exception for network errors), so bulk
+    pipelines can log why a row failed.
+    """
+    def __init__(self, raise_errors=False):
+        self.raise_errors = raise_errors
         self.api_key = os.getenv("PRINTIFY_API_TOKEN")
         self.shop_id = os.getenv("PRINTIFY_SHOP_ID")
         self.base_url = "https://api.printify.com/v1"
@@ -21,16 +36,22 @@ class PrintifyApiClient:
             "Content-Type": "application/json",
         }
 
-    def _request(self, method, endpoint, payload=None):
-        """Generic request handler."""
+    def _request(self, method, endpoint, payload=None, data=None):
+        """Generic request handler. Pass `data` to send an already-serialized JSON body."""
         try:
             url = f"{self.base_url}{endpoint}"
-            response = requests.request(method, url, headers=self.headers, json=payload)
+            response = requests.request(method, url, headers=self.headers, json=payload, data=data)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.HTTPError as e:
+            if self.raise_errors:
+                raise PrintifyApiError(
+                    e.response.status_code, f"HTTP {e.response.status_code} for {method} {endpoint}: {e.response.text[:500]}"
+                ) from e
             print(f"❌ HTTP Error for {method} {endpoint}: {e.response.status_code} - {e.response.text}")
         except requests.exceptions.RequestException as e:
+            if self.raise_errors:
+                raise
             print(f"❌ Request failed for {method} {endpoint}: {e}")
         return None
 
@@ -41,6 +62,10 @@ class PrintifyApiClient:
     def get_all_products(self):
         """Fetches all products from the shop."""
         return self._request("GET", f"/shops/{self.shop_id}/products.json")
+
+    def get_products_page(self, page=1, limit=50):
+        """Fetches one page of products; the response includes `last_page` and `total`."""
+        return self._request("GET", f"/shops/{self.shop_id}/products.json?page={page}&limit={limit}")
     
     def update_product(self, product_id, payload):
         """Updates a product with a given payload."""
@@ -50,10 +75,31 @@ class PrintifyApiClient:
         """Creates a new product."""
         return self._request("POST", f"/shops/{self.shop_id}/products.json", payload=payload)
 
+    def create_product_json(self, body):
+        """Creates a new product from a pre-serialized JSON payload."""
+        return self._request("POST", f"/shops/{self.shop_id}/products.json", data=body.encode('utf-8'))
+
+    def upload_image(self, file_name, contents):
+        """Uploads a base64-encoded image to the media library."""
+        return self._request("POST", "/uploads/images.json", payload={"file_name": file_name, "contents": contents})
+
+    def get_catalog_variants(self, blueprint_id, print_provider_id):
+        """Fetches the variants a print provider offers for a blueprint."""
+        return self._request("GET", f"/catalog/blueprints/{blueprint_id}/print_providers/{print_provider_id}/variants.json")
+
     def get_orders(self, status="any"):
         """Fetches orders from the shop, filtering by status."""
         return self._request("GET", f"/shops/{self.shop_id}/orders.json?status={status}")
 
+    def get_orders_page(self, page=1, limit=10, status=None):
+        """Fetches one page of orders, newest first, optionally filtered by status."""
+        status_filter = f"&status={status}" if status else ""
+        return self._request("GET", f"/shops/{self.shop_id}/orders.json?page={page}&limit={limit}{status_filter}")
+
+    def get_order(self, order_id):
+        """Fetches a single order by its ID."""
+        return self._request("GET", f"/shops/{self.shop_id}/orders/{order_id}.json")
+
     def send_to_production(self, order_id):
         """Sends an external order to production."""
         endpoint = f"/shops/{self.shop_id}/orders/{order_id}/send_to_production.json"
@@ -63,18 +109,28 @@ class PrintifyApiClient:
 class GeminiApiClient:
     """A client to handle communications with the Google Gemini API."""
     def __init__(self):
-        self.api_key = os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
-            raise ValueError("Error: GEMINI_API_KEY must be set in .env file.")
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-pro')
-
-    def generate_content(self, prompt):
-        """Generates content based on a given prompt."""
+        # Shared across clients; raises ValueError if GEMINI_API_KEY is not set.
+        self.model = model_registry.get("text")
+
+    def generate_content(self, prompt, cache=False):
+        """Generates content based on a given prompt; pass cache=True for prompts with one right answer."""
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            return llm_cache.generate_text(self.model, prompt, cache=cache)
         except Exception as e:
             print(f"❌ Gemini content generation failed: {e}")
             return None
 
+    def generate_content_with_image(self, prompt, image_url, size=512, cache=False):
+        """
+        Generates content from a prompt plus an image. The image is downloaded
+        once into the local image store and sent as its `size` px thumbnail.
+        """
+        try:
+            record = image_store.store_url(image_url)
+            with open(image_store.thumbnail_path(record["digest"], size), "rb") as f:
+                image_part = {"mime_type": "image/webp", "data": f.read()}
+            return llm_cache.generate_text(model_registry.get("vision"), [prompt, image_part], cache=cache)
+        except Exception as e:
+            print(f"❌ Gemini image content generation failed: {e}")
+            return None
+
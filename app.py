@@ -1,26 +1,73 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, session, flash, send_file
+from flask import Flask, render_template, jsonify, request, redirect, url_for, session, flash, send_file, Response, stream_with_context
 from user_database import UserDB
-from subscriptions import SUBSCRIPTION_TIERS, has_access
-from design_agent import generate_image_from_replicate, generate_ai_design
+from subscriptions import SUBSCRIPTION_TIERS
+from entitlements import Entitlements
+from quota_meter import quota_meter, tier_limit, FEATURE_WINDOWS
+from design_agent import generate_image_from_replicate, generate_ai_design, generate_design_batch, prediction_manager, BATCH_VARIANTS
+from prediction_manager import verify_webhook
 from civitai_client import CivitaiClient
 from legal_checker import check_for_trademarked_terms, check_for_patent_infringement, generate_legal_disclaimer
+from werkzeug.utils import secure_filename
 from social_media_agent import SocialMediaAgent
 from seo_agent import SEOAgent
 from legal_tech import LegalTechAgent
-from jobs_manager import jobs_manager
+from jobs_manager import jobs_manager, JobQueueFull, PRIORITY_HIGH, PRIORITY_LOW
+from order_analytics import OrderAnalytics
+from image_store import image_store, is_allowed_url
+from llm_cache import llm_cache
+from model_registry import model_registry
+from seo_batch import SeoRunStore
+from scheduler import start_scheduler
 from functools import wraps
-import threading
+import json
 import os
+import uuid
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key' # Change this!
 app.config['UPLOAD_FOLDER'] = 'uploads'
 
 user_db = UserDB()
+entitlements = Entitlements(user_db)
 civitai_client = CivitaiClient()
 social_media_agent = SocialMediaAgent()
 seo_agent = SEOAgent()
 legal_tech_agent = LegalTechAgent()
+order_analytics = OrderAnalytics()
+seo_runs = SeoRunStore()
+
+LEGAL_TECH_JOB_TIMEOUT = 600
+LEGAL_TECH_TASKS = {
+    'contract_generation': legal_tech_agent.generate_contract,
+    'ediscovery': legal_tech_agent.run_ediscovery,
+    'legal_research': legal_tech_agent.conduct_legal_research,
+}
+for task_name, func in LEGAL_TECH_TASKS.items():
+    jobs_manager.register_task(f"legal_tech.{task_name}", func)
+
+# Stored images are content-addressed and never change, so browsers may keep them for a year.
+IMAGE_CACHE_SECONDS = 365 * 24 * 3600
+
+# An event stream ends before gunicorn's 30 s worker timeout; browsers reconnect with Last-Event-ID.
+EVENT_STREAM_SECONDS = 20
+
+# Slow AI calls run as background jobs so they never hold a web worker.
+AI_JOB_TIMEOUT = 300
+
+@jobs_manager.task("legal.disclaimer")
+def generate_disclaimer_job(product_type):
+    return {"disclaimer": generate_legal_disclaimer(product_type)}
+
+jobs_manager.register_task("design.generate_image", generate_image_from_replicate)
+jobs_manager.register_task("design.generate_ai_design", generate_ai_design)
+jobs_manager.register_task("design.generate_batch", generate_design_batch)
+jobs_manager.register_task("social_media.post", social_media_agent.post_to_social_media, max_attempts=1)
+jobs_manager.start()
+model_registry.warm_up()
+# Every worker starts one; a shared lease lets only one of them run the scheduled jobs.
+# Set RUN_SCHEDULER=0 on hosts that should not run them.
+if os.environ.get("RUN_SCHEDULER", "1") != "0":
+    start_scheduler()
 
 def login_required(f):
     @wraps(f)
@@ -34,20 +81,63 @@ def subscription_required(feature):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            user = user_db.get_user(session['username'])
-            if not has_access(user.subscription_tier, feature):
+            if entitlements.current() is None:
+                session.clear()
+                return redirect(url_for('login'))
+            if not entitlements.allows(feature):
                 flash(f"You need to upgrade your subscription to access this feature.", "warning")
                 return redirect(url_for('upgrade'))
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
-def run_background_job(job_id, target, args):
+def quota_required(feature, amount=1):
+    """
+    Consumes one use of a metered feature, answering 429 once the tier's limit is reached.
+    The use is reserved before the view runs, so concurrent requests cannot overshoot
+    the limit, and refunded if the view fails or answers with an error status.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            entitlement = entitlements.current()
+            if entitlement is None:
+                session.clear()
+                return redirect(url_for('login'))
+            allowed, remaining = quota_meter.consume(entitlement["username"], entitlement["tier"], feature, amount)
+            if not allowed:
+                return jsonify({"error": f"You have reached your plan's limit for {feature.replace('_', ' ')}. Upgrade for more."}), 429
+            try:
+                response = app.make_response(f(*args, **kwargs))
+            except Exception:
+                quota_meter.refund(entitlement["username"], entitlement["tier"], feature, amount)
+                raise
+            if response.status_code >= 400:
+                quota_meter.refund(entitlement["username"], entitlement["tier"], feature, amount)
+            elif remaining is not None:
+                response.headers["X-Quota-Remaining"] = str(remaining)
+            return response
+        return decorated_function
+    return decorator
+
+def get_owned_job(job_id):
+    """Returns the job if the current user submitted it, else None (callers answer 404 either way)."""
+    job = jobs_manager.get_job(job_id)
+    if job is None or job.get("owner") is None or job["owner"] != session.get("username"):
+        return None
+    return job
+
+def submit_job_response(task, args=(), kwargs=None, priority=PRIORITY_HIGH, timeout=AI_JOB_TIMEOUT):
+    """Queues a background job (an interactive AI call by default) and returns a 202 with where to follow it."""
     try:
-        result = target(*args)
-        jobs_manager.update_job_status(job_id, 'completed', result)
-    except Exception as e:
-        jobs_manager.update_job_status(job_id, 'failed', str(e))
+        job_id = jobs_manager.submit(task, args, kwargs, priority=priority, timeout=timeout, owner=session.get("username"))
+    except JobQueueFull:
+        return jsonify({"error": "The server is busy. Please try again shortly."}), 503
+    return jsonify({
+        "job_id": job_id,
+        "status_url": url_for('api_job_status', job_id=job_id),
+        "events_url": url_for('api_job_events', job_id=job_id),
+    }), 202
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
@@ -72,8 +162,7 @@ def logout():
 @app.route("/")
 @login_required
 def dashboard():
-    failed_jobs = jobs_manager.get_failed_jobs()
-    return render_template("dashboard.html", recommendations=[], failed_jobs=len(failed_jobs))
+    return render_template("dashboard.html", recommendations=[], failed_jobs=jobs_manager.count("failed"))
 
 @app.route("/design-studio")
 @login_required
@@ -101,12 +190,24 @@ def api_generate_image():
     if not all([model_version, prompt]):
         return jsonify({"error": "Model version and prompt are required."}), 400
 
-    image_result = generate_image_from_replicate(model_version, prompt, lora)
+    return submit_job_response("design.generate_image", (model_version, prompt, lora))
 
-    if "error" in image_result:
-        return jsonify(image_result), 500
-    
-    return jsonify(image_result)
+@app.route("/webhooks/replicate", methods=["POST"])
+def replicate_webhook():
+    """
+    Receives prediction completions from Replicate (see REPLICATE_WEBHOOK_URL).
+    Only webhooks signed with REPLICATE_WEBHOOK_SECRET are accepted, since their
+    output URLs are downloaded into the image store.
+    """
+    secret = os.environ.get("REPLICATE_WEBHOOK_SECRET")
+    if not secret:
+        return jsonify({"error": "Webhooks are not configured on the server."}), 403
+    if not verify_webhook(secret, request.headers, request.get_data()):
+        return jsonify({"error": "Invalid webhook signature."}), 403
+    payload = request.get_json(silent=True) or {}
+    if not prediction_manager.handle_webhook(payload):
+        return jsonify({"error": "Unknown prediction."}), 404
+    return jsonify({"status": "ok"})
 
 @app.route("/api/design/generate-ai-design", methods=["POST"])
 @login_required
@@ -116,12 +217,55 @@ def api_generate_ai_design():
     if not prompt:
         return jsonify({"error": "A prompt is required."}), 400
 
-    image_result = generate_ai_design(prompt)
+    return submit_job_response("design.generate_ai_design", (prompt,))
 
-    if "error" in image_result:
-        return jsonify(image_result), 500
-    
-    return jsonify(image_result)
+@app.route("/api/design/generate-batch", methods=["POST"])
+@login_required
+@subscription_required('enterprise')
+def api_generate_design_batch():
+    prompt = request.json.get("prompt")
+    count = request.json.get("count", BATCH_VARIANTS)
+    replicate_model = request.json.get("model_version")
+    if not prompt:
+        return jsonify({"error": "A prompt is required."}), 400
+    try:
+        count = int(count)
+    except (TypeError, ValueError):
+        return jsonify({"error": "The number of variations must be a whole number."}), 400
+
+    return submit_job_response("design.generate_batch", (prompt, count, replicate_model))
+
+@app.route("/images/<digest>")
+@app.route("/images/<digest>/<int:size>")
+@login_required
+def stored_image(digest, size=None):
+    """Serves a stored generated image, or one of its precomputed thumbnails."""
+    path = image_store.path(digest) if size is None else image_store.thumbnail_path(digest, size)
+    if path is None or not os.path.exists(path):
+        return jsonify({"error": "Image not found."}), 404
+    response = send_file(path, max_age=IMAGE_CACHE_SECONDS, conditional=True)
+    response.headers["Cache-Control"] = f"private, max-age={IMAGE_CACHE_SECONDS}, immutable"
+    return response
+
+@app.route("/api/images/duplicates", methods=["POST"])
+@login_required
+def api_image_duplicates():
+    """Stores an image by URL (or looks up a digest) and lists near-duplicates already on file."""
+    digest = request.json.get("digest")
+    url = request.json.get("url")
+    if not digest and not url:
+        return jsonify({"error": "An image URL or digest is required."}), 400
+    if not digest:
+        if not is_allowed_url(url):
+            return jsonify({"error": "Only https images hosted by Replicate, OpenAI or Printify can be checked."}), 400
+        try:
+            digest = image_store.store_url(url)["digest"]
+        except Exception as e:
+            print(f"⚠️ Could not store image {url}: {e}")
+            return jsonify({"error": "Could not fetch the image."}), 422
+    elif image_store.get(digest) is None:
+        return jsonify({"error": "Image not found."}), 404
+    return jsonify({"digest": digest, "duplicates": image_store.find_duplicates(digest)})
 
 @app.route("/social-media-manager")
 @login_required
@@ -140,9 +284,7 @@ def api_social_media_post():
     if not all([product_name, product_description, image_url]):
         return jsonify({"error": "Product name, description, and image URL are required."}), 400
 
-    result = social_media_agent.post_to_social_media(product_name, product_description, image_url)
-    
-    return jsonify(result)
+    return submit_job_response("social_media.post", (product_name, product_description, image_url))
 
 @app.route("/legal-dashboard")
 @login_required
@@ -174,34 +316,199 @@ def api_legal_generate_disclaimer():
     if not product_type:
         return jsonify({"error": "Product type is required."}), 400
 
-    disclaimer = generate_legal_disclaimer(product_type)
-    return jsonify({"disclaimer": disclaimer})
+    return submit_job_response("legal.disclaimer", (product_type,))
+
+@app.route("/api/legal/watermark", methods=["POST"])
+@login_required
+@subscription_required('business')
+def api_legal_watermark():
+    """Queues a watermark job on the CPU lane and returns its job ID."""
+    image = request.files.get("image")
+    if not image or not image.filename:
+        return jsonify({"error": "An image file is required."}), 400
+
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Named by a random token, not the upload's filename, so concurrent uploads never overwrite each other.
+    token = uuid.uuid4().hex
+    extension = os.path.splitext(secure_filename(image.filename))[1].lower()
+    image_path = os.path.join(app.config['UPLOAD_FOLDER'], f"watermark_{token}{extension}")
+    image.save(image_path)
+    output_path = os.path.join(app.config['UPLOAD_FOLDER'], f"watermarked_{token}.png")
+    try:
+        job_id = jobs_manager.submit("legal.watermark", (image_path, output_path, request.form.get("text", "Copyright Printify Manager")),
+                                     owner=session.get("username"))
+    except JobQueueFull:
+        return jsonify({"error": "Too many background tasks are queued. Please try again shortly."}), 503
+    return jsonify({"job_id": job_id}), 202
+
+@app.route("/api/legal/watermark/<job_id>")
+@login_required
+def api_legal_watermark_result(job_id):
+    job = get_owned_job(job_id)
+    if job is None or job["task"] != "legal.watermark":
+        return jsonify({"error": "Job not found."}), 404
+    if job["status"] in ("pending", "running"):
+        return jsonify({"id": job_id, "status": job["status"]}), 202
+    if job["status"] != "completed":
+        return jsonify({"id": job_id, "status": job["status"], "error": job["result"]}), 500
+    return send_file(job["result"], mimetype="image/png")
 
 @app.route('/run-legal-tech', methods=['POST'])
 @login_required
 def run_legal_tech():
     legal_tech_task = request.form.get('legal_tech_task')
-    target_map = {
-        'contract_generation': legal_tech_agent.generate_contract,
-        'ediscovery': legal_tech_agent.run_ediscovery,
-        'legal_research': legal_tech_agent.conduct_legal_research,
-    }
-    target = target_map.get(legal_tech_task)
-    if target:
-        job_id = jobs_manager.add_job(target, [])
-        threading.Thread(target=run_background_job, args=(job_id, target, [])).start()
-        flash(f'Legal tech task "{legal_tech_task}" has been started in the background.', 'success')
+    if legal_tech_task in LEGAL_TECH_TASKS:
+        try:
+            jobs_manager.submit(f"legal_tech.{legal_tech_task}", priority=PRIORITY_LOW, timeout=LEGAL_TECH_JOB_TIMEOUT,
+                                owner=session.get("username"))
+            flash(f'Legal tech task "{legal_tech_task}" has been started in the background.', 'success')
+        except JobQueueFull:
+            flash('Too many background tasks are queued. Please try again shortly.', 'warning')
     else:
         flash('Invalid legal tech task selected.', 'danger')
     return redirect(url_for('dashboard'))
 
+@app.route("/api/jobs/<job_id>")
+@login_required
+def api_job_status(job_id):
+    job = get_owned_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    _, progress = jobs_manager.get_progress(job_id)
+    return jsonify({"id": job_id, "status": job["status"], "result": job["result"], "progress": progress})
+
+@app.route("/api/jobs/<job_id>/events")
+@login_required
+def api_job_events(job_id):
+    """
+    Streams the job's progress as Server-Sent Events for up to EVENT_STREAM_SECONDS.
+    The client's EventSource then reconnects and resumes after Last-Event-ID.
+    """
+    if get_owned_job(job_id) is None:
+        return jsonify({"error": "Job not found."}), 404
+    try:
+        since_seq = int(request.headers.get("Last-Event-ID", 0))
+    except ValueError:
+        since_seq = 0
+
+    def stream():
+        yield "retry: 1000\n\n"
+        for event, data in jobs_manager.events(job_id, since_seq=since_seq, max_duration=EVENT_STREAM_SECONDS):
+            if event == "heartbeat":
+                yield ": keep-alive\n\n"
+            elif event == "done":
+                payload = {"id": job_id, "status": data["status"], "result": data["result"]} if data else {"id": job_id, "status": "purged"}
+                yield f"event: done\ndata: {json.dumps(payload)}\n\n"
+            else:
+                yield f"id: {data['seq']}\nevent: progress\ndata: {json.dumps(data)}\n\n"
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+@login_required
+def api_job_cancel(job_id):
+    if get_owned_job(job_id) is None:
+        return jsonify({"error": "Job not found."}), 404
+    if not jobs_manager.cancel(job_id):
+        return jsonify({"error": "Job not found or already finished."}), 409
+    return jsonify({"id": job_id, "status": "cancelled"})
+
+@app.route("/financials")
+@login_required
+def financials():
+    return render_template("financials.html")
+
+@app.route("/api/financials/summary")
+@login_required
+def api_financials_summary():
+    summary = order_analytics.summary()
+    weekly = order_analytics.margin_by("week")
+    return jsonify({
+        "total_orders": summary["total_orders"],
+        "total_revenue": summary["total_revenue"] / 100,
+        "total_cost": summary["total_cost"] / 100,
+        "gross_profit": summary["gross_profit"] / 100,
+        "gross_margin_pct": summary["gross_margin_pct"],
+        "average_order_value": summary["average_order_value"] / 100,
+        "weekly": {
+            "labels": list(weekly.index),
+            "revenue": [value / 100 for value in weekly["revenue"].tolist()],
+            "profit": [value / 100 for value in weekly["margin"].tolist()],
+        },
+    })
+
+@app.route("/api/usage")
+@login_required
+def api_usage():
+    """Current usage and limit of each metered feature for the signed-in user."""
+    entitlement = entitlements.current()
+    if entitlement is None:
+        return jsonify({"error": "User not found."}), 404
+    return jsonify({
+        feature: {"used": quota_meter.usage(entitlement["username"], feature),
+                  "limit": tier_limit(entitlement["tier"], feature)}
+        for feature in FEATURE_WINDOWS
+    })
+
+@app.route("/api/llm-cache/stats")
+@login_required
+def api_llm_cache_stats():
+    return jsonify(llm_cache.stats())
+
+@app.route("/api/models/metrics")
+@login_required
+def api_model_metrics():
+    return jsonify(model_registry.metrics())
+
 @app.route("/seo-optimizer")
 @login_required
 def seo_optimizer():
     return render_template("seo_optimizer.html")
 
+@app.route("/api/seo/batch", methods=["POST"])
+@login_required
+def api_seo_batch():
+    """
+    Starts (or, given a run_id, resumes) a shop-wide SEO batch as a low-priority job.
+    Every product optimized uses one of the caller's 'seo_optimizations'; the job
+    stops when the quota runs out.
+    """
+    entitlement = entitlements.current()
+    if entitlement is None:
+        session.clear()
+        return redirect(url_for('login'))
+    limit = tier_limit(entitlement["tier"], 'seo_optimizations')
+    if limit is not None and quota_meter.usage(entitlement["username"], 'seo_optimizations') >= limit:
+        return jsonify({"error": "You have reached your plan's limit for seo optimizations. Upgrade for more."}), 429
+    data = request.json or {}
+    run_id = data.get("run_id")
+    if run_id:
+        run = seo_runs.status(run_id)
+        if run is None or run["owner"] != entitlement["username"]:
+            return jsonify({"error": "SEO batch run not found."}), 404
+    else:
+        product_ids = data.get("product_ids")
+        if product_ids is not None and not isinstance(product_ids, list):
+            return jsonify({"error": "product_ids must be a list."}), 400
+        # Created before queueing, so a job that is retried after a crash resumes this run.
+        run_id = seo_runs.create(product_ids, data.get("title_contains"), bool(data.get("dry_run", False)),
+                                 owner=entitlement["username"])
+    kwargs = {"username": entitlement["username"], "tier": entitlement["tier"], "run_id": run_id}
+    # Shop-wide runs can take hours, so they have no timeout; progress is tracked per product.
+    return submit_job_response("seo.batch_optimize", kwargs=kwargs, priority=PRIORITY_LOW, timeout=None)
+
+@app.route("/api/seo/batch/<run_id>")
+@login_required
+def api_seo_batch_status(run_id):
+    status = seo_runs.status(run_id)
+    if status is None or status["owner"] != session.get("username"):
+        return jsonify({"error": "SEO batch run not found."}), 404
+    return jsonify(status)
+
 @app.route("/api/seo/analyze", methods=["POST"])
 @login_required
+@quota_required('seo_optimizations')
 def analyze_seo():
     return jsonify({"message": "SEO analysis is not implemented yet."})
 
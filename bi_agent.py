@@ -1,7 +1,9 @@
 # bi_agent.py
 
-from logic import get_gemini_vision_pro_model
+from logic import get_gemini_text_model
+from llm_cache import llm_cache
 from google.cloud import bigquery
+from order_store import OrderStore
 import os
 
 def generate_bigquery_query(prompt: str):
@@ -21,12 +23,12 @@ def generate_bigquery_query(prompt: str):
     """
 
     try:
-        model = get_gemini_vision_pro_model()
-        response = model.generate_content([full_prompt])
+        model = get_gemini_text_model()
+        response_text = llm_cache.generate_text(model, [full_prompt], cache=True)
         
         # Extracting and parsing the JSON from the response
         import json
-        clean_response = response.text.strip().replace("```json", "").replace("```", "")
+        clean_response = response_text.strip().replace("```json", "").replace("```", "")
         query = json.loads(clean_response)
         
         return query
@@ -46,3 +48,15 @@ def run_bigquery_query(query: str):
     except Exception as e:
         print(f"An error occurred while running BigQuery query: {e}")
         return {"error": str(e)}
+
+def run_local_order_query(query: str):
+    """
+    Runs a generated query against the local order store instead of BigQuery.
+    The `printify_data.orders` table maps to the store's `orders` table.
+    """
+    try:
+        store = OrderStore()
+        return store.query(query.replace("`printify_data.orders`", "orders").replace("printify_data.orders", "orders"))
+    except Exception as e:
+        print(f"An error occurred while running local order query: {e}")
+        return {"error": str(e)}
@@ -0,0 +1,469 @@
+# bulk_pipeline.py
+
+import csv
+import math
+import os
+import queue
+import threading
+import time
+from rate_limiter import printify_rate_limiter
+from payload_templates import template_registry
+from job_progress import current_progress
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Marks the end of the stream on a stage queue.
+_DONE = object()
+
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_SEND_WORKERS = 4
+
+# --- Shared Helpers ---
+
+class FailureLogLock:
+    """
+    Re-entrant lock on one failure log, held across threads and processes: an RLock
+    orders threads in this process, and the outermost holder also takes an OS lock
+    on a `<log>.lock` file next to the log, so a bulk run in one gunicorn worker
+    and a retry in another never interleave.
+    """
+    def __init__(self, path):
+        self.lock_path = path + ".lock"
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_EX)
+                    else:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                except Exception:
+                    os.close(fd)
+                    raise
+            except Exception:
+                self._lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(fd)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+_log_locks = {}
+_log_locks_guard = threading.Lock()
+
+def failure_log_lock(log_file):
+    """
+    The lock of one failure log (see FailureLogLock). A FailureLog holds it from its
+    first write until it is closed, and the retry runner holds it while it rewrites the log.
+    """
+    path = os.path.abspath(log_file)
+    with _log_locks_guard:
+        if path not in _log_locks:
+            _log_locks[path] = FailureLogLock(path)
+        return _log_locks[path]
+
+class FailureLog:
+    """
+    Buffered CSV log of failed rows. The file is opened once per run and rows are
+    written through a buffered handle, instead of reopening the file per failure.
+    While open it holds `failure_log_lock`, so the log is never rewritten under it.
+    """
+    def __init__(self, log_file, buffer_size=64 * 1024):
+        self.log_file = log_file
+        self.buffer_size = buffer_size
+        self.count = 0
+        self._file = None
+        self._writer = None
+        self._lock = threading.Lock()
+        self._file_lock = failure_log_lock(log_file)
+
+    def _open(self, first_row):
+        self._file_lock.acquire()
+        try:
+            self._open_file(first_row)
+        except Exception:
+            self._file_lock.release()
+            raise
+
+    def _open_file(self, first_row):
+        file_exists = os.path.isfile(self.log_file) and os.path.getsize(self.log_file) > 0
+        fieldnames = None
+        if file_exists:
+            with open(self.log_file, mode='r', newline='', encoding='utf-8') as csvfile:
+                fieldnames = next(csv.reader(csvfile), None)
+        if not fieldnames:
+            file_exists = False
+            fieldnames = [key for key in first_row if key != 'error'] + ['error']
+        self._file = open(self.log_file, mode='a', newline='', encoding='utf-8', buffering=self.buffer_size)
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames, extrasaction='ignore')
+        if not file_exists:
+            self._writer.writeheader()
+
+    def write(self, data_row, error_message):
+        """Queues a failed row (plus its error message) for writing."""
+        row = dict(data_row)
+        row['error'] = error_message
+        with self._lock:
+            try:
+                if self._writer is None:
+                    self._open(row)
+                self._writer.writerow(row)
+                self.count += 1
+            except Exception as e:
+                print(f"CRITICAL LOGGING ERROR: Could not write to log file {self.log_file}. Reason: {e}")
+
+    def close(self):
+        """Flushes buffered rows to disk and closes the file."""
+        with self._lock:
+            if self._file is not None:
+                try:
+                    self._file.close()
+                finally:
+                    self._file = None
+                    self._writer = None
+                    self._file_lock.release()
+
+def read_csv_rows(file_path):
+    """Streams rows from a CSV file without loading the whole file into memory."""
+    with open(file_path, mode='r', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            yield row
+
+def count_csv_rows(file_path):
+    """Counts data rows in a CSV file (used as the progress total)."""
+    with open(file_path, mode='r', encoding='utf-8') as csvfile:
+        return sum(1 for _ in csv.DictReader(csvfile))
+
+def parse_variants_and_prices(variants_str):
+    """Parses a 'variant_id:price,variant_id:price' string into (id, price) tuples."""
+    variants = []
+    for item in variants_str.split(','):
+        variant_id_str, price_str = item.split(':')
+        variants.append((int(variant_id_str), int(price_str)))
+    return variants
+
+# --- Pipeline Core ---
+
+class BulkJob:
+    """One CSV row travelling through the pipeline."""
+    def __init__(self, index, row):
+        self.index = index
+        self.row = row
+        self.data = {}
+        self.payload = None
+        self.response = None
+        self.message = None
+        self.error = None
+
+
+class StageMetrics:
+    """Thread-safe timing counters for a single stage."""
+    def __init__(self, name):
+        self.name = name
+        self.processed = 0
+        self.failed = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed, failed=False):
+        with self._lock:
+            self.processed += 1
+            self.seconds += elapsed
+            if failed:
+                self.failed += 1
+
+    def as_dict(self):
+        avg_ms = (self.seconds / self.processed * 1000) if self.processed else 0.0
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "seconds": round(self.seconds, 4),
+            "avg_ms": round(avg_ms, 3),
+        }
+
+
+class Stage:
+    """
+    A named step of the pipeline. `func` receives a BulkJob and fills in its fields;
+    raising an exception marks the job as failed and skips the remaining stages.
+    """
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+
+
+class BulkPipeline:
+    """
+    Runs rows through read -> stages -> record. Stages are connected by bounded
+    queues so a slow stage applies backpressure instead of buffering the whole file,
+    and each stage can run several workers independently.
+    """
+    def __init__(self, name, stages, log_file=None, queue_size=DEFAULT_QUEUE_SIZE, on_result=None, progress=None):
+        self.name = name
+        self.stages = stages
+        self.log_file = log_file
+        self.queue_size = queue_size
+        self.on_result = on_result or _print_result
+        self.progress = progress
+        self.metrics = {}
+
+    def run(self, rows):
+        """
+        Processes every row and returns a summary dictionary with success/failure
+        counts and per-stage timing metrics. Errors raised while reading the source
+        (e.g. FileNotFoundError) are re-raised after the pipeline has drained.
+        """
+        self.metrics = {"read": StageMetrics("read")}
+        for stage in self.stages:
+            self.metrics[stage.name] = StageMetrics(stage.name)
+        self.metrics["record"] = StageMetrics("record")
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        reader_error = []
+        threads = [threading.Thread(target=self._read, args=(rows, queues[0], reader_error), daemon=True)]
+
+        for position, stage in enumerate(self.stages):
+            next_workers = self.stages[position + 1].workers if position + 1 < len(self.stages) else 1
+            remaining = {"workers": stage.workers}
+            remaining_lock = threading.Lock()
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[position], queues[position + 1], next_workers, remaining, remaining_lock),
+                    daemon=True,
+                ))
+
+        # Reports to the running background job, if any; a no-op otherwise.
+        progress = self.progress or current_progress()
+        if hasattr(rows, '__len__'):
+            progress.set_total(len(rows))
+        failure_log = FailureLog(self.log_file) if self.log_file else None
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        try:
+            summary = self._record(queues[-1], failure_log, progress)
+        finally:
+            if failure_log is not None:
+                failure_log.close()
+            progress.flush()
+        for thread in threads:
+            thread.join()
+
+        summary["elapsed_seconds"] = round(time.monotonic() - started, 4)
+        summary["metrics"] = {name: metrics.as_dict() for name, metrics in self.metrics.items()}
+        if reader_error:
+            raise reader_error[0]
+        return summary
+
+    def _read(self, rows, out_queue, reader_error):
+        metrics = self.metrics["read"]
+        first_workers = self.stages[0].workers if self.stages else 1
+        index = 0
+        try:
+            iterator = iter(rows)
+            while True:
+                start = time.monotonic()
+                try:
+                    row = next(iterator)
+                except StopIteration:
+                    break
+                metrics.record(time.monotonic() - start)
+                index += 1
+                out_queue.put(BulkJob(index, row))
+        except Exception as e:
+            reader_error.append(e)
+        finally:
+            for _ in range(first_workers):
+                out_queue.put(_DONE)
+
+    def _work(self, stage, in_queue, out_queue, next_workers, remaining, remaining_lock):
+        metrics = self.metrics[stage.name]
+        while True:
+            job = in_queue.get()
+            if job is _DONE:
+                with remaining_lock:
+                    remaining["workers"] -= 1
+                    last_worker = remaining["workers"] == 0
+                if last_worker:
+                    for _ in range(next_workers):
+                        out_queue.put(_DONE)
+                return
+
+            if job.error is None:
+                start = time.monotonic()
+                try:
+                    stage.func(job)
+                except Exception as e:
+                    job.error = str(e)
+                metrics.record(time.monotonic() - start, failed=job.error is not None)
+            out_queue.put(job)
+
+    def _record(self, in_queue, failure_log, progress):
+        metrics = self.metrics["record"]
+        summary = {"success": 0, "failure": 0}
+        while True:
+            job = in_queue.get()
+            if job is _DONE:
+                return summary
+            start = time.monotonic()
+            if job.error is None:
+                summary["success"] += 1
+            else:
+                summary["failure"] += 1
+                if failure_log is not None:
+                    failure_log.write(job.row, job.error)
+            self.on_result(job)
+            progress.advance(error=job.error)
+            metrics.record(time.monotonic() - start, failed=job.error is not None)
+
+
+def _print_result(job):
+    if job.error is None:
+        print(f"   [{job.index}] ✅ Success! {job.message or ''}".rstrip())
+    else:
+        print(f"   [{job.index}] ❌ FAILURE: {job.error}")
+
+def print_pipeline_summary(label, summary, log_file=None):
+    """Prints the counts and per-stage timings returned by BulkPipeline.run()."""
+    print(f"\n--- Bulk {label} Summary ---")
+    print(f"Successful operations: {summary.get('success', 0)}")
+    print(f"Failed operations:     {summary.get('failure', 0)}")
+    if 'elapsed_seconds' in summary:
+        print(f"Elapsed:               {summary['elapsed_seconds']:.2f}s")
+    for name, stage in summary.get("metrics", {}).items():
+        print(f"  - {name:<10} {stage['processed']:>7} rows  {stage['avg_ms']:>9.3f} ms/row  ({stage['failed']} failed)")
+    if summary.get('failure', 0) > 0 and log_file:
+        print(f"Details for failed jobs logged to '{log_file}'.")
+
+# --- Stage Configurations ---
+
+def creator_stages(create_product, rate_limiter=printify_rate_limiter, send_workers=DEFAULT_SEND_WORKERS,
+                   validator=None, templates=template_registry, serialize=False):
+    """
+    Stage configuration for bulk product creation.
+    `create_product(payload)` sends the payload and returns the API response; with
+    `serialize=True` it receives the pre-serialized JSON string instead of a dict.
+    If a PreflightValidator is given, rows it rejects never reach the send stage.
+    """
+    def parse(job):
+        row = job.row
+        for column in ('title', 'description', 'blueprint_id', 'print_provider_id', 'image_id', 'variants_and_prices'):
+            if not row.get(column):
+                raise ValueError(f"'{column}' column is missing or empty")
+        job.data['variants'] = parse_variants_and_prices(row['variants_and_prices'])
+
+    def build(job):
+        template = templates.get(job.row['blueprint_id'], job.row['print_provider_id'])
+        if serialize:
+            job.payload = template.render_json(job.row, job.data['variants'])
+        else:
+            job.payload = template.render(job.row, job.data['variants'])
+
+    def send(job):
+        rate_limiter.acquire()
+        response = create_product(job.payload)
+        if not response or 'id' not in response:
+            raise Exception(f"API call failed. Response: {response}")
+        job.response = response
+        job.message = f"Product '{response.get('title', job.row['title'])}' created."
+
+    stages = [Stage("parse", parse)]
+    if validator is not None:
+        stages.append(validator.stage())
+    stages += [
+        Stage("build", build),
+        Stage("send", send, workers=send_workers),
+    ]
+    return stages
+
+def updater_stages(get_product, update_product, rate_limiter=printify_rate_limiter, send_workers=DEFAULT_SEND_WORKERS):
+    """
+    Stage configuration for bulk product updates.
+    `get_product(product_id)` returns the current product; `update_product(product_id, payload)`
+    sends the update and returns the API response.
+    """
+    def parse(job):
+        row = job.row
+        product_id = row.get('product_id')
+        if not product_id:
+            raise ValueError("product_id column is missing or empty")
+        job.data['product_id'] = product_id
+        if row.get('price'):
+            job.data['price'] = int(row['price'])
+        elif row.get('margin'):
+            margin_decimal = float(row['margin']) / 100.0
+            if margin_decimal < 0 or margin_decimal >= 1:
+                raise ValueError(f"Invalid margin '{row['margin']}%. Must be between 0 and 99.")
+            job.data['margin'] = margin_decimal
+
+    def build(job):
+        row = job.row
+        payload = {}
+        if row.get('title'):
+            payload['title'] = row['title']
+        if row.get('description'):
+            payload['description'] = row['description']
+
+        if 'price' in job.data or 'margin' in job.data:
+            rate_limiter.acquire()
+            product_data = get_product(job.data['product_id'])
+            if not product_data:
+                raise ConnectionError("Failed to fetch existing product data before price update.")
+            if 'price' in job.data:
+                payload['variants'] = [{"id": v['id'], "price": job.data['price']} for v in product_data['variants']]
+            else:
+                margin = job.data['margin']
+                payload['variants'] = [
+                    {"id": v['id'], "price": int(math.ceil(v['cost'] / (1 - margin)))}
+                    for v in product_data['variants']
+                ]
+        job.payload = payload
+
+    def send(job):
+        product_id = job.data['product_id']
+        if not job.payload:
+            job.message = f"No changes specified for product {product_id}. Skipping."
+            return
+        rate_limiter.acquire()
+        response = update_product(product_id, job.payload)
+        if not response:
+            raise ConnectionError("API call failed. Response was negative.")
+        job.response = response
+        job.message = f"Product {product_id} updated."
+
+    return [
+        Stage("parse", parse),
+        Stage("build", build, workers=send_workers),
+        Stage("send", send, workers=send_workers),
+    ]
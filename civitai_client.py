@@ -1,37 +1,77 @@
 # civitai_client.py
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from ttl_cache import TTLCache
 
 BASE_URL = "https://civitai.com/api/v1"
+CACHE_DB_FILE = "civitai_cache.db"
+SEARCH_TTL = 10 * 60                 # search results are fresh for 10 minutes...
+SEARCH_STALE_TTL = 24 * 3600         # ...and served stale (while refreshing) for a day
+VERSION_TTL = 24 * 3600              # model versions rarely change
+VERSION_STALE_TTL = 7 * 24 * 3600
+PREFETCH_COUNT = 3
+REQUEST_TIMEOUT = 15
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a search query, used as the cache key."""
+    return " ".join(str(query).lower().split())
 
 class CivitaiClient:
-    def __init__(self):
+    def __init__(self, cache_path=CACHE_DB_FILE, prefetch_count=PREFETCH_COUNT):
         self.base_url = BASE_URL
+        self.session = requests.Session()
+        self.prefetch_count = prefetch_count
+        self.search_cache = TTLCache(maxsize=512, ttl=SEARCH_TTL, stale_ttl=SEARCH_STALE_TTL,
+                                     disk_path=cache_path, namespace="civitai_search")
+        self.version_cache = TTLCache(maxsize=1024, ttl=VERSION_TTL, stale_ttl=VERSION_STALE_TTL,
+                                      disk_path=cache_path, namespace="civitai_version")
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=prefetch_count or 1, thread_name_prefix="civitai-prefetch")
 
-    def search_models(self, query: str, limit: int = 5):
-        """
-        Searches for models on Civitai.
-        """
-        endpoint = f"/models?query={query}&limit={limit}"
-        url = f"{self.base_url}{endpoint}"
-        
+    def _get(self, endpoint, params=None):
+        response = self.session.get(f"{self.base_url}{endpoint}", params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def _fetch_models(self, query, limit):
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            return response.json().get('items', [])
+            return self._get("/models", params={"query": query, "limit": limit}).get('items', [])
         except requests.exceptions.RequestException as e:
             print(f"An error occurred while searching Civitai models: {e}")
-            return []
+            return None
 
-    def get_model_version_info(self, version_id: int):
+    def search_models(self, query: str, limit: int = 5):
         """
-        Gets information about a specific model version, which is needed for generation.
+        Searches for models on Civitai. Results are cached per normalized query, and
+        the top results' version info is prefetched in parallel.
         """
-        endpoint = f"/model-versions/{version_id}"
-        url = f"{self.base_url}{endpoint}"
+        normalized = normalize_query(query)
+        items = self.search_cache.get_or_load(
+            f"{normalized}|{limit}", lambda: self._fetch_models(normalized, limit)
+        )
+        if items is None:
+            return []
+        self._prefetch_versions(items)
+        return items
+
+    def _prefetch_versions(self, items):
+        version_ids = []
+        for item in items[:self.prefetch_count]:
+            versions = item.get('modelVersions') or []
+            if versions and versions[0].get('id') is not None:
+                version_ids.append(versions[0]['id'])
+        for version_id in version_ids:
+            if self.version_cache.get(str(version_id))[1] is None:
+                self._prefetch_executor.submit(self.get_model_version_info, version_id)
+
+    def _fetch_version(self, version_id):
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            return response.json()
+            return self._get(f"/model-versions/{int(version_id)}")
         except requests.exceptions.RequestException as e:
             print(f"An error occurred while getting model version info: {e}")
             return None
+
+    def get_model_version_info(self, version_id: int):
+        """
+        Gets information about a specific model version, which is needed for generation.
+        """
+        return self.version_cache.get_or_load(str(version_id), lambda: self._fetch_version(version_id))
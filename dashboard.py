@@ -12,10 +12,34 @@ try:
     from bulk_creator import create_products_from_csv
     from bulk_updater import update_products_from_csv
     from seo_agent import get_seo_suggestions # Mocked for now
+    from order_analytics import OrderAnalytics
+    from jobs_manager import jobs_manager, PRIORITY_LOW
     # Import other agents as needed...
 except ImportError as e:
     st.error(f"Error importing agent scripts: {e}. Ensure all files are in the same directory.")
 
+# --- Shared analytics instance (cached across Streamlit reruns) ---
+@st.cache_resource
+def get_order_analytics():
+    return OrderAnalytics()
+
+# --- Helper to run a background job and render its progress ---
+def run_job_with_progress(task, args):
+    """Submits a job and renders its progress events until it finishes. Returns the finished job."""
+    job_id = jobs_manager.submit(task, args, priority=PRIORITY_LOW)
+    bar = st.progress(0.0, text="Queued...")
+    details = st.empty()
+    for event, data in jobs_manager.events(job_id):
+        if event == "progress":
+            total = data["total"] or 0
+            fraction = min(data["done"] / total, 1.0) if total else 0.0
+            eta = f", ETA {data['eta_seconds']:.0f}s" if data["eta_seconds"] is not None else ""
+            bar.progress(fraction, text=f"{data['done']}/{total or '?'} rows ({data['throughput']}/s{eta})")
+            if data["errors"]:
+                details.warning(f"{data['failed']} failed so far. Latest: {data['errors'][-1]}")
+        elif event == "done":
+            return data
+
 # --- Helper function to save uploaded file ---
 def save_uploaded_file(uploaded_file, file_path):
     try:
@@ -74,35 +98,29 @@ elif page == "Product Performance":
 
     if st.button("Fetch Performance Data"):
         with st.spinner("Fetching latest data..."):
-            # Mock data for demonstration
-            sales_data = {
-                "Product": ["T-Shirt", "Mug", "Hoodie", "Sticker"],
-                "Units Sold": [120, 85, 60, 200],
-                "Revenue": [2400, 1020, 1800, 600]
-            }
-            shipping_data = {
-                "Status": ["Shipped", "In Production", "Delivered"],
-                "Orders": [50, 25, 150]
-            }
-            inventory_data = {
-                "Product": ["T-Shirt", "Mug", "Hoodie", "Sticker"],
-                "Stock Level": [500, 300, 400, 1000]
-            }
-
-            sales_df = pd.DataFrame(sales_data)
-            shipping_df = pd.DataFrame(shipping_data)
-            inventory_df = pd.DataFrame(inventory_data)
+            analytics = get_order_analytics()
+            by_product = analytics.margin_by("title")
 
-            st.success("Data fetched successfully!")
+            if by_product.empty:
+                st.info("No orders in the local order store yet. Run the order reporter to sync them.")
+            else:
+                st.success("Data fetched successfully!")
+
+                st.subheader("Sales Overview")
+                st.bar_chart(by_product["revenue"] / 100)
 
-            st.subheader("Sales Overview")
-            st.bar_chart(sales_df.set_index("Product")["Revenue"])
+                st.subheader("Units, Revenue and Margin by Product")
+                st.dataframe(by_product)
 
-            st.subheader("Shipping Status")
-            st.table(shipping_df)
+                st.subheader("Margin by Blueprint")
+                st.dataframe(analytics.margin_by("blueprint_id"))
 
-            st.subheader("Inventory Levels")
-            st.table(inventory_df)
+                st.subheader("Margin by Print Provider")
+                st.dataframe(analytics.margin_by("print_provider_id"))
+
+                st.subheader("Order Status")
+                status_df = pd.DataFrame(list(analytics.store.count_by_status().items()), columns=["Status", "Orders"])
+                st.table(status_df)
 
 # =============================================================================
 # Financial Analysis Page
@@ -113,24 +131,31 @@ elif page == "Financial Analysis":
 
     if st.button("Fetch Financial Data"):
         with st.spinner("Fetching latest data..."):
-            # Mock data for demonstration
-            financial_data = {
-                "Metric": ["Total Revenue", "Total Cost", "Gross Profit", "Gross Profit Margin", "Average Order Value"],
-                "Value": [5820, 3492, 2328, "40%", 38.8]
-            }
-            financial_df = pd.DataFrame(financial_data)
+            analytics = get_order_analytics()
+            summary = analytics.summary()
 
             st.success("Data fetched successfully!")
 
             st.subheader("Key Financial Metrics")
+            financial_df = pd.DataFrame({
+                "Metric": ["Total Orders", "Total Revenue", "Total Cost", "Gross Profit", "Gross Profit Margin", "Average Order Value"],
+                "Value": [
+                    summary["total_orders"],
+                    f"${summary['total_revenue'] / 100:.2f}",
+                    f"${summary['total_cost'] / 100:.2f}",
+                    f"${summary['gross_profit'] / 100:.2f}",
+                    f"{summary['gross_margin_pct']}%",
+                    f"${summary['average_order_value'] / 100:.2f}",
+                ]
+            })
             st.table(financial_df)
 
-            st.subheader("Revenue vs. Profit")
-            chart_data = pd.DataFrame({
-                "Category": ["Revenue", "Cost", "Profit"],
-                "Amount": [5820, 3492, 2328]
-            })
-            st.bar_chart(chart_data.set_index("Category"))
+            st.subheader("Weekly Revenue vs. Profit")
+            weekly = analytics.margin_by("week")
+            st.line_chart(weekly[["revenue", "margin"]] / 100)
+
+            st.subheader("Customer Cohort Retention")
+            st.dataframe(analytics.cohort_retention())
 
 # =============================================================================
 # Marketing Campaigns Page
@@ -212,13 +237,12 @@ elif page == "Bulk Product Updater":
         if st.button("Run Bulk Update"):
             file_path = "products_to_update.csv"
             if save_uploaded_file(uploaded_file, file_path):
-                with st.spinner("Processing updates... This may take a while."):
-                    try:
-                        update_products_from_csv(file_path) # Call existing agent function
-                        st.success("Bulk update process completed successfully!")
-                        st.balloons()
-                    except Exception as e:
-                        st.error(f"An error occurred during the update process: {e}")
+                job = run_job_with_progress("bulk.update_products", (file_path,))
+                if job and job["status"] == "completed":
+                    st.success("Bulk update process completed successfully!")
+                    st.balloons()
+                else:
+                    st.error(f"An error occurred during the update process: {job and job['result']}")
 
 # =============================================================================
 # Bulk Creator Page
@@ -239,14 +263,13 @@ elif page == "Bulk Product Creator":
         if st.button("Run Bulk Creation"):
             file_path = "products_to_create.csv"
             if save_uploaded_file(uploaded_file, file_path):
-                with st.spinner("Creating new products..."):
-                    try:
-                        create_products_from_csv(file_path) # Call existing agent function
-                        st.success("Bulk creation process completed successfully!")
-                        if publish_to_all:
-                            st.info("Products published to all available stores.")
-                    except Exception as e:
-                        st.error(f"An error occurred during creation: {e}")
+                job = run_job_with_progress("bulk.create_products", (file_path,))
+                if job and job["status"] == "completed":
+                    st.success("Bulk creation process completed successfully!")
+                    if publish_to_all:
+                        st.info("Products published to all available stores.")
+                else:
+                    st.error(f"An error occurred during creation: {job and job['result']}")
 
 # =============================================================================
 # Catalog Explorer Page
@@ -2,19 +2,78 @@
 
 import replicate
 import os
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from logic import get_gemini_vision_pro_model
+from logic import get_gemini_text_model
+from llm_cache import llm_cache
 import openai  # Import the OpenAI library
+from job_progress import current_progress
+from prediction_manager import PredictionManager
+from image_store import image_store
 
 # Load environment variables
 load_dotenv()
 REPLICATE_API_TOKEN = os.environ.get("REPLICATE_API_TOKEN")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")  # Make sure to set this in your .env file
 
+# Set to this app's /webhooks/replicate URL to receive completions instead of polling; the
+# endpoint only accepts webhooks signed with REPLICATE_WEBHOOK_SECRET (the account's "whsec_..." key).
+REPLICATE_WEBHOOK_URL = os.environ.get("REPLICATE_WEBHOOK_URL")
+
 # Configure the OpenAI client
 if OPENAI_API_KEY:
     openai.api_key = OPENAI_API_KEY
 
+prediction_manager = PredictionManager(replicate, webhook_url=REPLICATE_WEBHOOK_URL)
+
+BATCH_VARIANTS = 4
+MAX_BATCH_VARIANTS = 8
+# Blocking DALL-E requests allowed in flight, shared by every batch in this process.
+# Replicate predictions need no slot: they queue on Replicate's side and each batch
+# tracks its own with a single poller thread.
+PROVIDER_CONCURRENCY = {"dalle": 3}
+_provider_slots = {name: threading.BoundedSemaphore(limit) for name, limit in PROVIDER_CONCURRENCY.items()}
+# DALL-E slots plus room for the Replicate pollers of concurrent batches.
+_batch_executor = ThreadPoolExecutor(max_workers=PROVIDER_CONCURRENCY["dalle"] + 4, thread_name_prefix="design-batch")
+
+def _parse_json_response(text):
+    return json.loads(text.strip().replace("```json", "").replace("```", ""))
+
+def _generate_dalle_image(prompt):
+    response = openai.Image.create(
+        model="dall-e-3",
+        prompt=prompt,
+        n=1,
+        size="1024x1024",
+        quality="standard",
+    )
+    return response.data[0].url
+
+def _job_key(index):
+    """Key of the index-th prediction of the running job, so a retried job reuses it; None outside jobs."""
+    job_id = current_progress().job_id
+    return f"{job_id}:{index}" if job_id else None
+
+def _store_outputs(result):
+    """
+    Downloads each output URL into the local image store once and adds
+    result["images"]: [{"digest", "duplicates"}] so the UI can use local thumbnails.
+    """
+    outputs = result.get("output") or []
+    images = []
+    for url in [outputs] if isinstance(outputs, str) else outputs:
+        try:
+            record = image_store.store_url(url)
+            images.append({"digest": record["digest"], "duplicates": image_store.find_duplicates(record["digest"])})
+        except Exception as e:
+            print(f"⚠️ Could not store generated image {url}: {e}")
+    if images:
+        result["images"] = images
+    return result
+
 def generate_image_from_replicate(model_version, prompt, lora=None):
     """
     Generates an image from a text prompt using the Replicate API.
@@ -25,12 +84,11 @@ def generate_image_from_replicate(model_version, prompt, lora=None):
     try:
         if lora:
             prompt = f"{prompt} <lora:{lora}:1>"
-            
-        output = replicate.run(
-            model_version,
-            input={"prompt": prompt}
-        )
-        return {"output": output}
+
+        prediction = prediction_manager.wait(prediction_manager.create(model_version, prompt, job_key=_job_key(0)))
+        if prediction["status"] != "succeeded":
+            return {"error": f"Image generation {prediction['status']}: {prediction['error'] or 'no output'}"}
+        return _store_outputs({"output": prediction["output"]})
     except Exception as e:
         print(f"An error occurred while contacting Replicate API: {e}")
         return {"error": "Failed to connect to the image generation service."}
@@ -44,8 +102,8 @@ def generate_ai_design(prompt: str):
 
     try:
         # Step 1: Use Gemini to brainstorm a more creative prompt for DALL-E 3
-        model = get_gemini_vision_pro_model()
-        creative_prompt_response = model.generate_content([f"""
+        model = get_gemini_text_model()
+        creative_prompt_response = llm_cache.generate_text(model, [f"""
             Analyze the following user prompt and generate a more detailed and creative prompt for DALL-E 3.
             The new prompt should be optimized to generate a visually stunning and unique design for a t-shirt.
             Focus on extracting key elements and adding artistic flair.
@@ -55,26 +113,124 @@ def generate_ai_design(prompt: str):
             Return the response as a JSON object with a "dalle_prompt" key.
         """])
 
-        import json
-        clean_response = creative_prompt_response.text.strip().replace("```json", "").replace("```", "")
-        dalle_prompt_data = json.loads(clean_response)
-        dalle_prompt = dalle_prompt_data.get("dalle_prompt")
+        dalle_prompt = _parse_json_response(creative_prompt_response).get("dalle_prompt")
 
         if not dalle_prompt:
             return {"error": "Could not generate a creative prompt from your input."}
 
         # Step 2: Use the new prompt to generate an image with DALL-E 3
-        response = openai.Image.create(
-            model="dall-e-3",
-            prompt=dalle_prompt,
-            n=1,
-            size="1024x1024",
-            quality="standard",
-        )
-        
-        image_url = response.data[0].url
-        return {"output": [image_url]} # Keep the output format consistent
+        image_url = _generate_dalle_image(dalle_prompt)
+        return _store_outputs({"output": [image_url]}) # Keep the output format consistent
         
     except Exception as e:
         print(f"An error occurred during AI design generation: {e}")
         return {"error": f"Failed to generate AI design. Raw response: {str(e)}"}
+
+def generate_prompt_variations(prompt, count=BATCH_VARIANTS):
+    """
+    Asks Gemini for `count` distinct image prompts based on `prompt` in a single call.
+    """
+    model = get_gemini_text_model()
+    response = llm_cache.generate_text(model, [f"""
+        Analyze the following user prompt and generate {count} distinct, detailed prompts for an image model.
+        Each prompt should be optimized to generate a visually stunning and unique design for a t-shirt,
+        and each should explore a different style, composition or color palette.
+
+        User Prompt: "{prompt}"
+
+        Return the response as a JSON object with a "prompts" key holding a list of {count} strings.
+    """])
+    prompts = [p.strip() for p in _parse_json_response(response).get("prompts", []) if isinstance(p, str) and p.strip()]
+    return prompts[:count]
+
+def _generate_dalle_variant(index, prompt):
+    result = {"index": index, "provider": "dalle", "prompt": prompt}
+    with _provider_slots["dalle"]:
+        result["output"] = [_generate_dalle_image(prompt)]
+    return _store_outputs(result)
+
+def _replicate_variant(index, prompt, prediction):
+    result = {"index": index, "provider": "replicate", "prompt": prompt}
+    if prediction is None or prediction["status"] != "succeeded":
+        status = prediction["status"] if prediction else "lost"
+        result["error"] = f"Image generation {status}: {(prediction or {}).get('error') or 'no output'}"
+        return result
+    result["output"] = prediction["output"]
+    return _store_outputs(result)
+
+def _collect_replicate_variants(started, report):
+    """
+    Waits for every Replicate prediction of a batch on this one thread (a single
+    poller that also sees webhook updates) and reports each variant as it finishes.
+    `started` maps prediction ID -> (index, prompt).
+    """
+    remaining = dict(started)
+    try:
+        for prediction in prediction_manager.iter_completed(list(started)):
+            if prediction is None:
+                continue
+            index, prompt = remaining.pop(prediction["id"])
+            report(_replicate_variant(index, prompt, prediction))
+    finally:
+        for index, prompt in remaining.values():
+            report({"index": index, "provider": "replicate", "prompt": prompt, "error": "Could not track the prediction."})
+
+def generate_design_batch(prompt, count=BATCH_VARIANTS, replicate_model=None):
+    """
+    Generates `count` design options from one prompt: Gemini writes the prompt
+    variations in one call, then the images are generated concurrently, spread
+    across DALL-E and (when `replicate_model` is given) Replicate. DALL-E calls
+    run on the shared batch threads within its concurrency limit; Replicate
+    predictions are all started up front and tracked by one poller. Each finished
+    variant is reported as job progress so the grid fills in as images arrive.
+    Replicate predictions are keyed by job and variant, so a retried job reuses
+    the ones it already started.
+    """
+    providers = []
+    if OPENAI_API_KEY:
+        providers.append("dalle")
+    if REPLICATE_API_TOKEN and replicate_model:
+        providers.append("replicate")
+    if not providers:
+        return {"error": "No image generation provider is configured on the server."}
+    count = max(1, min(int(count), MAX_BATCH_VARIANTS))
+
+    try:
+        prompts = generate_prompt_variations(prompt, count)
+    except Exception as e:
+        print(f"An error occurred while generating prompt variations: {e}")
+        return {"error": f"Failed to generate prompt variations: {e}"}
+    if not prompts:
+        return {"error": "Could not generate prompt variations from your input."}
+
+    progress = current_progress()
+    progress.set_total(len(prompts))
+    finished = queue.Queue()
+
+    def run_dalle(index, variant):
+        try:
+            finished.put(_generate_dalle_variant(index, variant))
+        except Exception as e:
+            print(f"An error occurred while generating design variant {index}: {e}")
+            finished.put({"index": index, "provider": "dalle", "prompt": variant, "error": str(e)})
+
+    started = {}
+    for index, variant in enumerate(prompts):
+        if providers[index % len(providers)] == "dalle":
+            _batch_executor.submit(run_dalle, index, variant)
+            continue
+        try:
+            started[prediction_manager.create(replicate_model, variant, job_key=_job_key(index))] = (index, variant)
+        except Exception as e:
+            print(f"An error occurred while starting design variant {index}: {e}")
+            finished.put({"index": index, "provider": "replicate", "prompt": variant, "error": str(e)})
+    if started:
+        _batch_executor.submit(_collect_replicate_variants, started, finished.put)
+
+    variants = []
+    for _ in prompts:
+        result = finished.get()
+        variants.append(result)
+        progress.advance(error=result.get("error"), item=result)
+    variants.sort(key=lambda result: result["index"])
+    return {"prompt": prompt, "variants": variants}
@@ -0,0 +1,46 @@
+# entitlements.py
+
+from functools import lru_cache
+from flask import g, session
+from subscriptions import has_access
+
+
+@lru_cache(maxsize=1024)
+def tier_allows(tier, feature):
+    """has_access() is a pure function of (tier, feature), so its answers are memoized."""
+    return has_access(tier, feature)
+
+
+class Entitlements:
+    """
+    Resolves the signed-in user's subscription tier once per session and reuses it
+    until users.json changes. The file's version stamp (mtime and size) is the
+    cross-process invalidation signal: a tier change saved by any worker changes
+    the stamp, and every other worker re-reads the user on its next request.
+    """
+    def __init__(self, user_db):
+        self.user_db = user_db
+
+    def current(self):
+        """
+        Returns {"username", "tier", "version"} for this request, or None if the
+        session user no longer exists. Cached on flask.g for the rest of the
+        request and in the session for later ones.
+        """
+        if "entitlement" in g:
+            return g.entitlement
+        username = session.get('username')
+        version = list(self.user_db.reload_if_changed())
+        cached = session.get('entitlement')
+        if cached and cached.get('username') == username and cached.get('version') == version:
+            entitlement = cached
+        else:
+            user = self.user_db.get_user(username) if username else None
+            entitlement = {"username": username, "tier": user.subscription_tier, "version": version} if user else None
+            session['entitlement'] = entitlement
+        g.entitlement = entitlement
+        return entitlement
+
+    def allows(self, feature):
+        entitlement = self.current()
+        return entitlement is not None and tier_allows(entitlement["tier"], feature)
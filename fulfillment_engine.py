@@ -0,0 +1,221 @@
+# fulfillment_engine.py
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from rate_limiter import printify_rate_limiter
+
+FULFILLMENT_DB_FILE = "fulfillment.db"
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 5
+DEFAULT_WORKERS = 8
+
+# Per-order states. An order is only sent while this process holds its lease.
+SEEN = "seen"
+SUBMITTED = "submitted"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+CANCELED = "canceled"  # cancelled in Printify before it was sent; never retried
+
+# Printify order statuses meaning the order must not be sent.
+CANCELED_STATUSES = ("canceled", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fulfillments (
+    order_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    lease_until REAL,
+    last_error TEXT,
+    created_at TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_fulfillments_state ON fulfillments (state);
+"""
+
+
+def iter_order_pages(fetch_page):
+    """Yields every order from a paged `fetch_page(page)` endpoint."""
+    page = 1
+    while True:
+        data = fetch_page(page)
+        if not data or not data.get('data'):
+            return
+        yield from data['data']
+        if page >= data.get('last_page', page):
+            return
+        page += 1
+
+
+class FulfillmentEngine:
+    """
+    Sends on-hold orders to production concurrently, exactly once.
+    Every order moves through seen -> submitted -> confirmed/failed in a shared
+    SQLite table; claiming an order is a single atomic UPDATE, so overlapping runs
+    and other processes skip orders that are already being handled.
+
+    `fetch_pending_page(page)` returns a page of on-hold orders, `send_to_production(order_id)`
+    submits one, and the optional `fetch_order(order_id)` is used to check an order before
+    sending it whenever this run's listing doesn't vouch for it: orders sent before (an
+    expired lease or a failed attempt) and orders left over from an earlier run that are no
+    longer listed as on-hold. Orders found cancelled end in the 'canceled' state.
+    """
+    def __init__(self, fetch_pending_page, send_to_production, fetch_order=None, db_path=FULFILLMENT_DB_FILE,
+                 workers=DEFAULT_WORKERS, rate_limiter=printify_rate_limiter, lease_seconds=LEASE_SECONDS,
+                 max_attempts=MAX_ATTEMPTS):
+        self.fetch_pending_page = fetch_pending_page
+        self.send_to_production = send_to_production
+        self.fetch_order = fetch_order
+        self.db_path = db_path
+        self.workers = workers
+        self.rate_limiter = rate_limiter
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.listed = set()  # order IDs the last discover() saw on-hold
+        self._local = threading.local()
+        self.connection().executescript(_SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # --- State transitions ---
+
+    def discover(self):
+        """Records every on-hold order as 'seen'. Returns the number of new orders."""
+        self.rate_limiter.acquire()
+        orders = list(iter_order_pages(self._limited_fetch_page))
+        self.listed = {str(order['id']) for order in orders}
+        now = time.time()
+        cursor = self.connection().executemany(
+            "INSERT OR IGNORE INTO fulfillments (order_id, state, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            [(str(order['id']), SEEN, order.get('created_at'), now) for order in orders],
+        )
+        return cursor.rowcount
+
+    def _limited_fetch_page(self, page):
+        if page > 1:
+            self.rate_limiter.acquire()
+        return self.fetch_pending_page(page)
+
+    def claimable(self):
+        """Returns orders that are new, retryable, or whose lease has expired."""
+        rows = self.connection().execute(
+            "SELECT order_id FROM fulfillments WHERE state = ? OR (state = ? AND attempts < ?) "
+            "OR (state = ? AND lease_until < ?) ORDER BY created_at",
+            (SEEN, FAILED, self.max_attempts, SUBMITTED, time.time()),
+        )
+        return [row["order_id"] for row in rows]
+
+    def claim(self, order_id):
+        """
+        Atomically moves an order to 'submitted' under this worker's lease.
+        Returns the previous state, or None if another worker holds it.
+        """
+        now = time.time()
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT state, attempts, lease_until FROM fulfillments WHERE order_id = ?", (order_id,)).fetchone()
+            claimable = row is not None and (
+                row["state"] == SEEN
+                or (row["state"] == FAILED and row["attempts"] < self.max_attempts)
+                or (row["state"] == SUBMITTED and (row["lease_until"] or 0) < now)
+            )
+            if claimable:
+                conn.execute(
+                    "UPDATE fulfillments SET state = ?, attempts = attempts + 1, claimed_by = ?, lease_until = ?, updated_at = ? "
+                    "WHERE order_id = ?",
+                    (SUBMITTED, self.worker_id, now + self.lease_seconds, now, order_id),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row["state"] if claimable else None
+
+    def _finish(self, order_id, state, error=None):
+        self.connection().execute(
+            "UPDATE fulfillments SET state = ?, last_error = ?, lease_until = NULL, updated_at = ? "
+            "WHERE order_id = ? AND claimed_by = ?",
+            (state, error, time.time(), order_id, self.worker_id),
+        )
+
+    def _process(self, order_id):
+        previous_state = self.claim(order_id)
+        if previous_state is None:
+            return "skipped"
+
+        # A lease that expired mid-submission, or a send that errored (e.g. timed out),
+        # may still have gone through, and an order seen by an earlier (possibly crashed)
+        # run may have been sent or cancelled since; check before sending.
+        listed = order_id in self.listed
+        if previous_state in (SUBMITTED, FAILED) or not listed:
+            if self.fetch_order is None:
+                if not listed:
+                    error = "Not listed as on-hold in this run and no fetch_order to check it."
+                    self._finish(order_id, FAILED, error)
+                    print(f"      ❌ Skipped order {order_id}: {error}")
+                    return FAILED
+            else:
+                try:
+                    self.rate_limiter.acquire()
+                    order = self.fetch_order(order_id)
+                except Exception as e:
+                    self._finish(order_id, FAILED, f"Could not check order before sending: {e}")
+                    print(f"      ❌ Could not check order {order_id} before sending: {e}")
+                    return FAILED
+                status = order.get('status') if order else None
+                if status in CANCELED_STATUSES:
+                    self._finish(order_id, CANCELED)
+                    print(f"      🚫 Order {order_id} was cancelled; not sending it.")
+                    return CANCELED
+                if status not in (None, 'on-hold'):
+                    self._finish(order_id, CONFIRMED)
+                    print(f"      ✅ Order {order_id} was already sent to production ({status}).")
+                    return CONFIRMED
+
+        try:
+            self.rate_limiter.acquire()
+            response = self.send_to_production(order_id)
+        except Exception as e:
+            response, error = None, str(e)
+        else:
+            error = None if response else "send_to_production returned no response"
+
+        if response:
+            self._finish(order_id, CONFIRMED)
+            print(f"      ✅ Success! Order {order_id} sent to production.")
+            return CONFIRMED
+        self._finish(order_id, FAILED, error)
+        print(f"      ❌ Failed to send order {order_id} to production: {error}")
+        return FAILED
+
+    def run(self):
+        """Discovers on-hold orders and submits every claimable one concurrently."""
+        new_orders = self.discover()
+        order_ids = self.claimable()
+        print(f"   - {new_orders} new on-hold order(s); {len(order_ids)} to submit with {self.workers} workers.")
+
+        summary = {CONFIRMED: 0, FAILED: 0, CANCELED: 0, "skipped": 0}
+        if order_ids:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for outcome in executor.map(self._process, order_ids):
+                    summary[outcome] += 1
+        return summary
+
+    def counts(self):
+        """Returns the number of tracked orders in each state."""
+        rows = self.connection().execute("SELECT state, COUNT(*) AS n FROM fulfillments GROUP BY state")
+        return {row["state"]: row["n"] for row in rows}
@@ -0,0 +1,246 @@
+# image_store.py
+
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from PIL import Image
+
+IMAGE_STORE_DIR = "generated_images"
+IMAGE_DB_FILE = "images.db"
+THUMBNAIL_SIZES = (128, 256, 512)
+THUMBNAIL_FORMAT = "WEBP"
+DUPLICATE_DISTANCE = 6       # max differing bits between two 64-bit dHashes
+HASH_BANDS = 8               # 8 bands of 8 bits: any pair within 7 bits shares a band
+DOWNLOAD_TIMEOUT = 30
+MAX_DOWNLOAD_BYTES = 25 * 1024 * 1024
+# Hosts (and their subdomains) images may be downloaded from: the Replicate and OpenAI CDNs for
+# generated images and Printify for product mockups. Extend with IMAGE_SOURCE_HOSTS (comma-separated).
+ALLOWED_IMAGE_HOSTS = ("replicate.delivery", "oaidalleapiprodscus.blob.core.windows.net", "printify.com") + tuple(
+    host.strip().lower() for host in os.environ.get("IMAGE_SOURCE_HOSTS", "").split(",") if host.strip()
+)
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_allowed_url(url, hosts=ALLOWED_IMAGE_HOSTS):
+    """True for https URLs on one of `hosts` (or a subdomain), so downloads never reach internal addresses."""
+    try:
+        parts = urlsplit(url)
+    except (TypeError, ValueError):
+        return False
+    host = (parts.hostname or "").lower()
+    if parts.scheme != "https" or parts.username or parts.password or not host:
+        return False
+    return any(host == allowed or host.endswith("." + allowed) for allowed in hosts)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    digest TEXT PRIMARY KEY,
+    format TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    phash TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+-- Where each image was downloaded from, so a URL is only ever fetched once.
+CREATE TABLE IF NOT EXISTS sources (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL
+);
+-- Perceptual hash split into bands; near-duplicates share at least one band.
+CREATE TABLE IF NOT EXISTS phash_bands (
+    band INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (band, value, digest)
+);
+"""
+
+
+def perceptual_hash(image):
+    """64-bit difference hash: compares neighbouring pixels of a 9x8 grayscale copy."""
+    pixels = image.convert("L").resize((9, 8), Image.LANCZOS).tobytes()
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+def _bands(phash):
+    width = 64 // HASH_BANDS
+    return [(band, (phash >> (band * width)) & ((1 << width) - 1)) for band in range(HASH_BANDS)]
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+class ImageStore:
+    """
+    Content-addressed store for generated images. Each image is kept once under
+    its SHA-256 digest, with thumbnails rendered up front at THUMBNAIL_SIZES, so
+    files never change and can be served with long-lived cache headers. A
+    perceptual-hash index finds visually near-identical images.
+    """
+    def __init__(self, root=IMAGE_STORE_DIR, db_path=IMAGE_DB_FILE, thumbnail_sizes=THUMBNAIL_SIZES):
+        self.root = root
+        self.db_path = db_path
+        self.thumbnail_sizes = tuple(thumbnail_sizes)
+        self.session = requests.Session()
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        """Creates the image tables on first use; constructing the store touches no files."""
+        with self._schema_lock:
+            if not self._schema_ready:
+                conn.executescript(_SCHEMA)
+                self._schema_ready = True
+
+    # --- Paths ---
+
+    def path(self, digest):
+        """Path of the original image, or None for an unknown or malformed digest."""
+        record = self.get(digest)
+        if record is None:
+            return None
+        return os.path.join(self.root, digest[:2], f"{digest}.{record['format'].lower()}")
+
+    def thumbnail_path(self, digest, size):
+        if size not in self.thumbnail_sizes or self.get(digest) is None:
+            return None
+        return os.path.join(self.root, digest[:2], f"{digest}_{size}.{THUMBNAIL_FORMAT.lower()}")
+
+    # --- Storing ---
+
+    def store_url(self, url):
+        """
+        Downloads `url` unless it was stored before. Returns the image record.
+        Only https URLs on ALLOWED_IMAGE_HOSTS are fetched, and redirects are not followed.
+        """
+        if not is_allowed_url(url):
+            raise ValueError(f"Refusing to fetch {url}: not an https URL on an allowed image host.")
+        row = self.connection().execute("SELECT digest FROM sources WHERE url = ?", (url,)).fetchone()
+        if row is not None:
+            record = self.get(row["digest"])
+            if record is not None:
+                return record
+
+        with self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT, allow_redirects=False) as response:
+            response.raise_for_status()
+            if response.status_code != 200:
+                raise ValueError(f"Unexpected response {response.status_code} for {url}.")
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data.extend(chunk)
+                if len(data) > MAX_DOWNLOAD_BYTES:
+                    raise ValueError(f"Image at {url} is larger than {MAX_DOWNLOAD_BYTES} bytes.")
+        record = self.store_bytes(bytes(data))
+        self.connection().execute(
+            "INSERT OR REPLACE INTO sources (url, digest) VALUES (?, ?)", (url, record["digest"])
+        )
+        return record
+
+    def store_bytes(self, data):
+        """Stores raw image bytes (idempotent). Returns the image record."""
+        digest = hashlib.sha256(data).hexdigest()
+        existing = self.get(digest)
+        if existing is not None:
+            return existing
+
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except Exception as e:
+            raise ValueError(f"Not a readable image: {e}")
+        image_format = (image.format or "PNG").upper()
+        phash = perceptual_hash(image)
+
+        _write_atomic(os.path.join(self.root, digest[:2], f"{digest}.{image_format.lower()}"), data)
+        for size in self.thumbnail_sizes:
+            thumbnail = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+            thumbnail.thumbnail((size, size), Image.LANCZOS)
+            buf = io.BytesIO()
+            thumbnail.save(buf, format=THUMBNAIL_FORMAT, quality=85)
+            _write_atomic(os.path.join(self.root, digest[:2], f"{digest}_{size}.{THUMBNAIL_FORMAT.lower()}"), buf.getvalue())
+
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR IGNORE INTO images (digest, format, width, height, size_bytes, phash, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (digest, image_format, image.width, image.height, len(data), f"{phash:016x}", time.time()),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO phash_bands (band, value, digest) VALUES (?, ?, ?)",
+                [(band, value, digest) for band, value in _bands(phash)],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(digest)
+
+    # --- Lookups ---
+
+    def get(self, digest):
+        if not isinstance(digest, str) or not _DIGEST_RE.match(digest):
+            return None
+        row = self.connection().execute("SELECT * FROM images WHERE digest = ?", (digest,)).fetchone()
+        return dict(row) if row else None
+
+    def find_duplicates(self, digest, max_distance=DUPLICATE_DISTANCE):
+        """
+        Returns [{"digest", "distance"}] for stored images that look nearly
+        identical to `digest`, closest first.
+        """
+        record = self.get(digest)
+        if record is None:
+            return []
+        phash = int(record["phash"], 16)
+        bands = _bands(phash)
+        rows = self.connection().execute(
+            "SELECT DISTINCT images.digest, images.phash FROM phash_bands "
+            "JOIN images ON images.digest = phash_bands.digest "
+            f"WHERE ({' OR '.join('(band = ? AND value = ?)' for _ in bands)}) AND images.digest != ?",
+            [part for band in bands for part in band] + [digest],
+        )
+        duplicates = []
+        for row in rows:
+            distance = hamming_distance(phash, int(row["phash"], 16))
+            if distance <= max_distance:
+                duplicates.append({"digest": row["digest"], "distance": distance})
+        return sorted(duplicates, key=lambda duplicate: duplicate["distance"])
+
+
+image_store = ImageStore()
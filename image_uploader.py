@@ -0,0 +1,204 @@
+# image_uploader.py
+
+import base64
+import csv
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from rate_limiter import printify_rate_limiter
+
+IMAGE_INDEX_FILE = "image_index.json"
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".svg"}
+DEFAULT_UPLOAD_WORKERS = 4
+HASH_CHUNK_SIZE = 1024 * 1024
+SAVE_EVERY = 20  # uploads between index saves, so an interrupted run keeps its progress
+
+
+def hash_file(path):
+    """Returns the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageIndex:
+    """
+    Persistent map of content hash -> Printify image ID. Also remembers the
+    (size, mtime) each file had when it was hashed, so unchanged files are not re-read.
+    """
+    def __init__(self, index_path=IMAGE_INDEX_FILE):
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        data = self._load_index()
+        self.images = data.get("images", {})
+        self.files = data.get("files", {})
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save(self):
+        with self._lock:
+            data = {"images": dict(self.images), "files": dict(self.files)}
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.index_path)
+
+    def hash_for(self, path):
+        """Returns the content hash of a file, reusing the cached hash if it is unchanged."""
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        cached = self.files.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        file_hash = hash_file(path)
+        with self._lock:
+            self.files[key] = [stat.st_size, stat.st_mtime_ns, file_hash]
+        return file_hash
+
+    def get(self, file_hash):
+        entry = self.images.get(file_hash)
+        return entry["image_id"] if entry else None
+
+    def add(self, file_hash, image_id, file_name):
+        with self._lock:
+            self.images[file_hash] = {"image_id": image_id, "file_name": file_name, "uploaded_at": time.time()}
+
+
+def image_key(path, folder):
+    """Key of an image in a resolved map: its path relative to `folder`, with forward slashes."""
+    return os.path.relpath(path, folder).replace(os.sep, "/")
+
+def list_image_files(folder):
+    """Walks a folder and returns the paths of all supported image files."""
+    paths = []
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.join(root, name))
+    return paths
+
+def _upload(client, path, rate_limiter):
+    with open(path, 'rb') as f:
+        contents = base64.b64encode(f.read()).decode('ascii')
+    rate_limiter.acquire()
+    response = client.upload_image(os.path.basename(path), contents)
+    if not response or 'id' not in response:
+        raise Exception(f"Upload failed. Response: {response}")
+    return response['id']
+
+def ingest_image_folder(folder, client=None, index=None, workers=DEFAULT_UPLOAD_WORKERS, rate_limiter=printify_rate_limiter):
+    """
+    Hashes every image in `folder`, uploads only content that is not already in the
+    index, and returns a {relative_path: image_id} map for every image that resolved
+    (see `image_key`). The index is saved every SAVE_EVERY uploads and at the end.
+    """
+    print(f"🖼️  Image Uploader: Scanning '{folder}'...")
+    index = index or ImageIndex()
+    paths = list_image_files(folder)
+    resolved = {}
+    pending = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        hashes = dict(zip(paths, executor.map(index.hash_for, paths)))
+        for path, file_hash in hashes.items():
+            image_id = index.get(file_hash)
+            if image_id:
+                resolved[image_key(path, folder)] = image_id
+            else:
+                # Identical artwork saved under several names is uploaded once.
+                pending.setdefault(file_hash, []).append(path)
+
+        print(f"   - {len(paths)} images found, {len(resolved)} already uploaded, {len(pending)} to upload.")
+        if pending and client is None:
+            from api_clients import PrintifyApiClient
+            client = PrintifyApiClient()
+
+        futures = {executor.submit(_upload, client, same_paths[0], rate_limiter): (file_hash, same_paths)
+                   for file_hash, same_paths in pending.items()}
+        uploaded = 0
+        try:
+            for future in as_completed(futures):
+                file_hash, same_paths = futures[future]
+                try:
+                    image_id = future.result()
+                except Exception as e:
+                    print(f"   ❌ FAILURE uploading '{same_paths[0]}': {e}")
+                    continue
+                index.add(file_hash, image_id, image_key(same_paths[0], folder))
+                for path in same_paths:
+                    resolved[image_key(path, folder)] = image_id
+                print(f"   ✅ Uploaded '{image_key(same_paths[0], folder)}' as {image_id}")
+                uploaded += 1
+                if uploaded % SAVE_EVERY == 0:
+                    index.save()
+        finally:
+            index.save()
+    return resolved
+
+def _unambiguous(pairs):
+    """Builds {key: image_id} from (key, image_id) pairs, leaving out keys that map to different images."""
+    mapping, ambiguous = {}, set()
+    for key, image_id in pairs:
+        if mapping.setdefault(key, image_id) != image_id:
+            ambiguous.add(key)
+    for key in ambiguous:
+        del mapping[key]
+    return mapping
+
+def write_image_ids_to_csv(csv_path, image_ids, defaults=None):
+    """
+    Fills in the `image_id` column of a bulk CSV from a {relative_path: image_id} map.
+    Rows are matched on an `image_file` column if present (its relative path, or just
+    the file name when only one image has it), otherwise on a file whose name (without
+    extension) equals the row title. Names shared by different images in different
+    subfolders are not matched by name. Empty cells named in `defaults` (e.g.
+    blueprint_id) are filled too. The CSV is rewritten atomically.
+    """
+    by_name = _unambiguous((os.path.basename(key), image_id) for key, image_id in image_ids.items())
+    by_stem = _unambiguous((os.path.splitext(os.path.basename(key))[0].lower(), image_id)
+                           for key, image_id in image_ids.items())
+    defaults = {key: value for key, value in (defaults or {}).items() if value}
+    updated = 0
+
+    with open(csv_path, mode='r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        fieldnames = list(reader.fieldnames or [])
+        rows = list(reader)
+    for column in ['image_id'] + list(defaults):
+        if column not in fieldnames:
+            fieldnames.append(column)
+
+    for row in rows:
+        image_file = row.get('image_file')
+        if image_file:
+            relative = os.path.normpath(image_file.strip().replace("\\", "/")).replace(os.sep, "/")
+            image_id = image_ids.get(relative) or by_name.get(os.path.basename(relative))
+        else:
+            image_id = by_stem.get((row.get('title') or '').strip().lower())
+        if image_id and row.get('image_id') != image_id:
+            row['image_id'] = image_id
+            updated += 1
+        for key, value in defaults.items():
+            if not row.get(key):
+                row[key] = value
+
+    directory = os.path.dirname(os.path.abspath(csv_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".images-", suffix=".csv", dir=directory)
+    with os.fdopen(fd, mode='w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, csv_path)
+    print(f"   - Wrote {updated} image ID(s) into '{csv_path}'.")
+    return updated
@@ -0,0 +1,112 @@
+# job_progress.py
+
+import threading
+import time
+from collections import deque
+
+PUBLISH_INTERVAL = 0.5  # seconds between published snapshots
+MAX_RECENT_ERRORS = 5
+MAX_ITEMS = 50  # partial results kept (and re-published) per job
+
+_current = threading.local()
+
+
+class ProgressReporter:
+    """
+    Tracks done/total for one job and publishes a snapshot (counts, throughput,
+    ETA, the latest errors and up to MAX_ITEMS partial results) through
+    `publish(snapshot)`. Counting is in memory; snapshots are published at most
+    every `min_interval` seconds, so `advance()` is cheap enough to call once per row.
+    `job_id` identifies the running job, e.g. to key work a retry can pick up again.
+    """
+    def __init__(self, publish, total=None, min_interval=PUBLISH_INTERVAL, job_id=None):
+        self.publish = publish
+        self.job_id = job_id
+        self.total = total
+        self.min_interval = min_interval
+        self.done = 0
+        self.failed = 0
+        self.message = None
+        self.errors = deque(maxlen=MAX_RECENT_ERRORS)
+        self.items = deque(maxlen=MAX_ITEMS)
+        self._started = time.monotonic()
+        self._last_publish = 0.0
+        self._lock = threading.Lock()
+
+    def set_total(self, total):
+        with self._lock:
+            self.total = total
+        self.flush()
+
+    def advance(self, count=1, error=None, message=None, item=None):
+        """
+        Records `count` finished items; pass `error` when the item failed. Pass
+        `item` to stream a partial result to followers before the job finishes.
+        """
+        with self._lock:
+            self.done += count
+            if error is not None:
+                self.failed += count
+                self.errors.append(str(error))
+            if message is not None:
+                self.message = message
+            if item is not None:
+                self.items.append(item)
+            due = time.monotonic() - self._last_publish >= self.min_interval
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            throughput = self.done / elapsed if elapsed > 0 else 0.0
+            eta = None
+            if self.total is not None and throughput > 0:
+                eta = round(max(self.total - self.done, 0) / throughput, 1)
+            return {
+                "done": self.done,
+                "total": self.total,
+                "failed": self.failed,
+                "throughput": round(throughput, 2),
+                "eta_seconds": eta,
+                "elapsed_seconds": round(elapsed, 1),
+                "message": self.message,
+                "errors": list(self.errors),
+                "items": list(self.items),
+            }
+
+    def flush(self):
+        """Publishes the current snapshot immediately."""
+        snapshot = self.snapshot()
+        with self._lock:
+            self._last_publish = time.monotonic()
+        try:
+            self.publish(snapshot)
+        except Exception as e:
+            print(f"⚠️ Could not publish job progress: {e}")
+
+
+class _NullProgress:
+    """Used outside of jobs so callers can report progress unconditionally."""
+    job_id = None
+
+    def set_total(self, total):
+        pass
+
+    def advance(self, count=1, error=None, message=None, item=None):
+        pass
+
+    def flush(self):
+        pass
+
+
+NULL_PROGRESS = _NullProgress()
+
+
+def current_progress():
+    """Returns the reporter of the job running on this thread, or a no-op reporter."""
+    return getattr(_current, "reporter", None) or NULL_PROGRESS
+
+def set_current_progress(reporter):
+    """Binds `reporter` to this thread (None to clear it)."""
+    _current.reporter = reporter
@@ -0,0 +1,361 @@
+# job_store.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+JOBS_DB_FILE = "jobs.db"
+RESULTS_DIR = "job_results"
+LEASE_SECONDS = 60
+MAX_ATTEMPTS = 3
+RESULT_SPILL_BYTES = 64 * 1024      # larger results are written to RESULTS_DIR
+RESULT_TTL_SECONDS = 7 * 24 * 3600  # finished jobs are purged after a week
+MAX_FINISHED_JOBS = 10000
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    task TEXT NOT NULL,
+    args TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    timeout REAL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    lease_until REAL,
+    result TEXT,
+    created_at TEXT NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result_path TEXT,
+    owner TEXT,
+    max_attempts INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_priority ON jobs (status, priority, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_finished ON jobs (status, finished_at);
+
+-- Latest progress snapshot per job; seq increases on every publish.
+CREATE TABLE IF NOT EXISTS job_progress (
+    job_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+-- Per-status counts kept current by triggers, so counting never scans jobs.
+CREATE TABLE IF NOT EXISTS job_counts (
+    status TEXT PRIMARY KEY,
+    n INTEGER NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS trg_jobs_insert AFTER INSERT ON jobs BEGIN
+    INSERT INTO job_counts (status, n) VALUES (NEW.status, 1)
+    ON CONFLICT (status) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_jobs_status AFTER UPDATE OF status ON jobs WHEN OLD.status != NEW.status BEGIN
+    UPDATE job_counts SET n = n - 1 WHERE status = OLD.status;
+    INSERT INTO job_counts (status, n) VALUES (NEW.status, 1)
+    ON CONFLICT (status) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_jobs_delete AFTER DELETE ON jobs BEGIN
+    UPDATE job_counts SET n = n - 1 WHERE status = OLD.status;
+END;
+"""
+
+
+def _encode_result(result):
+    # Values JSON can't represent (e.g. file-output objects) are stored as strings.
+    try:
+        return json.dumps(result, default=str)
+    except ValueError:
+        return json.dumps(str(result))
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class JobStore:
+    """
+    A SQLite (WAL) job table shared by every process on the host. Jobs are
+    claimed with an atomic lease, so any web worker or a dedicated worker process
+    can run them, and any process can report their status.
+    """
+    def __init__(self, db_path=JOBS_DB_FILE, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS,
+                 results_dir=RESULTS_DIR, spill_bytes=RESULT_SPILL_BYTES):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.results_dir = results_dir
+        self.spill_bytes = spill_bytes
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _ensure_schema(self, conn):
+        """Creates the schema on first use, so importing a module never creates a database file."""
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (("result_path", "TEXT"), ("owner", "TEXT"), ("max_attempts", "INTEGER")):
+                if columns and column not in columns:
+                    try:
+                        conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+                    except sqlite3.OperationalError:
+                        pass  # another process migrated first
+            conn.executescript(_SCHEMA)
+            self._transaction(self._reconcile_counts)
+            self._schema_ready = True
+
+    @staticmethod
+    def _reconcile_counts(conn):
+        """Rebuilds job_counts from the jobs table (once per process start)."""
+        conn.execute("DELETE FROM job_counts")
+        conn.execute("INSERT INTO job_counts (status, n) SELECT status, COUNT(*) FROM jobs GROUP BY status")
+
+    def connection(self):
+        """Returns this thread's connection to the store."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._ensure_schema(conn)
+        return conn
+
+    def _transaction(self, work):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    # --- Producers ---
+
+    def enqueue(self, task, args=(), kwargs=None, priority=0, timeout=None, max_pending=None, owner=None,
+                max_attempts=None):
+        """
+        Adds a job and returns its ID, or None if `max_pending` jobs are already queued.
+        Arguments must be JSON-serializable. `owner` is the user who submitted it.
+        `max_attempts` overrides the store's limit on how often a job whose worker
+        died is started again (1 for tasks that must never run twice).
+        """
+        job_id = str(uuid.uuid4())
+        row = (job_id, task, json.dumps(list(args)), json.dumps(kwargs or {}), priority, timeout,
+               PENDING, datetime.now(timezone.utc).isoformat(timespec='seconds'), owner, max_attempts)
+
+        def work(conn):
+            if max_pending is not None and self.count(PENDING) >= max_pending:
+                return None
+            conn.execute(
+                "INSERT INTO jobs (id, task, args, kwargs, priority, timeout, status, created_at, owner, max_attempts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row,
+            )
+            return job_id
+        return self._transaction(work)
+
+    def cancel(self, job_id):
+        """Cancels a pending or running job. Returns True if its status changed."""
+        cursor = self.connection().execute(
+            "UPDATE jobs SET status = ?, lease_until = NULL, finished_at = ? WHERE id = ? AND status IN (?, ?)",
+            (CANCELLED, time.time(), job_id, PENDING, RUNNING),
+        )
+        return cursor.rowcount == 1
+
+    # --- Workers ---
+
+    @staticmethod
+    def _task_filter(tasks):
+        if tasks is None:
+            return "", ()
+        return f" AND task IN ({', '.join('?' for _ in tasks)})", tuple(tasks)
+
+    def has_claimable(self, tasks=None):
+        """
+        Cheap read-only check for a job `claim` could take, so idle pollers
+        don't take the write lock when there is nothing to do.
+        """
+        if tasks is not None and not tasks:
+            return False
+        task_filter, task_params = self._task_filter(tasks)
+        row = self.connection().execute(
+            f"SELECT 1 FROM jobs WHERE (status = ? OR (status = ? AND lease_until < ?)){task_filter} LIMIT 1",
+            (PENDING, RUNNING, time.time(), *task_params),
+        ).fetchone()
+        return row is not None
+
+    def claim(self, worker_id, tasks=None):
+        """
+        Atomically leases the highest-priority pending job (or one whose previous
+        worker died and let its lease expire) to `worker_id`. Returns the job or None.
+        `tasks` limits the claim to task names this worker can run.
+        """
+        now = time.time()
+        if tasks is not None and not tasks:
+            return None
+        task_filter, task_params = self._task_filter(tasks)
+
+        def work(conn):
+            # Jobs abandoned by a dead worker too many times are given up on.
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, lease_until = NULL, finished_at = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= COALESCE(max_attempts, ?)",
+                (FAILED, json.dumps("Worker lost the job too many times."), now, RUNNING, now, self.max_attempts),
+            )
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE (status = ? OR (status = ? AND lease_until < ?)){task_filter} "
+                "ORDER BY priority, created_at LIMIT 1",
+                (PENDING, RUNNING, now, *task_params),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, claimed_by = ?, lease_until = ?, started_at = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (RUNNING, worker_id, now + self.lease_seconds, now, row["id"]),
+            )
+            return row
+        row = self._transaction(work)
+        if row is None:
+            return None
+        job = self._to_dict(row)
+        job["started_at"] = now
+        return job
+
+    def release(self, job_id, worker_id):
+        """Returns a job claimed by `worker_id` but never started to the queue."""
+        self.connection().execute(
+            "UPDATE jobs SET status = ?, claimed_by = NULL, lease_until = NULL, started_at = NULL, "
+            "attempts = attempts - 1 WHERE id = ? AND claimed_by = ? AND status = ?",
+            (PENDING, job_id, worker_id, RUNNING),
+        )
+
+    def renew(self, job_ids, worker_id):
+        """Extends the leases this worker holds so live jobs are not reclaimed."""
+        self.connection().executemany(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND claimed_by = ? AND status = ?",
+            [(time.time() + self.lease_seconds, job_id, worker_id, RUNNING) for job_id in job_ids],
+        )
+
+    def finish(self, job_id, worker_id, status, result=None):
+        """
+        Records a job's outcome if `worker_id` still holds it. Returns False when the
+        job was cancelled, timed out or reclaimed in the meantime.
+        Results larger than `spill_bytes` are written to a file instead of the table.
+        """
+        encoded, result_path = _encode_result(result), None
+        if len(encoded) > self.spill_bytes:
+            os.makedirs(self.results_dir, exist_ok=True)
+            result_path = os.path.join(self.results_dir, f"{job_id}.json")
+            with open(result_path, 'w', encoding='utf-8') as f:
+                f.write(encoded)
+            encoded = None
+        cursor = self.connection().execute(
+            "UPDATE jobs SET status = ?, result = ?, result_path = ?, lease_until = NULL, finished_at = ? "
+            "WHERE id = ? AND claimed_by = ? AND status = ?",
+            (status, encoded, result_path, time.time(), job_id, worker_id, RUNNING),
+        )
+        if cursor.rowcount != 1 and result_path:
+            _remove_files([result_path])
+        return cursor.rowcount == 1
+
+    def publish_progress(self, job_id, snapshot):
+        """Stores the latest progress snapshot for a job."""
+        self.connection().execute(
+            "INSERT INTO job_progress (job_id, seq, data, updated_at) VALUES (?, 1, ?, ?) "
+            "ON CONFLICT (job_id) DO UPDATE SET seq = seq + 1, data = excluded.data, updated_at = excluded.updated_at",
+            (job_id, json.dumps(snapshot), time.time()),
+        )
+
+    def get_progress(self, job_id):
+        """Returns (seq, snapshot) for a job, or (0, None) if it has not reported progress."""
+        row = self.connection().execute("SELECT seq, data FROM job_progress WHERE job_id = ?", (job_id,)).fetchone()
+        return (row["seq"], json.loads(row["data"])) if row else (0, None)
+
+    # --- Retention ---
+
+    def purge(self, ttl_seconds=RESULT_TTL_SECONDS, max_finished=MAX_FINISHED_JOBS):
+        """
+        Deletes finished jobs older than `ttl_seconds`, then the oldest ones beyond
+        `max_finished`, along with any spilled result files. Returns the number deleted.
+        """
+        placeholders = ", ".join("?" for _ in FINISHED_STATUSES)
+
+        def work(conn):
+            doomed = conn.execute(
+                f"SELECT id, result_path FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?",
+                (*FINISHED_STATUSES, time.time() - ttl_seconds),
+            ).fetchall()
+            excess = sum(self.counts().get(status, 0) for status in FINISHED_STATUSES) - len(doomed) - max_finished
+            if excess > 0:
+                doomed += conn.execute(
+                    f"SELECT id, result_path FROM jobs WHERE status IN ({placeholders}) AND finished_at >= ? "
+                    "ORDER BY finished_at LIMIT ?",
+                    (*FINISHED_STATUSES, time.time() - ttl_seconds, excess),
+                ).fetchall()
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(row["id"],) for row in doomed])
+            conn.executemany("DELETE FROM job_progress WHERE job_id = ?", [(row["id"],) for row in doomed])
+            return doomed
+        doomed = self._transaction(work)
+        _remove_files(row["result_path"] for row in doomed if row["result_path"])
+        return len(doomed)
+
+    # --- Status ---
+
+    def get(self, job_id):
+        """Returns one job, loading its result from disk if it was spilled."""
+        row = self.connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = self._to_dict(row)
+        if job["result_path"]:
+            try:
+                with open(job["result_path"], 'r', encoding='utf-8') as f:
+                    job["result"] = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                job["result"] = None
+        return job
+
+    def by_status(self, status, limit=100):
+        """Returns the newest jobs with `status` (spilled results are not loaded)."""
+        rows = self.connection().execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+        )
+        return [self._to_dict(row) for row in rows]
+
+    def count(self, status):
+        row = self.connection().execute("SELECT n FROM job_counts WHERE status = ?", (status,)).fetchone()
+        return row[0] if row else 0
+
+    def counts(self):
+        """Returns the number of jobs in each status."""
+        return {row["status"]: row["n"] for row in self.connection().execute("SELECT status, n FROM job_counts WHERE n > 0")}
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["args"] = json.loads(job["args"])
+        job["kwargs"] = json.loads(job["kwargs"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
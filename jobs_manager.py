@@ -1,30 +1,396 @@
+import atexit
+import importlib
+import os
+from collections import deque
+import socket
+import sys
+import threading
+import time
 import uuid
-from datetime import datetime
+from job_store import JobStore, JOBS_DB_FILE, PENDING, COMPLETED, FAILED, FINISHED_STATUSES
+from job_progress import ProgressReporter, set_current_progress
+from process_lane import ProcessLane
+
+# Lower numbers run first.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+# Task kinds. I/O-bound tasks run on worker threads; CPU-bound ones in a process pool.
+IO = "io"
+CPU = "cpu"
+
+DEFAULT_WORKERS = 4
+# Processes in the CPU lane of each manager. Every gunicorn worker has its own
+# manager, so this is kept small; raise JOB_CPU_WORKERS on a dedicated worker host.
+DEFAULT_CPU_WORKERS = int(os.environ.get("JOB_CPU_WORKERS", "2"))
+DEFAULT_QUEUE_SIZE = 100
+# Threads stuck on a timed-out or cancelled job keep running until it returns.
+# Each lane gets at most this many replacements while they are still alive.
+MAX_DETACHED_WORKERS = 4
+POLL_INTERVAL = 1.0
+PURGE_INTERVAL = 300
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
 
 class JobsManager:
-    def __init__(self):
-        self.jobs = {}
-
-    def add_job(self, target, args):
-        job_id = str(uuid.uuid4())
-        self.jobs[job_id] = {
-            "target": target,
-            "args": args,
-            "status": "pending",
-            "created_at": datetime.utcnow(),
-            "result": None
-        }
+    """
+    Runs background jobs on a fixed pool of worker threads fed by a durable,
+    bounded priority queue (see job_store.JobStore). Every process that starts
+    workers pulls from the same queue, so jobs submitted by one gunicorn worker
+    can run in any process and their status is visible everywhere.
+
+    Jobs refer to tasks by name; register each callable with `register_task`
+    in every process that may run it. Workers only claim tasks registered in
+    their own process.
+
+    Tasks registered with kind=CPU go to a separate lane: `cpu_workers` threads
+    that run only CPU tasks, in a process pool, so heavy work never occupies an
+    I/O worker or the web process's GIL.
+
+    One dispatcher thread per process claims jobs for whichever workers are idle
+    and hands them over; workers never touch the queue themselves, so an idle
+    process costs one read per poll_interval rather than a write lock per thread.
+    """
+    def __init__(self, db_path=JOBS_DB_FILE, max_workers=DEFAULT_WORKERS, max_queue=DEFAULT_QUEUE_SIZE,
+                 poll_interval=POLL_INTERVAL, cpu_workers=DEFAULT_CPU_WORKERS):
+        self.store = JobStore(db_path)
+        self.max_workers = max_workers
+        self.cpu_workers = cpu_workers
+        self.max_queue = max_queue
+        self.poll_interval = poll_interval
+        self.tasks = {}
+        self.task_kinds = {}
+        self.task_attempts = {}
+        self._task_names = {}
+        self.process_lane = ProcessLane(cpu_workers)
+        self._cond = threading.Condition()
+        self._workers = {}  # worker thread -> lane
+        self._detached = {}  # retired worker thread still running its job -> lane
+        self._running = {}  # job_id -> (worker thread, deadline)
+        self._idle = {IO: 0, CPU: 0}                # workers waiting for a job, per lane
+        self._handoff = {IO: deque(), CPU: deque()}  # claimed jobs not yet picked up
+        self._shutdown = False
+        self._watchdog = None
+        self._dispatcher = None
+        self._pid = os.getpid()
+        self.worker_id = self._new_worker_id()
+
+    @staticmethod
+    def _new_worker_id():
+        return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    # --- Task registry ---
+
+    def register_task(self, name, func, kind=IO, max_attempts=None):
+        """
+        Makes `func` runnable as task `name` in this process. CPU tasks must be
+        module-level functions so the process pool can import them.
+        Pass max_attempts=1 for tasks with side effects that must not repeat
+        (e.g. creating products): if the worker dies mid-run the job fails
+        instead of being started again.
+        """
+        if kind not in (IO, CPU):
+            raise ValueError(f"Unknown task kind '{kind}'.")
+        self.tasks[name] = func
+        self.task_kinds[name] = kind
+        self.task_attempts[name] = max_attempts
+        self._task_names[func] = name
+        return func
+
+    def task(self, name, kind=IO, max_attempts=None):
+        """Decorator form of register_task."""
+        def decorator(func):
+            return self.register_task(name, func, kind, max_attempts)
+        return decorator
+
+    def _lane_tasks(self, lane):
+        return [name for name, kind in self.task_kinds.items() if kind == lane]
+
+    def _task_name(self, target):
+        if isinstance(target, str):
+            return target
+        name = self._task_names.get(target)
+        if name is None:
+            raise ValueError(f"{target!r} is not a registered task; call register_task() first.")
+        return name
+
+    # --- Submission ---
+
+    def submit(self, target, args=(), kwargs=None, priority=PRIORITY_NORMAL, timeout=None, owner=None):
+        """Queues a registered task (by name or function) for `owner` and returns its job ID."""
+        if self._shutdown:
+            raise RuntimeError("JobsManager has been shut down.")
+        name = self._task_name(target)
+        job_id = self.store.enqueue(name, args, kwargs, priority, timeout, max_pending=self.max_queue,
+                                    owner=owner, max_attempts=self.task_attempts.get(name))
+        if job_id is None:
+            raise JobQueueFull(f"Job queue is full ({self.max_queue} pending).")
+        self.start()
+        with self._cond:
+            self._cond.notify_all()
         return job_id
 
-    def get_job(self, job_id):
-        return self.jobs.get(job_id)
+    def add_job(self, target, args, priority=PRIORITY_NORMAL, timeout=None):
+        return self.submit(target, args, priority=priority, timeout=timeout)
+
+    def cancel(self, job_id):
+        """
+        Cancels a pending or running job. A pending job never starts; a running
+        job's thread cannot be interrupted, so its result is discarded.
+        Returns True if the job was cancelled.
+        """
+        if not self.store.cancel(job_id):
+            return False
+        with self._cond:
+            if job_id in self._running:
+                self._retire(job_id)
+            for lane, jobs in self._handoff.items():
+                self._handoff[lane] = deque(job for job in jobs if job["id"] != job_id)
+        return True
 
-    def update_job_status(self, job_id, status, result=None):
-        if job_id in self.jobs:
-            self.jobs[job_id]["status"] = status
-            self.jobs[job_id]["result"] = result
+    # --- Status ---
+
+    def get_job(self, job_id):
+        return self.store.get(job_id)
 
     def get_failed_jobs(self):
-        return [job for job in self.jobs.values() if job['status'] == 'failed']
+        return self.store.by_status(FAILED)
+
+    def get_progress(self, job_id):
+        """Returns (seq, snapshot) of the job's latest progress event."""
+        return self.store.get_progress(job_id)
+
+    def events(self, job_id, poll_interval=0.5, heartbeat=15, since_seq=0, max_duration=None):
+        """
+        Yields ("progress", snapshot) whenever the job publishes progress, then one
+        ("done", job) when it finishes, or ("heartbeat", None) while idle. Each
+        snapshot carries its "seq"; pass the last one seen as `since_seq` to resume.
+        With `max_duration`, stops after that many seconds even if the job is still
+        running, so a request never outlives the web server's worker timeout.
+        Works from any process because progress is read from the shared store.
+        """
+        started = last_event = time.monotonic()
+        last_seq = since_seq
+        while True:
+            seq, snapshot = self.store.get_progress(job_id)
+            if seq != last_seq:
+                last_seq, last_event = seq, time.monotonic()
+                yield "progress", {**snapshot, "seq": seq}
+            job = self.store.get(job_id)
+            if job is None or job["status"] in FINISHED_STATUSES:
+                yield "done", job
+                return
+            if time.monotonic() - last_event >= heartbeat:
+                last_event = time.monotonic()
+                yield "heartbeat", None
+            if max_duration is not None and time.monotonic() - started >= max_duration:
+                return
+            time.sleep(poll_interval)
+
+    def count(self, status):
+        """Number of jobs with `status`, read from the trigger-maintained counts table."""
+        return self.store.count(status)
+
+    def counts(self):
+        return self.store.counts()
+
+    def queue_depth(self):
+        return self.store.count(PENDING)
+
+    # --- Workers ---
+
+    def start(self):
+        """Starts this process's workers (also done lazily on first submit)."""
+        with self._cond:
+            if os.getpid() != self._pid:
+                # Forked after workers started: threads do not survive a fork.
+                self._pid = os.getpid()
+                self.worker_id = self._new_worker_id()
+                self._workers.clear()
+                self._detached.clear()
+                self._running.clear()
+                self._idle = {IO: 0, CPU: 0}
+                self._handoff = {IO: deque(), CPU: deque()}
+                self._watchdog = None
+                self._dispatcher = None
+                self.process_lane.reset()
+            self._ensure_workers()
+
+    def _ensure_workers(self):
+        if self._shutdown:
+            return
+        for lane, size in ((IO, self.max_workers), (CPU, self.cpu_workers)):
+            if lane == CPU and not self._lane_tasks(CPU):
+                continue  # no CPU tasks in this process, so no CPU lane threads
+            while True:
+                live = sum(1 for worker_lane in self._workers.values() if worker_lane == lane)
+                detached = sum(1 for worker_lane in self._detached.values() if worker_lane == lane)
+                if live >= size or live + detached >= size + MAX_DETACHED_WORKERS:
+                    break  # the lane runs short until a detached thread returns
+                worker = threading.Thread(target=self._work, args=(lane,), name=f"jobs-{lane}-worker", daemon=True)
+                self._workers[worker] = lane
+                worker.start()
+        if self._watchdog is None:
+            self._watchdog = threading.Thread(target=self._watch, name="jobs-watchdog", daemon=True)
+            self._watchdog.start()
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch, name="jobs-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch(self):
+        """Claims jobs for idle workers. Only checks the queue with a read until there is something to claim."""
+        while True:
+            with self._cond:
+                if self._shutdown:
+                    return
+                lanes = [lane for lane in (IO, CPU) if self._idle[lane] > len(self._handoff[lane])]
+            claimed = False
+            for lane in lanes:
+                tasks = self._lane_tasks(lane)
+                if not self.store.has_claimable(tasks):
+                    continue
+                job = self.store.claim(self.worker_id, tasks=tasks)
+                if job is None:
+                    continue  # another process got there first
+                with self._cond:
+                    self._handoff[lane].append(job)
+                    self._cond.notify_all()
+                claimed = True
+            if not claimed:
+                with self._cond:
+                    if not self._shutdown:
+                        self._cond.wait(self.poll_interval)
+
+    def _next_job(self, lane):
+        """Blocks until the dispatcher hands this worker a job; returns None once it should stop."""
+        me = threading.current_thread()
+        with self._cond:
+            self._idle[lane] += 1
+            self._cond.notify_all()
+            try:
+                while True:
+                    if self._shutdown or me not in self._workers:
+                        return None
+                    if self._handoff[lane]:
+                        job = self._handoff[lane].popleft()
+                        deadline = job["started_at"] + job["timeout"] if job["timeout"] else None
+                        self._running[job["id"]] = (me, deadline)
+                        return job
+                    self._cond.wait()
+            finally:
+                self._idle[lane] -= 1
+
+    def _work(self, lane):
+        me = threading.current_thread()
+        while True:
+            job = self._next_job(lane)
+            if job is None:
+                with self._cond:
+                    if self._detached.pop(me, None) is not None:
+                        self._ensure_workers()  # frees a slot for a replacement
+                return
+            func = self.tasks.get(job["task"])
+            reporter = ProgressReporter(lambda snapshot, job_id=job["id"]: self.store.publish_progress(job_id, snapshot),
+                                        job_id=job["id"])
+            set_current_progress(reporter)
+            try:
+                if func is None:
+                    raise LookupError(f"Task '{job['task']}' is not registered in this process.")
+                if lane == CPU:
+                    result = self.process_lane.run(func, job["args"], job["kwargs"])
+                else:
+                    result = func(*job["args"], **job["kwargs"])
+                status = COMPLETED
+            except Exception as e:
+                result, status = str(e), FAILED
+            finally:
+                set_current_progress(None)
+            if reporter.done or reporter.total is not None:
+                reporter.flush()
+            with self._cond:
+                holder = self._running.get(job["id"])
+                if holder is None or holder[0] is not me:
+                    continue  # cancelled or timed out; another outcome was recorded
+                del self._running[job["id"]]
+            self.store.finish(job["id"], self.worker_id, status, result)
+
+    def _retire(self, job_id):
+        """
+        Detaches the thread stuck on `job_id` and starts a replacement, unless the lane
+        already has MAX_DETACHED_WORKERS replacements running. Caller holds the lock.
+        """
+        worker, _ = self._running.pop(job_id, (None, None))
+        lane = self._workers.pop(worker, None)
+        if lane is not None:
+            self._detached[worker] = lane
+        self._ensure_workers()
+
+    def _watch(self):
+        """Renews leases on running jobs, fails those past their timeout and purges old results."""
+        last_renewal = 0
+        last_purge = time.time()
+        while True:
+            with self._cond:
+                if self._shutdown:
+                    return
+                now = time.time()
+                expired = [job_id for job_id, (_, deadline) in self._running.items() if deadline is not None and deadline <= now]
+                running = [job_id for job_id in self._running if job_id not in expired]
+            try:
+                for job_id in expired:
+                    job = self.store.get(job_id)  # None if it was deleted meanwhile
+                    if job is not None and self.store.finish(
+                            job_id, self.worker_id, FAILED, f"Job timed out after {job['timeout']} seconds."):
+                        print(f"⏱️ Job {job_id} timed out after {job['timeout']}s.")
+                    with self._cond:
+                        self._retire(job_id)
+                if running and now - last_renewal >= self.store.lease_seconds / 3:
+                    self.store.renew(running, self.worker_id)
+                    last_renewal = now
+                if now - last_purge >= PURGE_INTERVAL:
+                    purged = self.store.purge()
+                    if purged:
+                        print(f"🧹 Purged {purged} finished job(s).")
+                    last_purge = now
+            except Exception as e:
+                # e.g. the database is locked for longer than the busy timeout; try again next tick.
+                print(f"⚠️ Job watchdog error: {e}")
+            time.sleep(0.5)
+
+    def shutdown(self, wait=True):
+        """Stops accepting jobs and lets workers finish what they are running."""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+            workers = list(self._workers)
+            unstarted = [job for lane in self._handoff.values() for job in lane]
+            for lane in self._handoff.values():
+                lane.clear()
+        for job in unstarted:
+            self.store.release(job["id"], self.worker_id)
+        if wait:
+            for worker in workers:
+                worker.join()
+        self.process_lane.shutdown(wait=wait)
 
 jobs_manager = JobsManager()
+atexit.register(jobs_manager.shutdown, wait=False)
+
+
+if __name__ == "__main__":
+    # Dedicated worker process: python jobs_manager.py <module that registers tasks> ...
+    # Task modules register on the importable module's manager, not this __main__ copy.
+    from jobs_manager import jobs_manager as manager
+    for module_name in sys.argv[1:]:
+        importlib.import_module(module_name)
+    manager.start()
+    print(f"👷 Job worker {manager.worker_id} running {manager.max_workers} thread(s). Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        manager.shutdown()
@@ -1,6 +1,8 @@
 # legal_checker.py
 
-from logic import get_gemini_vision_pro_model
+from logic import get_gemini_text_model, get_gemini_vision_pro_model
+from llm_cache import llm_cache
+from jobs_manager import jobs_manager, CPU
 from PIL import Image, ImageDraw, ImageFont
 import io
 
@@ -33,7 +35,7 @@ def generate_legal_disclaimer(product_type):
     Generates a generic legal disclaimer for a product page using an AI model.
     """
     try:
-        model = get_gemini_vision_pro_model()
+        model = get_gemini_text_model()
         prompt = f"""
         Generate a concise legal disclaimer for a product page.
         The product is a "{product_type}".
@@ -42,10 +44,10 @@ def generate_legal_disclaimer(product_type):
 
         Return the response as a JSON object with a "disclaimer" key.
         """
-        response = model.generate_content([prompt])
+        response_text = llm_cache.generate_text(model, [prompt], cache=True)
         
         import json
-        clean_response = response.text.strip().replace("```json", "").replace("```", "")
+        clean_response = response_text.strip().replace("```json", "").replace("```", "")
         disclaimer_data = json.loads(clean_response)
         
         return disclaimer_data.get("disclaimer")
@@ -64,8 +66,8 @@ def analyze_image_for_copyright(image_path):
     """
     try:
         model = get_gemini_vision_pro_model()
-        response = model.generate_content([prompt, {"path": image_path}])
-        return {"status": "success", "message": response.text}
+        response_text = llm_cache.generate_text(model, [prompt, {"path": image_path}], cache=True)
+        return {"status": "success", "message": response_text}
     except Exception as e:
         print(f"An error occurred while analyzing image for copyright: {e}")
         return {"status": "failed", "message": f"Failed to analyze image for copyright. Raw response: {str(e)}"}
@@ -91,3 +93,17 @@ def add_watermark(image_path, text="Copyright Printify Manager"):
     except Exception as e:
         print(f"An error occurred while adding watermark: {e}")
         return None
+
+def watermark_image_file(image_path, output_path, text="Copyright Printify Manager"):
+    """
+    Watermarks an image file and writes the PNG to `output_path`.
+    Registered as a CPU-bound job so it runs in the process pool.
+    """
+    buf = add_watermark(image_path, text)
+    if buf is None:
+        raise ValueError(f"Could not watermark '{image_path}'.")
+    with open(output_path, 'wb') as f:
+        f.write(buf.getvalue())
+    return output_path
+
+jobs_manager.register_task("legal.watermark", watermark_image_file, kind=CPU)
@@ -0,0 +1,94 @@
+# llm_cache.py
+
+import hashlib
+import json
+import threading
+from ttl_cache import TTLCache
+
+LLM_CACHE_DB_FILE = "llm_cache.db"
+LLM_CACHE_SIZE = 2048
+LLM_CACHE_TTL = 7 * 24 * 3600
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _fingerprint(part):
+    """
+    Stable, JSON-friendly stand-in for one prompt part; image content is reduced to its
+    hash. Image URLs are fetched (once, through the image store) and keyed on their bytes.
+    """
+    if isinstance(part, str):
+        return part
+    if isinstance(part, (bytes, bytearray)):
+        return {"bytes": _digest(part)}
+    if isinstance(part, dict):
+        if "path" in part:
+            with open(part["path"], "rb") as f:
+                return {"path_sha256": _digest(f.read())}
+        if "url" in part:
+            from image_store import image_store
+            return {"url_sha256": image_store.store_url(part["url"])["digest"]}
+        return {key: _fingerprint(value) for key, value in sorted(part.items())}
+    if isinstance(part, (list, tuple)):
+        return [_fingerprint(item) for item in part]
+    if hasattr(part, "tobytes"):  # e.g. a PIL image
+        return {"image": _digest(part.tobytes())}
+    return repr(part)
+
+def model_name(model):
+    return getattr(model, "model_name", None) or type(model).__name__
+
+def cache_key(model, prompt):
+    """Content address of a request: the model name plus every prompt part."""
+    parts = prompt if isinstance(prompt, (list, tuple)) else [prompt]
+    payload = json.dumps([model_name(model), [_fingerprint(part) for part in parts]], sort_keys=True)
+    return _digest(payload.encode("utf-8"))
+
+
+class LLMCache:
+    """
+    Caches model responses by (model, prompt, image hash) on top of TTLCache, so
+    identical requests from any agent, thread or process are answered from
+    memory or the shared SQLite file instead of calling the API again. Failed
+    calls and empty responses are never cached.
+
+    Caching is opt-in per call: only prompts whose answer should not vary
+    (disclaimers, image analysis, BI queries) pass cache=True. Creative prompts
+    such as ad copy or prompt variations must return something new each time.
+    """
+    def __init__(self, maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, disk_path=LLM_CACHE_DB_FILE):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl, disk_path=disk_path, namespace="llm")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def generate_text(self, model, prompt, cache=False):
+        """Returns `model.generate_content(prompt).text`; with `cache`, from the cache when possible."""
+        if not cache:
+            return model.generate_content(prompt).text
+        loaded = []
+
+        def load():
+            loaded.append(True)
+            return model.generate_content(prompt).text
+        value = self.cache.get_or_load(cache_key(model, prompt), load, cache_if=bool)
+        with self._lock:
+            if loaded:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def stats(self):
+        """Hit/miss counts for this process since start-up."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+llm_cache = LLMCache()
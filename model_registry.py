@@ -0,0 +1,125 @@
+# model_registry.py
+
+import os
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Model used for each kind of request; override with GEMINI_TEXT_MODEL / GEMINI_VISION_MODEL.
+MODEL_NAMES = {
+    "text": os.getenv("GEMINI_TEXT_MODEL", "gemini-pro"),
+    "vision": os.getenv("GEMINI_VISION_MODEL", "gemini-pro-vision"),
+}
+# Calls allowed in flight per model kind, across all threads of the process.
+MODEL_CONCURRENCY = {"text": 8, "vision": 4}
+LATENCY_WINDOW = 200  # recent calls kept per model for percentile metrics
+
+
+class ManagedModel:
+    """
+    A shared GenerativeModel behind a concurrency limit. Exposes the same
+    `generate_content()` and records each call's latency and outcome.
+    """
+    def __init__(self, kind, model, max_concurrency):
+        self.kind = kind
+        self.model = model
+        self.model_name = getattr(model, "model_name", None) or MODEL_NAMES.get(kind, kind)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def generate_content(self, *args, **kwargs):
+        with self._slots:
+            started = time.monotonic()
+            failed = True
+            try:
+                response = self.model.generate_content(*args, **kwargs)
+                failed = False
+                return response
+            finally:
+                with self._lock:
+                    self.calls += 1
+                    self.errors += failed
+                    self.latencies.append(time.monotonic() - started)
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            calls, errors = self.calls, self.errors
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return round(latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000, 1)
+        return {
+            "model": self.model_name,
+            "calls": calls,
+            "errors": errors,
+            "avg_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+        }
+
+
+class ModelRegistry:
+    """
+    Process-wide home of the Gemini clients. The API is configured once and each
+    model kind is created on first use, then shared by every request and thread.
+    `factory(model_name)` builds a model; it defaults to a Gemini GenerativeModel.
+    """
+    def __init__(self, model_names=MODEL_NAMES, concurrency=MODEL_CONCURRENCY, factory=None):
+        self.model_names = dict(model_names)
+        self.concurrency = dict(concurrency)
+        self.factory = factory or self._create_gemini_model
+        self._models = {}
+        self._configured = False
+        self._lock = threading.Lock()
+
+    def _create_gemini_model(self, model_name):
+        # Imported here so the SDK is only loaded once a model is actually needed.
+        import google.generativeai as genai
+        if not self._configured:
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("Error: GEMINI_API_KEY must be set in .env file.")
+            genai.configure(api_key=api_key)
+            self._configured = True
+        return genai.GenerativeModel(model_name)
+
+    def get(self, kind="text"):
+        """Returns the shared model for `kind` ('text' or 'vision'), creating it on first use."""
+        model = self._models.get(kind)
+        if model is not None:
+            return model
+        if kind not in self.model_names:
+            raise KeyError(f"Unknown model kind '{kind}'.")
+        with self._lock:
+            model = self._models.get(kind)
+            if model is None:
+                model = ManagedModel(kind, self.factory(self.model_names[kind]), self.concurrency.get(kind, 4))
+                self._models[kind] = model
+        return model
+
+    def warm_up(self, kinds=None):
+        """Creates the models ahead of the first request. Never raises."""
+        for kind in kinds or self.model_names:
+            try:
+                self.get(kind)
+            except Exception as e:
+                print(f"⚠️ Could not warm up the '{kind}' model: {e}")
+                return False
+        print(f"🔥 Gemini models ready: {', '.join(kinds or self.model_names)}")
+        return True
+
+    def metrics(self):
+        """Per-kind call counts, errors and latency percentiles for models created so far."""
+        return {kind: model.metrics() for kind, model in list(self._models.items())}
+
+
+model_registry = ModelRegistry()
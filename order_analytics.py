@@ -0,0 +1,111 @@
+# order_analytics.py
+
+import threading
+import pandas as pd
+from order_store import OrderStore
+
+EXCLUDED_STATUSES = ("canceled", "cancelled")
+
+
+class OrderAnalytics:
+    """
+    Vectorized sales analytics over the local order store. Line items and orders
+    are loaded into DataFrames once and every result is cached until the store's
+    version stamp changes (i.e. until new or updated orders are ingested).
+    """
+    def __init__(self, store=None):
+        self.store = store or OrderStore()
+        self._lock = threading.Lock()
+        self._version = None
+        self._frames = None
+        self._results = {}
+
+    # --- Loading and caching ---
+
+    def _load(self):
+        conn = self.store.connection()
+        orders = pd.read_sql_query(
+            "SELECT id AS order_id, status, created_at, total_price, total_cost, customer FROM orders", conn
+        )
+        items = pd.read_sql_query(
+            "SELECT li.order_id, li.product_id, li.blueprint_id, li.print_provider_id, li.title, "
+            "li.quantity, li.price, li.cost, o.created_at, o.status "
+            "FROM line_items li JOIN orders o ON o.id = li.order_id", conn
+        )
+        orders = orders[~orders["status"].isin(EXCLUDED_STATUSES)].copy()
+        items = items[~items["status"].isin(EXCLUDED_STATUSES)].copy()
+
+        orders["created_at"] = pd.to_datetime(orders["created_at"], utc=True)
+        items["created_at"] = pd.to_datetime(items["created_at"], utc=True)
+        items["revenue"] = items["price"] * items["quantity"]
+        items["line_cost"] = items["cost"] * items["quantity"]
+        items["margin"] = items["revenue"] - items["line_cost"]
+        items["day"] = items["created_at"].dt.strftime("%Y-%m-%d")
+        week_start = items["created_at"].dt.normalize() - pd.to_timedelta(items["created_at"].dt.weekday, unit="D")
+        items["week"] = week_start.dt.strftime("%Y-%m-%d")
+        return {"orders": orders, "items": items}
+
+    def _cached(self, name, compute):
+        with self._lock:
+            version = self.store.version()
+            if version != self._version:
+                self._frames = self._load()
+                self._results = {}
+                self._version = version
+            if name not in self._results:
+                self._results[name] = compute(self._frames)
+            return self._results[name]
+
+    # --- Metrics ---
+
+    def margin_by(self, dimension):
+        """
+        Revenue, cost, margin and units (in cents) grouped by one of:
+        'title', 'product_id', 'blueprint_id', 'print_provider_id', 'day' or 'week'.
+        """
+        def compute(frames):
+            grouped = frames["items"].groupby(dimension, dropna=False).agg(
+                units=("quantity", "sum"),
+                revenue=("revenue", "sum"),
+                cost=("line_cost", "sum"),
+                margin=("margin", "sum"),
+            )
+            grouped["margin_pct"] = (grouped["margin"] / grouped["revenue"].where(grouped["revenue"] != 0)).fillna(0) * 100
+            if dimension in ("day", "week"):
+                return grouped.sort_index()
+            return grouped.sort_values("revenue", ascending=False)
+        return self._cached(f"margin_by:{dimension}", compute)
+
+    def summary(self):
+        """Headline numbers: orders, revenue, cost, profit, margin % and average order value (in cents)."""
+        def compute(frames):
+            orders = frames["orders"]
+            revenue = int(orders["total_price"].sum())
+            cost = int(orders["total_cost"].sum())
+            count = int(len(orders))
+            return {
+                "total_orders": count,
+                "total_revenue": revenue,
+                "total_cost": cost,
+                "gross_profit": revenue - cost,
+                "gross_margin_pct": round((revenue - cost) / revenue * 100, 2) if revenue else 0.0,
+                "average_order_value": round(revenue / count, 2) if count else 0.0,
+            }
+        return self._cached("summary", compute)
+
+    def cohort_retention(self):
+        """
+        Share of each first-purchase month's customers who ordered again N months later.
+        Rows are cohorts (YYYY-MM), columns are month offsets starting at 0.
+        """
+        def compute(frames):
+            orders = frames["orders"].dropna(subset=["customer"])
+            if orders.empty:
+                return pd.DataFrame()
+            month_index = orders["created_at"].dt.year * 12 + orders["created_at"].dt.month - 1
+            cohort_index = month_index.groupby(orders["customer"]).transform("min")
+            cohort_label = (cohort_index // 12).astype(str) + "-" + (cohort_index % 12 + 1).astype(str).str.zfill(2)
+            active = pd.DataFrame({"cohort": cohort_label, "offset": month_index - cohort_index, "customer": orders["customer"]})
+            counts = active.drop_duplicates().pivot_table(index="cohort", columns="offset", values="customer", aggfunc="count", fill_value=0)
+            return counts.div(counts[0], axis=0).round(4)
+        return self._cached("cohort_retention", compute)
@@ -1,7 +1,7 @@
 # order_fulfiller.py
 
-import time
 from api_clients import PrintifyApiClient
+from fulfillment_engine import FulfillmentEngine
 
 def run_order_fulfiller():
     """
@@ -9,26 +9,18 @@ def run_order_fulfiller():
     """
     print("🤖 Order Fulfillment Agent: Initializing...")
     client = PrintifyApiClient()
+    engine = FulfillmentEngine(
+        fetch_pending_page=lambda page: client.get_orders_page(page, status="on-hold"),
+        send_to_production=client.send_to_production,
+        fetch_order=client.get_order,
+    )
 
     print("   - Searching for orders with status 'on-hold'...")
-    orders_data = client.get_orders(status="on-hold")
-    
-    if not orders_data or not orders_data.get('data'):
+    summary = engine.run()
+    if not any(summary.values()):
         print("✅ No 'on-hold' orders found.")
         return
-        
-    on_hold_orders = orders_data['data']
-    print(f"   - Found {len(on_hold_orders)} orders to fulfill.")
 
-    for order in on_hold_orders:
-        order_id = order['id']
-        created_at = order['created_at']
-        print(f"\n   -> Fulfilling Order ID: {order_id} (Created: {created_at})")
-        
-        response = client.send_to_production(order_id)
-        if response:
-            print(f"      ✅ Success! Order {order_id} sent to production.")
-        else:
-            print(f"      ❌ Failed to send order {order_id} to production.")
-        
-        time.sleep(1) # Rate limit between actions
+    print(f"\n   - Sent to production: {summary['confirmed']}")
+    print(f"   - Failed (will retry next run): {summary['failed']}")
+    print(f"   - Skipped (claimed by another run): {summary['skipped']}")
@@ -1,48 +1,45 @@
 # order_reporter.py
 
+from datetime import datetime, timedelta, timezone
 from api_clients import PrintifyApiClient
-from collections import defaultdict
+from order_store import OrderStore, OrderIngester
+from sales_rollup import SalesRollup
 
-def run_order_reporter():
+def run_order_reporter(calendar_days=None):
     """
     Fetches all completed orders and generates a sales report.
+    Pass `calendar_days` to limit the report to the last N whole UTC calendar days,
+    not counting today (1 reports yesterday, 30 the thirty days before today).
+    Whole days are what the daily rollups can answer exactly.
     """
     print("🤖 Order Reporter Agent: Initializing...")
     client = PrintifyApiClient()
+    store = OrderStore()
 
-    print("   - Fetching all completed orders...")
-    orders_data = client.get_orders(status="fulfilled")
+    print("   - Syncing the local order store...")
+    OrderIngester(store, client.get_orders_page, client.get_order).ingest()
 
-    if not orders_data or not orders_data.get('data'):
+    start = end = None
+    if calendar_days:
+        end = datetime.now(timezone.utc).date()
+        start = end - timedelta(days=calendar_days)
+    rollup = SalesRollup(store)
+    totals = rollup.summary(start=start, end=end)
+
+    if not totals['orders']:
         print("No fulfilled orders found to report on.")
         return
 
-    orders = orders_data['data']
-    total_revenue = 0
-    total_cost = 0
-    product_sales = defaultdict(int)
-
-    for order in orders:
-        total_revenue += order.get('total_price', 0)
-        total_cost += order.get('total_cost', 0)
-        for item in order.get('line_items', []):
-            title = item.get('metadata', {}).get('title', 'Unknown Product')
-            quantity = item.get('quantity', 0)
-            product_sales[title] += quantity
-
-    total_profit = total_revenue - total_cost
-
     # --- Display Report ---
     print("\n--- 📈 Printify Sales Report ---")
-    print(f"Total Orders Analyzed: {len(orders)}")
-    print(f"Total Revenue: ${(total_revenue / 100):.2f}")
-    print(f"Total Cost:    ${(total_cost / 100):.2f}")
-    print(f"Gross Profit:  ${(total_profit / 100):.2f}")
+    if start is not None:
+        print(f"Period: {start.isoformat()} to {(end - timedelta(days=1)).isoformat()} (UTC)")
+    print(f"Total Orders Analyzed: {totals['orders']}")
+    print(f"Total Revenue: ${(totals['revenue'] / 100):.2f}")
+    print(f"Total Cost:    ${(totals['cost'] / 100):.2f}")
+    print(f"Gross Profit:  ${(totals['profit'] / 100):.2f}")
     print("\n--- 👕 Top Selling Products ---")
-    
-    # Sort products by sales volume
-    sorted_products = sorted(product_sales.items(), key=lambda item: item[1], reverse=True)
-    
-    for product, count in sorted_products[:10]: # Display top 10
+
+    for product, count in rollup.top_products(10, start=start, end=end): # Display top 10
         print(f"  - {product}: {count} units sold")
     print("---------------------------------")
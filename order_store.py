@@ -0,0 +1,306 @@
+# order_store.py
+
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from rate_limiter import printify_rate_limiter
+from sales_rollup import ROLLUP_SCHEMA, ROLLUP_VERSION, apply_order_changes, rebuild_rollups
+
+ORDER_DB_FILE = "orders.db"
+TERMINAL_STATUSES = ("fulfilled", "canceled", "cancelled")
+STATUS_REFRESH_DAYS = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT PRIMARY KEY,
+    status TEXT,
+    created_at TEXT NOT NULL,
+    total_price INTEGER NOT NULL DEFAULT 0,
+    total_cost INTEGER NOT NULL DEFAULT 0,
+    total_shipping INTEGER NOT NULL DEFAULT 0,
+    raw TEXT,
+    ingested_at REAL,
+    customer TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders (created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_status_created_at ON orders (status, created_at);
+
+CREATE TABLE IF NOT EXISTS line_items (
+    order_id TEXT NOT NULL,
+    line_no INTEGER NOT NULL,
+    product_id TEXT,
+    variant_id INTEGER,
+    blueprint_id INTEGER,
+    print_provider_id INTEGER,
+    title TEXT,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    price INTEGER NOT NULL DEFAULT 0,
+    cost INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (order_id, line_no)
+);
+CREATE INDEX IF NOT EXISTS idx_line_items_product ON line_items (product_id);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def normalize_timestamp(value):
+    """Converts a Printify timestamp to a sortable UTC ISO-8601 string."""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat(timespec='seconds')
+
+
+class OrderStore:
+    """
+    A local SQLite copy of the shop's orders and line items, indexed on
+    created_at, status and product so reports are queries instead of API crawls.
+    """
+    def __init__(self, db_path=ORDER_DB_FILE):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        conn = self.connection()
+        conn.executescript(_SCHEMA + ROLLUP_SCHEMA)
+        self._migrate(conn)
+        if self.get_meta("rollup_version") != ROLLUP_VERSION:
+            with self._write_lock, conn:
+                rebuild_rollups(conn)
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('rollup_version', ?)", (ROLLUP_VERSION,))
+
+    def _migrate(self, conn):
+        """Adds columns introduced after a store was first created."""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(orders)")}
+        if "customer" not in columns:
+            with self._write_lock, conn:
+                conn.execute("ALTER TABLE orders ADD COLUMN customer TEXT")
+                conn.execute("UPDATE orders SET customer = json_extract(raw, '$.address_to.email')")
+                self._bump_version(conn)
+
+    def connection(self):
+        """Returns this thread's connection to the store."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Writes ---
+
+    def upsert_orders(self, orders):
+        """
+        Inserts or replaces orders (and their line items) and updates the sales
+        rollups in the same transaction. Returns the number written.
+        """
+        now = time.time()
+        order_rows = []
+        item_rows = []
+        # A page can repeat an order that shifted across a page boundary; keep the last copy.
+        orders = list({str(order['id']): order for order in orders}.values())
+        for order in orders:
+            order_id = str(order['id'])
+            line_items = order.get('line_items', [])
+            order_rows.append((
+                order_id,
+                order.get('status'),
+                normalize_timestamp(order['created_at']),
+                order.get('total_price', 0) or 0,
+                order['total_cost'] if order.get('total_cost') is not None
+                else sum((item.get('cost') or 0) * (item.get('quantity') or 0) for item in line_items),
+                order.get('total_shipping', 0) or 0,
+                json.dumps(order),
+                now,
+                (order.get('address_to') or {}).get('email'),
+            ))
+            for line_no, item in enumerate(line_items):
+                metadata = item.get('metadata', {})
+                item_rows.append((
+                    order_id,
+                    line_no,
+                    item.get('product_id'),
+                    item.get('variant_id'),
+                    item.get('blueprint_id'),
+                    item.get('print_provider_id'),
+                    metadata.get('title', 'Unknown Product'),
+                    item.get('quantity', 0) or 0,
+                    metadata.get('price', 0) or 0,
+                    item.get('cost', 0) or 0,
+                ))
+
+        conn = self.connection()
+        order_ids = [row[0] for row in order_rows]
+        with self._write_lock, conn:
+            apply_order_changes(conn, order_ids, apply_new=False)
+            conn.executemany("DELETE FROM line_items WHERE order_id = ?", [(order_id,) for order_id in order_ids])
+            conn.executemany("INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", order_rows)
+            conn.executemany("INSERT INTO line_items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", item_rows)
+            apply_order_changes(conn, order_ids, apply_new=True)
+            self._bump_version(conn)
+        return len(order_rows)
+
+    @staticmethod
+    def _bump_version(conn):
+        """Increments the orders version counter; call inside the write transaction."""
+        conn.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('orders_version', "
+            "COALESCE((SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'orders_version'), 0) + 1)"
+        )
+
+    def get_meta(self, key, default=None):
+        row = self.connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, key, value):
+        conn = self.connection()
+        with self._write_lock, conn:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    # --- Reads ---
+
+    def version(self):
+        """A counter bumped by every write to orders, read with a single key lookup."""
+        return int(self.get_meta("orders_version", 0))
+
+    def latest_created_at(self):
+        row = self.connection().execute("SELECT MAX(created_at) AS latest FROM orders").fetchone()
+        return row["latest"]
+
+    def orders_between(self, start=None, end=None, status=None):
+        """Returns orders created in [start, end), newest first, optionally filtered by status."""
+        clauses, params = self._window(start, end, status)
+        sql = "SELECT id, status, created_at, total_price, total_cost, total_shipping FROM orders"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created_at DESC"
+        return [dict(row) for row in self.connection().execute(sql, params)]
+
+    def line_items_between(self, start=None, end=None, status=None):
+        """Returns line items joined with their order's created_at and status."""
+        clauses, params = self._window(start, end, status, prefix="o.")
+        sql = ("SELECT li.*, o.created_at, o.status FROM line_items li "
+               "JOIN orders o ON o.id = li.order_id")
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return [dict(row) for row in self.connection().execute(sql, params)]
+
+    def open_orders_since(self, since):
+        """Returns the IDs of non-terminal orders created after `since`."""
+        placeholders = ", ".join("?" for _ in TERMINAL_STATUSES)
+        rows = self.connection().execute(
+            f"SELECT id FROM orders WHERE created_at >= ? AND status NOT IN ({placeholders})",
+            (normalize_timestamp(since), *TERMINAL_STATUSES),
+        )
+        return [row["id"] for row in rows]
+
+    def count_by_status(self):
+        rows = self.connection().execute("SELECT status, COUNT(*) AS n FROM orders GROUP BY status")
+        return {row["status"]: row["n"] for row in rows}
+
+    def query(self, sql, params=()):
+        """Runs a read-only SQL query against the store."""
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _window(start, end, status, prefix=""):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append(f"{prefix}created_at >= ?")
+            params.append(normalize_timestamp(start))
+        if end is not None:
+            clauses.append(f"{prefix}created_at < ?")
+            params.append(normalize_timestamp(end))
+        if status is not None:
+            clauses.append(f"{prefix}status = ?")
+            params.append(status)
+        return clauses, params
+
+
+class OrderIngester:
+    """
+    Pulls only what changed since the last run: new orders (newest-first pages until
+    the stored cursor is reached) plus a status refresh of recent, still-open orders.
+    `fetch_page(page)` returns one page of /orders.json; `fetch_order(order_id)` one order.
+    """
+    def __init__(self, store, fetch_page, fetch_order=None, rate_limiter=printify_rate_limiter,
+                 refresh_days=STATUS_REFRESH_DAYS, workers=4):
+        self.store = store
+        self.fetch_page = fetch_page
+        self.fetch_order = fetch_order
+        self.rate_limiter = rate_limiter
+        self.refresh_days = refresh_days
+        self.workers = workers
+
+    def ingest(self):
+        """
+        Runs one incremental ingestion pass and returns counts of what was written.
+        The cursor only advances after a clean crawl (the old cursor or the last page
+        was reached); if a page fails, the result carries an "error" and the next
+        pass crawls the missed pages again.
+        """
+        cursor = self.store.get_meta("orders_cursor")
+        new_orders = 0
+        page = 1
+        complete = False
+        while True:
+            self.rate_limiter.acquire()
+            data = self.fetch_page(page)
+            if not data or data.get('data') is None:
+                break
+            orders = data['data']
+            fresh = [order for order in orders if cursor is None or normalize_timestamp(order['created_at']) > cursor]
+            # Orders already stored may have changed status, so write the whole page.
+            self.store.upsert_orders(orders)
+            new_orders += len(fresh)
+            if len(fresh) < len(orders) or page >= data.get('last_page', page):
+                complete = True
+                break
+            if not orders:
+                break
+            page += 1
+
+        if complete:
+            latest = self.store.latest_created_at()
+            if latest:
+                self.store.set_meta("orders_cursor", latest)
+        else:
+            print(f"⚠️ Order store: page {page} could not be fetched; the cursor was not advanced.")
+
+        refreshed = self._refresh_open_orders() if self.fetch_order else 0
+        self.store.set_meta("last_ingested_at", str(time.time()))
+        print(f"   - Order store: {new_orders} new order(s), {refreshed} status refresh(es).")
+        result = {"new_orders": new_orders, "refreshed": refreshed}
+        if not complete:
+            result["error"] = f"Order crawl stopped at page {page}."
+        return result
+
+    def _refresh_open_orders(self):
+        since = datetime.now(timezone.utc) - timedelta(days=self.refresh_days)
+        order_ids = self.store.open_orders_since(since)
+        if not order_ids:
+            return 0
+
+        def fetch(order_id):
+            self.rate_limiter.acquire()
+            return self.fetch_order(order_id)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            orders = [order for order in executor.map(fetch, order_ids) if order and 'id' in order]
+        return self.store.upsert_orders(orders)
@@ -0,0 +1,124 @@
+# payload_templates.py
+
+import json
+import re
+import threading
+
+TEMPLATES_FILE = "payload_templates.json"
+
+# The layout every product used before per-blueprint templates existed.
+DEFAULT_PLACEHOLDERS = [{"position": "front", "x": 0.5, "y": 0.5, "scale": 1, "angle": 0}]
+
+_SLOT = "__slot_{}__"
+_SLOT_PATTERN = re.compile(r'"__slot_([^"]+?)__"')
+
+
+class ProductTemplate:
+    """
+    A precompiled product payload for one blueprint/provider pair. The skeleton
+    (print areas, placeholder positions, scale, angle) is built and serialized once;
+    rendering a row only fills in title, description, variants and image IDs.
+    """
+    def __init__(self, blueprint_id, provider_id, placeholders=None, variant_ids=None):
+        self.blueprint_id = int(blueprint_id)
+        self.provider_id = int(provider_id)
+        self.placeholders = [dict(placeholder) for placeholder in (placeholders or DEFAULT_PLACEHOLDERS)]
+        self.allowed_variant_ids = frozenset(variant_ids) if variant_ids else None
+        self.positions = [placeholder['position'] for placeholder in self.placeholders]
+        self._chunks, self._slots = self._compile()
+
+    def _skeleton(self, fill):
+        """Builds the payload structure, using `fill(slot)` for every per-row field."""
+        return {
+            "title": fill("title"),
+            "description": fill("description"),
+            "blueprint_id": self.blueprint_id,
+            "print_provider_id": self.provider_id,
+            "variants": fill("variants"),
+            "print_areas": [{
+                "variant_ids": fill("variant_ids"),
+                "placeholders": [{
+                    "position": placeholder['position'],
+                    "images": [{
+                        "id": fill(f"image:{placeholder['position']}"),
+                        "x": placeholder.get('x', 0.5),
+                        "y": placeholder.get('y', 0.5),
+                        "scale": placeholder.get('scale', 1),
+                        "angle": placeholder.get('angle', 0),
+                    }]
+                } for placeholder in self.placeholders]
+            }]
+        }
+
+    def _compile(self):
+        serialized = json.dumps(self._skeleton(_SLOT.format))
+        parts = _SLOT_PATTERN.split(serialized)
+        # re.split alternates literal chunks and captured slot names.
+        return parts[0::2], parts[1::2]
+
+    def _fields(self, row, variants):
+        if self.allowed_variant_ids is not None:
+            unknown = [variant_id for variant_id, _ in variants if variant_id not in self.allowed_variant_ids]
+            if unknown:
+                raise ValueError(f"Variant IDs {unknown} are not allowed by the template for blueprint {self.blueprint_id} / provider {self.provider_id}")
+        fields = {
+            "title": row['title'],
+            "description": row['description'],
+            "variants": [{"id": variant_id, "price": price, "is_enabled": True} for variant_id, price in variants],
+            "variant_ids": [variant_id for variant_id, _ in variants],
+        }
+        for position in self.positions:
+            # A row can override artwork per position, e.g. an `image_id_back` column.
+            fields[f"image:{position}"] = row.get(f"image_id_{position}") or row['image_id']
+        return fields
+
+    def render(self, row, variants):
+        """Returns the payload as a dictionary."""
+        fields = self._fields(row, variants)
+        return self._skeleton(fields.__getitem__)
+
+    def render_json(self, row, variants):
+        """Returns the payload as a JSON string, patching row fields into the pre-serialized skeleton."""
+        fields = self._fields(row, variants)
+        out = [self._chunks[0]]
+        for slot, chunk in zip(self._slots, self._chunks[1:]):
+            out.append(json.dumps(fields[slot]))
+            out.append(chunk)
+        return "".join(out)
+
+
+class TemplateRegistry:
+    """
+    Compiled templates keyed by (blueprint_id, provider_id), shared by every worker.
+    Layouts are read from payload_templates.json, e.g.
+    {"3:1": {"placeholders": [{"position": "front", "x": 0.5, "y": 0.4, "scale": 0.9, "angle": 0}],
+             "variant_ids": [12158, 12159]}}
+    Pairs without an entry use the default centred front print.
+    """
+    def __init__(self, templates_path=TEMPLATES_FILE):
+        self.templates_path = templates_path
+        self.layouts = self._load_layouts()
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def _load_layouts(self):
+        try:
+            with open(self.templates_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def get(self, blueprint_id, provider_id):
+        key = (int(blueprint_id), int(provider_id))
+        template = self._compiled.get(key)
+        if template is None:
+            with self._lock:
+                template = self._compiled.get(key)
+                if template is None:
+                    layout = self.layouts.get(f"{key[0]}:{key[1]}", {})
+                    template = ProductTemplate(key[0], key[1], layout.get('placeholders'), layout.get('variant_ids'))
+                    self._compiled[key] = template
+        return template
+
+
+template_registry = TemplateRegistry()
@@ -1,7 +1,8 @@
 # personalization.py
 
 from user_activity import UserActivity
-from logic import get_gemini_vision_pro_model
+from logic import get_gemini_text_model
+from llm_cache import llm_cache
 import random
 
 class Personalization:
@@ -61,7 +62,7 @@ class Personalization:
         ordered_product_names = [self.products[p_id]["name"] for p_id in user_orders]
 
         try:
-            model = get_gemini_vision_pro_model()
+            model = get_gemini_text_model()
             prompt = f"""
             Generate a short, friendly, and personalized marketing message for a user.
             The user has previously purchased the following items: {', '.join(ordered_product_names)}.
@@ -69,10 +70,10 @@ class Personalization:
 
             Return the response as a JSON object with a "message" key.
             """
-            response = model.generate_content([prompt])
+            response_text = llm_cache.generate_text(model, [prompt])
             
             import json
-            clean_response = response.text.strip().replace("```json", "").replace("```", "")
+            clean_response = response_text.strip().replace("```json", "").replace("```", "")
             message_data = json.loads(clean_response)
             
             return message_data.get("message")
@@ -0,0 +1,234 @@
+# prediction_manager.py
+
+import base64
+import hashlib
+import hmac
+import json
+import sqlite3
+import threading
+import time
+
+PREDICTIONS_DB_FILE = "predictions.db"
+TERMINAL_STATUSES = ("succeeded", "failed", "canceled")
+POLL_INITIAL = 1.0
+POLL_MAX = 10.0
+POLL_BACKOFF = 1.5
+# Below app.AI_JOB_TIMEOUT (300 s), so a stuck prediction is cancelled and reported
+# before the job that waits for it is timed out.
+MAX_WAIT = 240
+WEBHOOK_TOLERANCE = 300  # seconds a signed webhook's timestamp may differ from ours
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id TEXT PRIMARY KEY,
+    batch_id TEXT,
+    job_key TEXT,
+    model_version TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    status TEXT NOT NULL,
+    output TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_status ON predictions (status);
+CREATE INDEX IF NOT EXISTS idx_predictions_batch ON predictions (batch_id);
+"""
+# Run after _migrate, since stores created before job keys lack the column.
+_JOB_KEY_INDEX = "CREATE INDEX IF NOT EXISTS idx_predictions_job_key ON predictions (job_key)"
+
+
+def _field(prediction, name):
+    """Reads a field from a Replicate Prediction object or a webhook/JSON dict."""
+    if isinstance(prediction, dict):
+        return prediction.get(name)
+    return getattr(prediction, name, None)
+
+
+def verify_webhook(secret, headers, body, tolerance=WEBHOOK_TOLERANCE):
+    """
+    Checks the webhook-id / webhook-timestamp / webhook-signature headers Replicate
+    signs each webhook with, using the "whsec_..." signing secret of the account.
+    `body` is the raw request body. Returns False for a missing, stale or wrong signature.
+    """
+    webhook_id = headers.get("webhook-id")
+    timestamp = headers.get("webhook-timestamp")
+    signatures = headers.get("webhook-signature")
+    if not (secret and webhook_id and timestamp and signatures):
+        return False
+    try:
+        if abs(time.time() - int(timestamp)) > tolerance:
+            return False
+        key = base64.b64decode(secret.split("_", 1)[1] if secret.startswith("whsec_") else secret)
+    except ValueError:
+        return False
+    if isinstance(body, str):
+        body = body.encode()
+    signed = f"{webhook_id}.{timestamp}.".encode() + body
+    expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode()
+    # The header may carry several space-separated "v1,<signature>" entries (e.g. during key rotation).
+    return any(hmac.compare_digest(expected, entry.split(",", 1)[-1]) for entry in signatures.split())
+
+
+class PredictionManager:
+    """
+    Creates Replicate predictions without blocking on them and tracks each one in
+    a SQLite table. A prediction created with a `job_key` is reused when the same
+    key is created again, so a job that is retried after a crash picks up the
+    predictions it already started instead of paying for new ones. Completion
+    arrives either through `handle_webhook()` (when `webhook_url` is set) or by
+    polling each prediction with exponential backoff; `iter_completed` yields
+    predictions in the order they finish and cancels those that run too long.
+    """
+    def __init__(self, client, db_path=PREDICTIONS_DB_FILE, webhook_url=None,
+                 poll_initial=POLL_INITIAL, poll_max=POLL_MAX):
+        self.client = client
+        self.db_path = db_path
+        self.webhook_url = webhook_url
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self._local = threading.local()
+        self._changed = threading.Condition()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _migrate(self, conn):
+        """Adds columns introduced after a store was first created."""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(predictions)")}
+        if "job_key" not in columns:
+            conn.execute("ALTER TABLE predictions ADD COLUMN job_key TEXT")
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        """Creates and migrates the predictions table on the first connection."""
+        with self._schema_lock:
+            if not self._schema_ready:
+                conn.executescript(_SCHEMA)
+                self._migrate(conn)
+                conn.execute(_JOB_KEY_INDEX)
+                self._schema_ready = True
+
+    # --- Creating ---
+
+    def _reusable(self, job_key, model_version, prompt):
+        """ID of a prediction already started for `job_key` with the same input that has not failed."""
+        row = self.connection().execute(
+            "SELECT id FROM predictions WHERE job_key = ? AND model_version = ? AND prompt = ? "
+            "AND status NOT IN ('failed', 'canceled') ORDER BY created_at DESC LIMIT 1",
+            (job_key, model_version, prompt),
+        ).fetchone()
+        return row["id"] if row else None
+
+    def create(self, model_version, prompt, batch_id=None, job_key=None):
+        """
+        Starts one prediction and returns its ID without waiting for it. With a
+        `job_key` (e.g. "<job id>:<variant>"), a prediction already started for that
+        key and input is returned instead, unless it failed or was cancelled.
+        """
+        if job_key:
+            existing = self._reusable(job_key, model_version, prompt)
+            if existing:
+                print(f"♻️ Reusing prediction {existing} for {job_key}.")
+                return existing
+        options = {"input": {"prompt": prompt}}
+        if self.webhook_url:
+            options["webhook"] = self.webhook_url
+            options["webhook_events_filter"] = ["completed"]
+        if ":" in model_version:
+            prediction = self.client.predictions.create(version=model_version.split(":", 1)[1], **options)
+        else:
+            prediction = self.client.models.predictions.create(model=model_version, **options)
+
+        now = time.time()
+        self.connection().execute(
+            "INSERT INTO predictions (id, batch_id, job_key, model_version, prompt, status, output, error, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (_field(prediction, "id"), batch_id, job_key, model_version, prompt, _field(prediction, "status") or "starting",
+             json.dumps(_field(prediction, "output"), default=str), _field(prediction, "error"), now, now),
+        )
+        return _field(prediction, "id")
+
+    # --- Tracking ---
+
+    def _record(self, prediction):
+        self.connection().execute(
+            "UPDATE predictions SET status = ?, output = ?, error = ?, updated_at = ? WHERE id = ?",
+            (_field(prediction, "status"), json.dumps(_field(prediction, "output"), default=str),
+             str(_field(prediction, "error")) if _field(prediction, "error") else None, time.time(), _field(prediction, "id")),
+        )
+        with self._changed:
+            self._changed.notify_all()
+
+    def handle_webhook(self, payload):
+        """Records a prediction update delivered by Replicate's webhook. Returns False for unknown IDs."""
+        if self.get(_field(payload, "id")) is None:
+            return False
+        self._record(payload)
+        return True
+
+    def get(self, prediction_id):
+        row = self.connection().execute("SELECT * FROM predictions WHERE id = ?", (prediction_id,)).fetchone()
+        if row is None:
+            return None
+        prediction = dict(row)
+        prediction["output"] = json.loads(prediction["output"]) if prediction["output"] else None
+        return prediction
+
+    def _cancel(self, prediction_id, max_wait):
+        """Cancels a prediction that ran past its deadline, so it stops running (and billing)."""
+        try:
+            self.client.predictions.cancel(prediction_id)
+        except Exception as e:
+            print(f"⚠️ Could not cancel prediction {prediction_id}: {e}")
+        self.connection().execute(
+            "UPDATE predictions SET status = 'canceled', error = ?, updated_at = ? WHERE id = ? AND status NOT IN (?, ?, ?)",
+            (f"Timed out after {max_wait} seconds.", time.time(), prediction_id, *TERMINAL_STATUSES),
+        )
+
+    def iter_completed(self, prediction_ids, max_wait=MAX_WAIT):
+        """
+        Yields each prediction (as returned by `get`) as soon as it finishes. Stored
+        state is checked every tick, so webhook updates from any process are seen
+        immediately; the API is only polled for a prediction when its backoff is due.
+        Predictions still running after `max_wait` seconds are cancelled and yielded
+        with status "canceled".
+        """
+        deadline = time.monotonic() + max_wait
+        delays = {prediction_id: self.poll_initial for prediction_id in prediction_ids}
+        due = {prediction_id: time.monotonic() + self.poll_initial for prediction_id in prediction_ids}
+
+        while delays:
+            now = time.monotonic()
+            for prediction_id in list(delays):
+                prediction = self.get(prediction_id)
+                if prediction is not None and prediction["status"] not in TERMINAL_STATUSES and due[prediction_id] <= now:
+                    try:
+                        self._record(self.client.predictions.get(prediction_id))
+                    except Exception as e:
+                        print(f"⚠️ Could not poll prediction {prediction_id}: {e}")
+                    delays[prediction_id] = min(delays[prediction_id] * POLL_BACKOFF, self.poll_max)
+                    due[prediction_id] = now + delays[prediction_id]
+                    prediction = self.get(prediction_id)
+                if prediction is not None and prediction["status"] not in TERMINAL_STATUSES and now >= deadline:
+                    self._cancel(prediction_id, max_wait)
+                    prediction = self.get(prediction_id)
+                if prediction is None or prediction["status"] in TERMINAL_STATUSES:
+                    del delays[prediction_id]
+                    yield prediction
+            if delays:
+                wait = max(0.0, min(min(due[prediction_id] for prediction_id in delays), deadline) - time.monotonic())
+                with self._changed:
+                    self._changed.wait(min(wait, 1.0))
+
+    def wait(self, prediction_id, max_wait=MAX_WAIT):
+        """Blocks until one prediction finishes and returns it."""
+        return next(self.iter_completed([prediction_id], max_wait))
@@ -0,0 +1,200 @@
+# preflight_validator.py
+
+import json
+import os
+import threading
+import time
+from bulk_pipeline import Stage, read_csv_rows, parse_variants_and_prices
+
+CATALOG_CACHE_FILE = "catalog_cache.json"
+CATALOG_MAX_AGE_SECONDS = 7 * 24 * 3600
+MAX_PRICE_CENTS = 100000  # $1,000.00 - anything above is almost certainly a typo.
+PLACEHOLDER_IMAGE_PREFIX = "YOUR_IMAGE_ID"
+REQUIRED_COLUMNS = ('title', 'description', 'blueprint_id', 'print_provider_id', 'image_id', 'variants_and_prices')
+
+
+class CatalogCache:
+    """
+    A local, on-disk copy of the variant IDs each blueprint/provider pair offers.
+    `fetch(blueprint_id, provider_id)` is only called for pairs that are missing or
+    stale; pass `fetch=None` to validate fully offline.
+    """
+    def __init__(self, cache_path=CATALOG_CACHE_FILE, fetch=None, max_age=CATALOG_MAX_AGE_SECONDS):
+        self.cache_path = cache_path
+        self.fetch = fetch
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._fetched = {}  # key -> Event set once that pair's fetch has finished
+        self.entries = self._load_cache()
+        # Precomputed lookup sets, built once per pair.
+        self._variant_sets = {key: frozenset(entry['variant_ids']) for key, entry in self.entries.items()}
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_cache(self):
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.cache_path)
+
+    @staticmethod
+    def _key(blueprint_id, provider_id):
+        return f"{int(blueprint_id)}:{int(provider_id)}"
+
+    def store(self, blueprint_id, provider_id, catalog_variants):
+        """Caches the variants list returned by the catalog variants endpoint."""
+        key = self._key(blueprint_id, provider_id)
+        variant_ids = [variant['id'] for variant in catalog_variants]
+        positions = sorted({
+            placeholder['position']
+            for variant in catalog_variants
+            for placeholder in variant.get('placeholders', [])
+        })
+        with self._lock:
+            self.entries[key] = {"variant_ids": variant_ids, "positions": positions, "fetched_at": time.time()}
+            self._variant_sets[key] = frozenset(variant_ids)
+            self._save_cache()
+
+    def variant_ids(self, blueprint_id, provider_id):
+        """Returns the set of variant IDs offered, or None if the pair is unknown."""
+        key = self._key(blueprint_id, provider_id)
+        entry = self.entries.get(key)
+        is_stale = entry is None or time.time() - entry.get('fetched_at', 0) > self.max_age
+        if is_stale and self.fetch:
+            # Only try the network once per pair per run, even if the fetch fails; rows
+            # validated concurrently wait for that fetch instead of starting their own.
+            with self._lock:
+                done = self._fetched.get(key)
+                is_first = done is None
+                if is_first:
+                    done = self._fetched[key] = threading.Event()
+            if is_first:
+                try:
+                    data = self.fetch(blueprint_id, provider_id)
+                    if data and 'variants' in data:
+                        self.store(blueprint_id, provider_id, data['variants'])
+                except Exception as e:
+                    print(f"⚠️ Could not fetch catalog variants for blueprint {blueprint_id}, provider {provider_id}: {e}")
+                finally:
+                    done.set()
+            else:
+                done.wait()
+        return self._variant_sets.get(key)
+
+    def positions(self, blueprint_id, provider_id):
+        """Returns the print-area positions offered by a blueprint/provider pair."""
+        entry = self.entries.get(self._key(blueprint_id, provider_id))
+        return entry.get('positions', []) if entry else []
+
+
+class PreflightValidator:
+    """
+    Checks bulk creation rows before anything is sent to Printify: required columns,
+    variant membership, price sanity, duplicate titles and missing image IDs.
+    A title only counts as taken once a row with it passes every check, so fixing
+    a rejected row and adding it again is not reported as a duplicate.
+    """
+    def __init__(self, catalog, max_price=MAX_PRICE_CENTS):
+        self.catalog = catalog
+        self.max_price = max_price
+        self._seen_titles = set()
+        self._unverified = set()  # blueprint/provider pairs whose variants could not be checked
+        self._lock = threading.Lock()
+
+    def validate_row(self, row):
+        """Returns a list of error messages for the row (empty if it is valid)."""
+        errors = [f"'{column}' column is missing or empty" for column in REQUIRED_COLUMNS if not row.get(column)]
+
+        image_id = (row.get('image_id') or '').strip()
+        if image_id.startswith(PLACEHOLDER_IMAGE_PREFIX):
+            errors.append(f"image_id '{image_id}' is a placeholder, not an uploaded image")
+
+        if row.get('variants_and_prices'):
+            errors.extend(self._variant_errors(row))
+
+        title_key = (row.get('title') or '').strip().lower()
+        if title_key:
+            with self._lock:
+                if title_key in self._seen_titles:
+                    errors.insert(0, f"Duplicate title '{row['title']}'")
+                elif not errors:
+                    self._seen_titles.add(title_key)
+        return errors
+
+    def _variant_errors(self, row):
+        errors = []
+        try:
+            variants = parse_variants_and_prices(row['variants_and_prices'])
+        except ValueError:
+            return [f"Malformed variants_and_prices '{row['variants_and_prices']}'"]
+
+        for variant_id, price in variants:
+            if price <= 0 or price > self.max_price:
+                errors.append(f"Price {price} for variant {variant_id} is outside 1..{self.max_price} cents")
+
+        try:
+            offered = self.catalog.variant_ids(row['blueprint_id'], row['print_provider_id'])
+        except (KeyError, ValueError, TypeError):
+            errors.append("blueprint_id and print_provider_id must be integers")
+            return errors
+        if offered is None:
+            # The catalog could not be fetched; let Printify reject bad variants rather than every row.
+            pair = (row['blueprint_id'], row['print_provider_id'])
+            with self._lock:
+                first_time = pair not in self._unverified
+                self._unverified.add(pair)
+            if first_time:
+                print(f"⚠️ Blueprint {pair[0]} / provider {pair[1]} is not in the catalog cache; skipping its variant check.")
+        else:
+            unknown = [variant_id for variant_id, _ in variants if variant_id not in offered]
+            if unknown:
+                errors.append(f"Variant IDs {unknown} are not offered by blueprint {row['blueprint_id']} / provider {row['print_provider_id']}")
+        return errors
+
+    def stage(self):
+        """A pipeline stage that fails doomed rows before they reach the send stage."""
+        def validate(job):
+            errors = self.validate_row(job.row)
+            if errors:
+                raise ValueError("; ".join(errors))
+        return Stage("validate", validate)
+
+
+def validate_csv(file_path, catalog=None):
+    """
+    Validates every row of a bulk creation CSV without sending any writes.
+    Returns a report dictionary with the failing rows and their errors.
+    """
+    print(f"🔎 Pre-flight: Validating '{file_path}'...")
+    validator = PreflightValidator(catalog or CatalogCache())
+    invalid_rows = []
+    total = 0
+    start = time.monotonic()
+
+    try:
+        for index, row in enumerate(read_csv_rows(file_path), start=1):
+            total = index
+            errors = validator.validate_row(row)
+            if errors:
+                invalid_rows.append({"row": index, "title": row.get('title'), "errors": errors})
+    except FileNotFoundError:
+        print(f"🚨 Error: The file '{file_path}' was not found.")
+        return {"error": f"File not found: {file_path}"}
+
+    elapsed = time.monotonic() - start
+    print(f"   - Checked {total} rows in {elapsed:.2f}s: {total - len(invalid_rows)} valid, {len(invalid_rows)} invalid.")
+    for invalid in invalid_rows[:20]:
+        print(f"   ❌ Row {invalid['row']} ('{invalid['title']}'): {'; '.join(invalid['errors'])}")
+    return {"total": total, "valid": total - len(invalid_rows), "invalid": invalid_rows, "elapsed_seconds": round(elapsed, 3)}
+
+
+if __name__ == "__main__":
+    from printify_client import get_request
+    catalog = CatalogCache(fetch=lambda blueprint_id, provider_id: get_request(
+        f"/catalog/blueprints/{blueprint_id}/print_providers/{provider_id}/variants.json"))
+    validate_csv("products_to_create.csv", catalog)
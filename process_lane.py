@@ -0,0 +1,84 @@
+# process_lane.py
+
+import multiprocessing
+import os
+import pickle
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+INLINE_BYTES = 1024 * 1024  # payloads larger than this travel through a temp file
+DEFAULT_WORKERS = 2
+SPILL_DIR = os.path.join(tempfile.gettempdir(), "printify_process_lane")
+
+
+def _pack(obj, spill_dir, inline_bytes):
+    """Pickles `obj`, writing it to a temp file instead when it is large."""
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) <= inline_bytes:
+        return ("inline", data)
+    os.makedirs(spill_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=spill_dir, suffix=".pickle")
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return ("file", path)
+
+def _unpack(packed):
+    kind, value = packed
+    if kind == "inline":
+        return pickle.loads(value)
+    try:
+        with open(value, 'rb') as f:
+            return pickle.load(f)
+    finally:
+        os.remove(value)
+
+def _run_packed(packed_call, spill_dir, inline_bytes):
+    """Runs in the child process: unpack the call, run it, pack the result."""
+    func, args, kwargs = _unpack(packed_call)
+    return _pack(func(*args, **kwargs), spill_dir, inline_bytes)
+
+
+class ProcessLane:
+    """
+    A process pool of `workers` processes (default 2) for CPU-bound tasks, so they
+    run on other cores without holding the GIL of the process serving web requests. Functions must be importable
+    module-level functions; calls and results are pickled, and anything larger
+    than `inline_bytes` is handed over through a temp file instead of the pipe.
+    """
+    def __init__(self, workers=None, inline_bytes=INLINE_BYTES, spill_dir=SPILL_DIR):
+        self.workers = workers or DEFAULT_WORKERS
+        self.inline_bytes = inline_bytes
+        self.spill_dir = spill_dir
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # Spawned children do not inherit this process's threads or locks.
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def run(self, func, args=(), kwargs=None):
+        """Runs `func(*args, **kwargs)` in a child process and returns its result."""
+        packed_call = _pack((func, tuple(args), kwargs or {}), self.spill_dir, self.inline_bytes)
+        try:
+            future = self._executor().submit(_run_packed, packed_call, self.spill_dir, self.inline_bytes)
+            return _unpack(future.result())
+        except BaseException:
+            if packed_call[0] == "file" and os.path.exists(packed_call[1]):
+                os.remove(packed_call[1])
+            raise
+
+    def reset(self):
+        """Forgets the pool after a fork; the parent's pool is not usable in the child."""
+        with self._lock:
+            self._pool = None
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
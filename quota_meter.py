@@ -0,0 +1,156 @@
+# quota_meter.py
+
+import atexit
+import math
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from subscriptions import SUBSCRIPTION_TIERS
+
+USAGE_DB_FILE = "usage.db"
+FLUSH_INTERVAL = 30  # seconds between flushes of unmetered usage counts
+
+# How each metered feature's counter resets: 'day' (UTC calendar day) or 'total'.
+# Only features something actually consumes belong here; the tiers' 'products' and
+# 'orders' limits are not metered because the app has no product or order creation path.
+FEATURE_WINDOWS = {
+    'seo_optimizations': 'day',
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    username TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    period TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, feature, period)
+);
+"""
+
+_CONSUME = """
+INSERT INTO usage (username, feature, period, count) VALUES (?, ?, ?, ?)
+ON CONFLICT (username, feature, period) DO UPDATE SET count = count + excluded.count
+WHERE usage.count + excluded.count <= ?
+RETURNING count
+"""
+
+_ADD = """
+INSERT INTO usage (username, feature, period, count) VALUES (?, ?, ?, ?)
+ON CONFLICT (username, feature, period) DO UPDATE SET count = count + excluded.count
+"""
+
+
+def tier_limit(tier, feature):
+    """Returns the tier's limit for `feature`, or None when it is unlimited or not metered."""
+    limit = SUBSCRIPTION_TIERS.get(tier, {}).get('limits', {}).get(feature)
+    if limit is None or math.isinf(limit):
+        return None
+    return int(limit)
+
+def _period(feature):
+    if FEATURE_WINDOWS.get(feature, 'day') == 'total':
+        return 'total'
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+class QuotaMeter:
+    """
+    Per-user, per-feature usage counters shared by every worker process.
+    Limited tiers are checked and consumed with one atomic conditional upsert, so
+    concurrent requests in different processes can never exceed a limit.
+    Unlimited tiers are only counted in memory and flushed every `flush_interval`
+    seconds, so they pay no database cost per request.
+    """
+    def __init__(self, db_path=USAGE_DB_FILE, flush_interval=FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._pending = Counter()
+        self._pending_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        """Creates the usage table on the first connection rather than at import time."""
+        with self._schema_lock:
+            if not self._schema_ready:
+                conn.executescript(_SCHEMA)
+                self._schema_ready = True
+
+    def consume(self, username, tier, feature, amount=1):
+        """
+        Records `amount` uses if the tier's limit allows it.
+        Returns (allowed, remaining); remaining is None for unlimited tiers.
+        """
+        limit = tier_limit(tier, feature)
+        period = _period(feature)
+        if limit is None:
+            with self._pending_lock:
+                self._pending[(username, feature, period)] += amount
+            self._maybe_flush()
+            return True, None
+        if amount > limit:
+            return False, max(limit - self.usage(username, feature), 0)
+        row = self.connection().execute(_CONSUME, (username, feature, period, amount, limit)).fetchone()
+        if row is None:
+            return False, max(limit - self.usage(username, feature), 0)
+        return True, limit - row["count"]
+
+    def refund(self, username, tier, feature, amount=1):
+        """Gives back `amount` uses consumed for work that then failed."""
+        key = (username, feature, _period(feature))
+        if tier_limit(tier, feature) is None:
+            with self._pending_lock:
+                self._pending[key] -= amount
+            return
+        self.connection().execute(
+            "UPDATE usage SET count = MAX(count - ?, 0) WHERE username = ? AND feature = ? AND period = ?",
+            (amount, *key),
+        )
+
+    def usage(self, username, feature):
+        """Returns the user's usage of `feature` in the current window."""
+        key = (username, feature, _period(feature))
+        row = self.connection().execute(
+            "SELECT count FROM usage WHERE username = ? AND feature = ? AND period = ?", key
+        ).fetchone()
+        with self._pending_lock:
+            pending = self._pending.get(key, 0)
+        return (row["count"] if row else 0) + pending
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Writes in-memory counts to the database."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, Counter()
+            self._last_flush = time.monotonic()
+        if pending:
+            conn = self.connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(_ADD, [(*key, count) for key, count in pending.items()])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+
+quota_meter = QuotaMeter()
+atexit.register(quota_meter.flush)
@@ -0,0 +1,37 @@
+# rate_limiter.py
+
+import threading
+import time
+
+# Printify allows 600 requests per minute per token; stay comfortably below it.
+PRINTIFY_REQUESTS_PER_SECOND = 5
+
+
+class RateLimiter:
+    """
+    A thread-safe token bucket shared by every worker that talks to the same API.
+    Replaces the fixed `time.sleep(1)` between calls so concurrent workers can
+    use the full allowance without exceeding it.
+    """
+    def __init__(self, rate_per_second=PRINTIFY_REQUESTS_PER_SECOND, burst=None):
+        self.rate = float(rate_per_second)
+        self.capacity = float(burst if burst is not None else max(1, rate_per_second))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+printify_rate_limiter = RateLimiter()
@@ -0,0 +1,154 @@
+# retry_runner.py
+
+import csv
+import os
+import re
+import tempfile
+from bulk_pipeline import BulkPipeline, creator_stages, updater_stages, print_pipeline_summary, failure_log_lock
+
+RETRY_TARGETS = {
+    "creator": "failed_creation_jobs.csv",
+    "updater": "failed_jobs_updater.csv",
+}
+
+TRANSIENT = "transient"
+VALIDATION = "validation"
+PERMANENT = "permanent"
+
+# Errors raised by PrintifyApiClient(raise_errors=True) start with the HTTP status,
+# which decides on its own; the response body may contain any other number.
+_STATUS_RE = re.compile(r"^HTTP (\d{3})\b")
+
+# Otherwise checked in order; anything unmatched is treated as permanent, so an unknown
+# error is never replayed blindly. Older logs record network hiccups as "API call failed. Response: None".
+_ERROR_PATTERNS = [
+    (TRANSIENT, re.compile(
+        r"\b(429|5\d\d)\b|timed? ?out|connection|temporarily|not in the catalog cache|"
+        r"Response: None|Response was negative", re.I)),
+    (VALIDATION, re.compile(
+        r"validation failed|\b(400|422)\b|missing or empty|malformed|invalid literal|not enough values|"
+        r"too many values|not offered|placeholder|invalid margin|outside 1\.\.|duplicate title|must be integers", re.I)),
+    (PERMANENT, re.compile(r"\b4\d\d\b|not found|forbidden|unauthorized", re.I)),
+]
+
+
+def classify_error(error_message):
+    """Classifies a logged error as 'transient', 'validation' or 'permanent'."""
+    status = _STATUS_RE.match(error_message or "")
+    if status:
+        code = int(status.group(1))
+        if code == 429 or code >= 500:
+            return TRANSIENT
+        return VALIDATION if code in (400, 422) else PERMANENT
+    for category, pattern in _ERROR_PATTERNS:
+        if pattern.search(error_message or ""):
+            return category
+    return PERMANENT
+
+def _dedupe_key(kind, row):
+    if kind == "updater":
+        return row.get('product_id') or tuple(sorted(row.items()))
+    return (
+        (row.get('title') or '').strip().lower(),
+        row.get('blueprint_id'),
+        row.get('print_provider_id'),
+    )
+
+def load_failed_jobs(kind, log_file):
+    """
+    Reads a failure log and returns de-duplicated rows, grouped by error category.
+    Later entries win, so a row that failed several times is retried once with its latest error.
+    """
+    deduped = {}
+    with open(log_file, mode='r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        fieldnames = reader.fieldnames or []
+        for row in reader:
+            deduped[_dedupe_key(kind, row)] = row
+
+    grouped = {TRANSIENT: [], VALIDATION: [], PERMANENT: []}
+    for row in deduped.values():
+        grouped[classify_error(row.get('error'))].append(row)
+    return fieldnames, grouped
+
+def rewrite_failure_log(log_file, fieldnames, rows):
+    """
+    Atomically replaces the failure log with `rows` (removes it when nothing failed),
+    holding the lock FailureLog appends under.
+    """
+    with failure_log_lock(log_file):
+        _replace_log(log_file, fieldnames, rows)
+
+def _replace_log(log_file, fieldnames, rows):
+    if not rows:
+        if os.path.exists(log_file):
+            os.remove(log_file)
+        return
+    if 'error' not in fieldnames:
+        fieldnames = list(fieldnames) + ['error']
+    directory = os.path.dirname(os.path.abspath(log_file))
+    fd, tmp_path = tempfile.mkstemp(prefix=".retry-", suffix=".csv", dir=directory)
+    try:
+        with os.fdopen(fd, mode='w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(tmp_path, log_file)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+def _stages_for(kind, client):
+    if kind == "creator":
+        return creator_stages(client.create_product)
+    return updater_stages(client.get_product, client.update_product)
+
+def run_retry_runner(kind, log_file=None, client=None, dry_run=False):
+    """
+    Replays the transient failures from a bulk failure log through the concurrent
+    bulk pipeline, then rewrites the log with whatever is still failing. The log's
+    lock is held throughout, so failures appended by a bulk run are not lost.
+    """
+    if kind not in RETRY_TARGETS:
+        return {"error": f"Unknown retry target '{kind}'. Choose one of: {', '.join(RETRY_TARGETS)}."}
+    log_file = log_file or RETRY_TARGETS[kind]
+    print(f"🤖 Retry Runner ({kind}): Reading '{log_file}'...")
+    with failure_log_lock(log_file):
+        return _retry(kind, log_file, client, dry_run)
+
+def _retry(kind, log_file, client, dry_run):
+    try:
+        fieldnames, grouped = load_failed_jobs(kind, log_file)
+    except FileNotFoundError:
+        print(f"✅ No failure log found at '{log_file}'. Nothing to retry.")
+        return {"retried": 0, "recovered": 0, "still_failing": 0}
+
+    retryable = grouped[TRANSIENT]
+    print(f"   - Transient: {len(retryable)}, validation: {len(grouped[VALIDATION])}, permanent: {len(grouped[PERMANENT])}")
+    if dry_run or not retryable:
+        return {"retried": 0, "recovered": 0, "still_failing": sum(len(rows) for rows in grouped.values())}
+
+    if client is None:
+        from api_clients import PrintifyApiClient
+        client = PrintifyApiClient(raise_errors=True)
+
+    still_failing = []
+
+    def collect(job):
+        if job.error is not None:
+            still_failing.append(dict(job.row, error=job.error))
+
+    replay_rows = [{key: value for key, value in row.items() if key != 'error'} for row in retryable]
+    pipeline = BulkPipeline(f"retry-{kind}", _stages_for(kind, client), on_result=collect)
+    summary = pipeline.run(replay_rows)
+    print_pipeline_summary("Retry", summary)
+
+    remaining = still_failing + grouped[VALIDATION] + grouped[PERMANENT]
+    rewrite_failure_log(log_file, fieldnames, remaining)
+    print(f"   - Rewrote '{log_file}' with {len(remaining)} remaining failure(s).")
+    return {"retried": len(retryable), "recovered": summary['success'], "still_failing": len(remaining)}
+
+
+if __name__ == "__main__":
+    for target in RETRY_TARGETS:
+        run_retry_runner(target)
@@ -0,0 +1,167 @@
+# sales_rollup.py
+
+import heapq
+from datetime import date, datetime, timedelta, timezone
+
+ROLLUP_VERSION = "1"
+GRAINS = (("day", 10), ("month", 7))  # grain name, length of the created_at prefix
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sales_rollup (
+    grain TEXT NOT NULL,
+    period TEXT NOT NULL,
+    status TEXT NOT NULL,
+    orders INTEGER NOT NULL DEFAULT 0,
+    revenue INTEGER NOT NULL DEFAULT 0,
+    cost INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (grain, status, period)
+);
+CREATE TABLE IF NOT EXISTS product_rollup (
+    grain TEXT NOT NULL,
+    period TEXT NOT NULL,
+    status TEXT NOT NULL,
+    title TEXT NOT NULL,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (grain, status, period, title)
+);
+"""
+
+_UPSERT_SALES = """
+INSERT INTO sales_rollup (grain, period, status, orders, revenue, cost) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (grain, status, period) DO UPDATE SET
+    orders = orders + excluded.orders,
+    revenue = revenue + excluded.revenue,
+    cost = cost + excluded.cost
+"""
+
+_UPSERT_PRODUCT = """
+INSERT INTO product_rollup (grain, period, status, title, units, revenue) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (grain, status, period, title) DO UPDATE SET
+    units = units + excluded.units,
+    revenue = revenue + excluded.revenue
+"""
+
+
+def _deltas(order, line_items, sign):
+    """Expands one order into signed rollup rows for every grain."""
+    created_at = order["created_at"]
+    status = order["status"] or ""
+    sales_rows, product_rows = [], []
+    for grain, length in GRAINS:
+        period = created_at[:length]
+        sales_rows.append((grain, period, status, sign, sign * order["total_price"], sign * order["total_cost"]))
+        for item in line_items:
+            product_rows.append((grain, period, status, item["title"], sign * item["quantity"],
+                                 sign * item["quantity"] * item["price"]))
+    return sales_rows, product_rows
+
+def apply_order_changes(conn, order_ids, apply_new):
+    """
+    Keeps the rollups in step with an upsert, inside the caller's transaction.
+    Call once before the orders are replaced (subtracts their old contribution) and
+    once after with `apply_new=True` (adds the new one).
+    """
+    sign = 1 if apply_new else -1
+    sales_rows, product_rows = [], []
+    for order_id in order_ids:
+        order = conn.execute(
+            "SELECT status, created_at, total_price, total_cost FROM orders WHERE id = ?", (order_id,)
+        ).fetchone()
+        if order is None:
+            continue
+        items = conn.execute("SELECT title, quantity, price FROM line_items WHERE order_id = ?", (order_id,)).fetchall()
+        order_sales, order_products = _deltas(order, items, sign)
+        sales_rows += order_sales
+        product_rows += order_products
+    conn.executemany(_UPSERT_SALES, sales_rows)
+    conn.executemany(_UPSERT_PRODUCT, product_rows)
+
+def rebuild_rollups(conn):
+    """Recomputes every rollup from the stored orders (used once for existing stores)."""
+    conn.execute("DELETE FROM sales_rollup")
+    conn.execute("DELETE FROM product_rollup")
+    order_ids = [row[0] for row in conn.execute("SELECT id FROM orders")]
+    apply_order_changes(conn, order_ids, apply_new=True)
+
+
+def _day(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).date() if value.tzinfo else value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def _first_of_next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _segments(start, end):
+    """
+    Splits [start, end) into (grain, from, to) pieces: partial months as days and
+    whole months as single month rows. None means unbounded on that side.
+    """
+    start_day, end_day = _day(start), _day(end)
+    first_full = None if start_day is None else (start_day if start_day.day == 1 else _first_of_next_month(start_day))
+    last_full = None if end_day is None else end_day.replace(day=1)
+
+    if first_full is not None and last_full is not None and first_full >= last_full:
+        return [("day", start_day.isoformat(), end_day.isoformat())]
+
+    segments = [("month", first_full.isoformat()[:7] if first_full else None, last_full.isoformat()[:7] if last_full else None)]
+    if start_day is not None and start_day < first_full:
+        segments.append(("day", start_day.isoformat(), first_full.isoformat()))
+    if end_day is not None and last_full < end_day:
+        segments.append(("day", last_full.isoformat(), end_day.isoformat()))
+    return segments
+
+def _where(grain, period_from, period_to, status):
+    clauses, params = ["grain = ?", "status = ?"], [grain, status]
+    if period_from is not None:
+        clauses.append("period >= ?")
+        params.append(period_from)
+    if period_to is not None:
+        clauses.append("period < ?")
+        params.append(period_to)
+    return " AND ".join(clauses), params
+
+
+class SalesRollup:
+    """Answers sales questions for any date range by merging daily and monthly rollups."""
+    def __init__(self, store):
+        self.store = store
+
+    def summary(self, start=None, end=None, status="fulfilled"):
+        """Returns order count, revenue, cost and profit (in cents) for [start, end)."""
+        conn = self.store.connection()
+        totals = {"orders": 0, "revenue": 0, "cost": 0}
+        for grain, period_from, period_to in _segments(start, end):
+            where, params = _where(grain, period_from, period_to, status)
+            row = conn.execute(
+                f"SELECT COALESCE(SUM(orders), 0), COALESCE(SUM(revenue), 0), COALESCE(SUM(cost), 0) FROM sales_rollup WHERE {where}",
+                params,
+            ).fetchone()
+            totals["orders"] += row[0]
+            totals["revenue"] += row[1]
+            totals["cost"] += row[2]
+        totals["profit"] = totals["revenue"] - totals["cost"]
+        return totals
+
+    def top_products(self, n=10, start=None, end=None, status="fulfilled"):
+        """Returns the n best-selling (title, units) pairs for [start, end)."""
+        conn = self.store.connection()
+        units = {}
+        for grain, period_from, period_to in _segments(start, end):
+            where, params = _where(grain, period_from, period_to, status)
+            for title, count in conn.execute(f"SELECT title, SUM(units) FROM product_rollup WHERE {where} GROUP BY title", params):
+                units[title] = units.get(title, 0) + count
+        return heapq.nlargest(n, ((title, count) for title, count in units.items() if count > 0), key=lambda item: item[1])
+
+    def daily(self, start=None, end=None, status="fulfilled"):
+        """Returns per-day rows of orders, revenue and cost for [start, end)."""
+        where, params = _where("day", _day(start).isoformat() if start else None, _day(end).isoformat() if end else None, status)
+        rows = self.store.connection().execute(
+            f"SELECT period AS day, orders, revenue, cost FROM sales_rollup WHERE {where} ORDER BY period", params
+        )
+        return [dict(row) for row in rows]
@@ -1,12 +1,228 @@
 # scheduler.py
 
+import atexit
+import importlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import timedelta
 from apscheduler.schedulers.background import BackgroundScheduler
-from jobs import run_daily_order_report, fulfill_pending_orders, run_inventory_sync
-
-def start_scheduler():
-    """Starts the job scheduler."""
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(run_daily_order_report, 'interval', days=1)
-    scheduler.add_job(fulfill_pending_orders, 'interval', hours=1)
-    scheduler.add_job(run_inventory_sync, 'interval', hours=6)
-    scheduler.start()
+
+SCHEDULER_DB_FILE = "scheduler.db"
+LEADER_LOCK = "scheduler-leader"
+LEADER_LEASE_SECONDS = 60
+RUN_HISTORY_DAYS = 30
+
+# name, function in jobs.py, interval trigger arguments, jitter in seconds, lock lease in seconds.
+# The lease is renewed every third of it while a run is in progress, so it only bounds
+# how long a crashed run keeps the job locked, not how long a run may take.
+SCHEDULED_JOBS = [
+    ("daily_order_report", "run_daily_order_report", {"days": 1}, 300, 600),
+    ("fulfill_pending_orders", "fulfill_pending_orders", {"hours": 1}, 120, 600),
+    ("inventory_sync", "run_inventory_sync", {"hours": 6}, 300, 600),
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS locks (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    lease_until REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    job_name TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration REAL,
+    outcome TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_job_started ON runs (job_name, started_at);
+"""
+
+
+class ScheduleLocks:
+    """
+    Cross-process leases and run history in a small SQLite file. A lease is
+    taken with a single conditional upsert, so exactly one holder wins even when
+    every gunicorn worker starts a scheduler.
+    """
+    def __init__(self, db_path=SCHEDULER_DB_FILE):
+        self.db_path = db_path
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self.connection().executescript(_SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, name, lease_seconds):
+        """Takes or renews the lease on `name`. Returns True if this process holds it."""
+        now = time.time()
+        self.connection().execute(
+            "INSERT INTO locks (name, holder, lease_until) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, lease_until = excluded.lease_until "
+            "WHERE locks.holder = excluded.holder OR locks.lease_until < ?",
+            (name, self.holder, now + lease_seconds, now),
+        )
+        row = self.connection().execute("SELECT holder FROM locks WHERE name = ?", (name,)).fetchone()
+        return row is not None and row["holder"] == self.holder
+
+    def release(self, name):
+        self.connection().execute("DELETE FROM locks WHERE name = ? AND holder = ?", (name, self.holder))
+
+    def record_run(self, job_name, started_at, duration, outcome, error=None):
+        self.connection().execute(
+            "INSERT INTO runs (job_name, started_at, duration, outcome, error) VALUES (?, ?, ?, ?, ?)",
+            (job_name, started_at, duration, outcome, error),
+        )
+
+    def last_success(self, job_name):
+        row = self.connection().execute(
+            "SELECT MAX(started_at) AS started_at FROM runs WHERE job_name = ? AND outcome = 'success'", (job_name,)
+        ).fetchone()
+        return row["started_at"]
+
+    def prune_runs(self, days=RUN_HISTORY_DAYS):
+        self.connection().execute("DELETE FROM runs WHERE started_at < ?", (time.time() - days * 86400,))
+
+    def metrics(self):
+        """Per-job run counts, failures, skips and last/average/max duration in seconds."""
+        rows = self.connection().execute(
+            "SELECT job_name, "
+            "SUM(outcome = 'success') AS successes, SUM(outcome = 'failed') AS failures, "
+            "SUM(outcome = 'skipped') AS skipped, MAX(started_at) AS last_started_at, "
+            "AVG(duration) AS avg_duration, MAX(duration) AS max_duration "
+            "FROM runs GROUP BY job_name"
+        )
+        metrics = {row["job_name"]: dict(row) for row in rows}
+        for job_name, data in metrics.items():
+            last = self.connection().execute(
+                "SELECT duration, outcome FROM runs WHERE job_name = ? AND outcome != 'skipped' "
+                "ORDER BY started_at DESC LIMIT 1", (job_name,)
+            ).fetchone()
+            data["last_duration"] = last["duration"] if last else None
+            data["last_outcome"] = last["outcome"] if last else None
+        return metrics
+
+
+class LeaderScheduler:
+    """
+    Wraps APScheduler so only one process on the host runs scheduled jobs.
+    Every process renews a leader lease; only the current leader executes jobs.
+    Each run also takes a per-job lock, so a slow run is never overlapped by its
+    next trigger (even across a leader hand-over); its lease is renewed while the
+    run is in progress. Misfired triggers are coalesced into one run and start
+    times are jittered.
+    """
+    def __init__(self, locks=None, jobs=(), leader_lease=LEADER_LEASE_SECONDS):
+        self.locks = locks or ScheduleLocks()
+        self.jobs = jobs
+        self.leader_lease = leader_lease
+        self.is_leader = False
+        self.scheduler = BackgroundScheduler()
+
+    def _heartbeat(self):
+        was_leader = self.is_leader
+        try:
+            self.is_leader = self.locks.acquire(LEADER_LOCK, self.leader_lease)
+        except sqlite3.Error as e:
+            print(f"⚠️ Scheduler lease renewal failed: {e}")
+            self.is_leader = False
+        if self.is_leader and not was_leader:
+            print(f"👑 Scheduler leader is now {self.locks.holder}.")
+            self.locks.prune_runs()
+
+    def _renew(self, lock, lease_seconds, done):
+        """Keeps renewing `lock` until `done` is set, so a long run never loses it."""
+        while not done.wait(lease_seconds / 3):
+            try:
+                if not self.locks.acquire(lock, lease_seconds):
+                    print(f"⚠️ Lost the '{lock}' lease while the run was still in progress.")
+                    return
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not renew the '{lock}' lease: {e}")
+
+    def _guarded(self, name, func, interval, lock_lease):
+        # A new leader's timers restart from zero; don't repeat a run the old leader just did.
+        min_gap = timedelta(**interval).total_seconds() / 2
+
+        def run():
+            if not self.is_leader:
+                return
+            started = time.time()
+            last = self.locks.last_success(name)
+            if last is not None and started - last < min_gap:
+                return
+            if not self.locks.acquire(f"job:{name}", lock_lease):
+                print(f"⏭️ Skipping '{name}': the previous run is still in progress.")
+                self.locks.record_run(name, started, None, "skipped")
+                return
+            done = threading.Event()
+            renewer = threading.Thread(target=self._renew, args=(f"job:{name}", lock_lease, done),
+                                       name=f"lease-{name}", daemon=True)
+            renewer.start()
+            try:
+                func()
+                self.locks.record_run(name, started, time.time() - started, "success")
+            except Exception as e:
+                self.locks.record_run(name, started, time.time() - started, "failed", str(e))
+                print(f"❌ Scheduled job '{name}' failed: {e}")
+            finally:
+                done.set()
+                renewer.join()
+                self.locks.release(f"job:{name}")
+        return run
+
+    def start(self):
+        self._heartbeat()
+        self.scheduler.add_job(self._heartbeat, 'interval', seconds=self.leader_lease / 3,
+                               id="leader_heartbeat", max_instances=1, coalesce=True)
+        for name, func, interval, jitter, lock_lease in self.jobs:
+            self.scheduler.add_job(
+                self._guarded(name, func, interval, lock_lease), 'interval', id=name, jitter=jitter,
+                max_instances=1, coalesce=True, misfire_grace_time=None, **interval,
+            )
+        self.scheduler.start()
+        return self
+
+    def shutdown(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        if self.is_leader:
+            self.locks.release(LEADER_LOCK)
+            self.is_leader = False
+
+
+def scheduled_jobs():
+    """
+    Resolves SCHEDULED_JOBS to (name, function, interval, jitter, lock lease).
+    jobs.py pulls in the whole Printify client, so it is only imported here.
+    """
+    jobs = importlib.import_module("jobs")
+    return [(name, getattr(jobs, func_name), interval, jitter, lock_lease)
+            for name, func_name, interval, jitter, lock_lease in SCHEDULED_JOBS]
+
+
+def start_scheduler(jobs=None, locks=None):
+    """
+    Starts the job scheduler. Safe to call from every worker process.
+    Returns None, leaving the app running, if the scheduled jobs can't be loaded.
+    """
+    if jobs is None:
+        try:
+            jobs = scheduled_jobs()
+        except (ImportError, AttributeError, SystemExit) as e:
+            # printify_client exits when its API token is missing; that must not stop the web app.
+            print(f"⚠️ Scheduler not started, its jobs could not be loaded: {e}")
+            return None
+    scheduler = LeaderScheduler(locks, jobs).start()
+    atexit.register(scheduler.shutdown)
+    return scheduler
@@ -22,19 +22,11 @@ def generate_seo_content_from_image(gemini_client, product_title, image_url):
     generated_text = gemini_client.generate_content_with_image(prompt, image_url)
     return generated_text
 
-def run_seo_optimizer(product_id: str):
+def optimize_product(gemini_client, product):
     """
-    Fetches a product and its image, then generates new SEO content with AI.
+    Generates new SEO content for an already-fetched product.
     Returns a dictionary with original and new content, or an error message.
     """
-    printify_client = PrintifyApiClient()
-    gemini_client = GeminiApiClient()
-
-    # 1. Fetch the product from Printify
-    product = printify_client.get_product(product_id)
-    if not product:
-        return {"error": f"Could not retrieve product with ID: {product_id}"}
-
     original_title = product.get("title", "")
     original_description = product.get("description", "")
     
@@ -43,10 +35,12 @@ def run_seo_optimizer(product_id: str):
     except (IndexError, KeyError):
         return {"error": f"Product '{original_title}' has no images. Aborting."}
 
-    # 2. Generate new content with Gemini using the image
+    # Generate new content with Gemini using the image
     ai_response_text = generate_seo_content_from_image(gemini_client, original_title, image_url)
+    if not ai_response_text:
+        return {"error": f"The AI returned no content for product '{original_title}'."}
     
-    # 3. Parse the AI-generated JSON response
+    # Parse the AI-generated JSON response
     try:
         if "```json" in ai_response_text:
             ai_response_text = ai_response_text.split("```json")[1].split("```")[0].strip()
@@ -65,11 +59,24 @@ def run_seo_optimizer(product_id: str):
         "new_description": new_description
     }
 
-def update_product_seo(product_id: str, new_title: str, new_description: str):
+def run_seo_optimizer(product_id: str, printify_client=None, gemini_client=None):
+    """
+    Fetches a product and its image, then generates new SEO content with AI.
+    Pass existing clients to reuse them across calls.
+    """
+    printify_client = printify_client or PrintifyApiClient()
+    gemini_client = gemini_client or GeminiApiClient()
+
+    product = printify_client.get_product(product_id)
+    if not product:
+        return {"error": f"Could not retrieve product with ID: {product_id}"}
+    return optimize_product(gemini_client, product)
+
+def update_product_seo(product_id: str, new_title: str, new_description: str, printify_client=None):
     """
     Updates the product's title and description on Printify.
     """
-    printify_client = PrintifyApiClient()
+    printify_client = printify_client or PrintifyApiClient()
     update_payload = {
         "title": new_title,
         "description": new_description
@@ -0,0 +1,277 @@
+# seo_batch.py
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from api_clients import PrintifyApiClient, GeminiApiClient
+from seo_agent import optimize_product, update_product_seo
+from job_progress import current_progress
+from jobs_manager import jobs_manager
+from quota_meter import quota_meter
+
+SEO_BATCH_DB_FILE = "seo_batch.db"
+SEO_CONCURRENCY = 4   # Gemini calls in flight at once for one batch
+PAGE_SIZE = 50
+
+# Products in these states are not processed again when a run is resumed.
+DONE_STATUSES = ("updated", "unchanged")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seo_runs (
+    run_id TEXT PRIMARY KEY,
+    filters TEXT NOT NULL,
+    dry_run INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seo_items (
+    run_id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    new_title TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, product_id)
+);
+"""
+
+
+def _normalize(text):
+    return " ".join((text or "").split())
+
+def _matches(product, title_contains):
+    return not title_contains or title_contains.lower() in (product.get("title") or "").lower()
+
+
+class SeoRunStore:
+    """Each SEO batch run's filters, owner and per-product outcome, kept in SQLite so runs can be resumed."""
+    def __init__(self, db_path=SEO_BATCH_DB_FILE):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _migrate(self, conn):
+        """Adds columns introduced after a store was first created."""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(seo_runs)")}
+        if "owner" not in columns:
+            conn.execute("ALTER TABLE seo_runs ADD COLUMN owner TEXT")
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        """Creates and migrates the tables on the first connection."""
+        with self._schema_lock:
+            if not self._schema_ready:
+                conn.executescript(_SCHEMA)
+                self._migrate(conn)
+                self._schema_ready = True
+
+    def create(self, product_ids=None, title_contains=None, dry_run=False, owner=None):
+        """Records a new run before it is queued, so a retried job resumes it. Returns the run ID."""
+        run_id = str(uuid.uuid4())
+        filters = {"product_ids": sorted({str(p) for p in product_ids or []}), "title_contains": title_contains}
+        now = time.time()
+        self.connection().execute(
+            "INSERT INTO seo_runs (run_id, filters, dry_run, status, owner, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'pending', ?, ?, ?)",
+            (run_id, json.dumps(filters), int(dry_run), owner, now, now),
+        )
+        return run_id
+
+    def reopen(self, run_id):
+        """Marks a run as running again. Returns (filters, dry_run)."""
+        row = self.connection().execute("SELECT * FROM seo_runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise LookupError(f"Unknown SEO batch run '{run_id}'.")
+        self.connection().execute(
+            "UPDATE seo_runs SET status = 'running', updated_at = ? WHERE run_id = ?", (time.time(), run_id)
+        )
+        return json.loads(row["filters"]), bool(row["dry_run"])
+
+    def finished_ids(self, run_id):
+        placeholders = ", ".join("?" for _ in DONE_STATUSES)
+        rows = self.connection().execute(
+            f"SELECT product_id FROM seo_items WHERE run_id = ? AND status IN ({placeholders})", (run_id, *DONE_STATUSES)
+        )
+        return {row["product_id"] for row in rows}
+
+    def record(self, run_id, product_id, status, new_title=None, error=None):
+        self.connection().execute(
+            "INSERT OR REPLACE INTO seo_items (run_id, product_id, status, new_title, error, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, product_id, status, new_title, error, time.time()),
+        )
+
+    def status(self, run_id):
+        """Returns the run's owner, filters and per-status product counts, or None for an unknown run."""
+        run = self.connection().execute("SELECT * FROM seo_runs WHERE run_id = ?", (run_id,)).fetchone()
+        if run is None:
+            return None
+        counts = self.connection().execute(
+            "SELECT status, COUNT(*) AS n FROM seo_items WHERE run_id = ? GROUP BY status", (run_id,)
+        )
+        return {**dict(run), "filters": json.loads(run["filters"]), "counts": {row["status"]: row["n"] for row in counts}}
+
+    def finish(self, run_id, status):
+        self.connection().execute(
+            "UPDATE seo_runs SET status = ?, updated_at = ? WHERE run_id = ?", (status, time.time(), run_id)
+        )
+
+
+class SeoBatch:
+    """
+    Optimizes SEO titles and descriptions for a whole shop, or the products that
+    match a filter. Products are walked page by page (or fetched directly when
+    given by ID) and optimized by a small thread pool (one Printify and one
+    Gemini client shared by all of them); only products whose content actually
+    changed are written back. Each product's outcome is recorded, so running the
+    same run ID again resumes it and skips everything it already finished.
+    """
+    def __init__(self, runs=None, concurrency=SEO_CONCURRENCY, printify_client=None, gemini_client=None):
+        self.runs = runs or SeoRunStore()
+        self.concurrency = concurrency
+        self.printify_client = printify_client or PrintifyApiClient()
+        self.gemini_client = gemini_client or GeminiApiClient()
+
+    # --- Processing ---
+
+    def _candidates(self, filters, set_total):
+        """Yields (product_id, product); product is None when it still has to be fetched."""
+        if filters["product_ids"]:
+            set_total(len(filters["product_ids"]))
+            for product_id in filters["product_ids"]:
+                yield product_id, None
+            return
+        page = 1
+        while True:
+            response = self.printify_client.get_products_page(page, PAGE_SIZE)
+            if not response:
+                raise RuntimeError(f"Could not fetch page {page} of products.")
+            if page == 1 and response.get("total") is not None and not filters["title_contains"]:
+                set_total(response["total"])
+            for product in response.get("data", []):
+                if _matches(product, filters["title_contains"]):
+                    yield str(product["id"]), product
+            if not response.get("data") or page >= response.get("last_page", page):
+                return
+            page += 1
+
+    def _process(self, run_id, product_id, product, dry_run):
+        try:
+            if product is None:
+                product = self.printify_client.get_product(product_id)
+                if not product:
+                    error = f"Could not retrieve product with ID: {product_id}"
+                    self.runs.record(run_id, product_id, "failed", error=error)
+                    return "failed", error
+            return self._optimize(run_id, product, dry_run)
+        except Exception as e:
+            self.runs.record(run_id, product_id, "failed", error=str(e))
+            return "failed", str(e)
+
+    def _optimize(self, run_id, product, dry_run):
+        product_id = str(product["id"])
+        result = optimize_product(self.gemini_client, product)
+        if "error" in result:
+            self.runs.record(run_id, product_id, "failed", error=result["error"])
+            return "failed", result["error"]
+
+        changed = (_normalize(result["new_title"]) != _normalize(result["original_title"])
+                   or _normalize(result["new_description"]) != _normalize(result["original_description"]))
+        if not changed:
+            self.runs.record(run_id, product_id, "unchanged")
+            return "unchanged", None
+        if not dry_run:
+            response = update_product_seo(product_id, result["new_title"], result["new_description"],
+                                          printify_client=self.printify_client)
+            if not response["success"]:
+                self.runs.record(run_id, product_id, "failed", error=response["message"])
+                return "failed", response["message"]
+        self.runs.record(run_id, product_id, "updated", new_title=result["new_title"])
+        return "updated", None
+
+    def run(self, run_id, allow=None, refund=None):
+        """
+        Optimizes every product matching the run's filters and returns a summary
+        with counts and throughput. Products the run already finished are skipped,
+        so calling this again with the same `run_id` resumes it. In a dry run,
+        changes are recorded but not written. `allow()` is called before each
+        product is optimized (e.g. to meter a quota); once it returns False the run
+        stops as "quota_exceeded". `refund()` is called for each product that failed.
+        """
+        filters, dry_run = self.runs.reopen(run_id)
+        finished = self.runs.finished_ids(run_id)
+        progress = current_progress()
+        summary = {"run_id": run_id, "updated": 0, "unchanged": 0, "failed": 0, "skipped": 0}
+        started = time.monotonic()
+        print(f"🔎 SEO batch {run_id}: starting ({len(finished)} products already done).")
+
+        pending = set()
+        status = "interrupted"
+
+        def set_total(total):
+            progress.set_total(max(total - len(finished), 0))
+
+        def collect(done):
+            for future in done:
+                outcome, error = future.result()
+                summary[outcome] += 1
+                if outcome == "failed" and refund is not None:
+                    refund()
+                progress.advance(error=error)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="seo-batch") as executor:
+                for product_id, product in self._candidates(filters, set_total):
+                    if product_id in finished:
+                        summary["skipped"] += 1
+                        continue
+                    if allow is not None and not allow():
+                        status = "quota_exceeded"
+                        break
+                    # Keep only a few products queued so pages are fetched as the work drains.
+                    while len(pending) >= self.concurrency * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    pending.add(executor.submit(self._process, run_id, product_id, product, dry_run))
+                done, pending = wait(pending)
+                collect(done)
+            if status != "quota_exceeded":
+                status = "completed"
+            summary["status"] = status
+        finally:
+            self.runs.finish(run_id, status)
+            elapsed = time.monotonic() - started
+            processed = summary["updated"] + summary["unchanged"] + summary["failed"]
+            summary["elapsed_seconds"] = round(elapsed, 1)
+            summary["products_per_minute"] = round(processed / elapsed * 60, 1) if elapsed > 0 else 0.0
+            print(f"📈 SEO batch {run_id}: {summary['updated']} updated, {summary['unchanged']} unchanged, "
+                  f"{summary['failed']} failed, {summary['skipped']} skipped "
+                  f"({summary['products_per_minute']} products/min).")
+        return summary
+
+
+@jobs_manager.task("seo.batch_optimize")
+def run_seo_batch(username, tier, run_id):
+    """
+    Background-job entry point; see SeoBatch.run. The run is created before the
+    job is queued, so a re-claimed job resumes it instead of starting over.
+    Each product uses one of the user's SEO optimizations; failed products are refunded.
+    """
+    allow = lambda: quota_meter.consume(username, tier, "seo_optimizations")[0]
+    refund = lambda: quota_meter.refund(username, tier, "seo_optimizations")
+    return SeoBatch().run(run_id, allow=allow, refund=refund)
@@ -1,6 +1,7 @@
 # social_media_agent.py
 
-from logic import get_gemini_vision_pro_model
+from logic import get_gemini_text_model
+from llm_cache import llm_cache
 import os
 
 # In a real application, you would use libraries like 'facebook-sdk' or 'tweepy'
@@ -15,7 +16,7 @@ class SocialMediaAgent:
         Generates compelling ad copy for a product using an AI model.
         """
         try:
-            model = get_gemini_vision_pro_model()
+            model = get_gemini_text_model()
             prompt = f"""
             Generate a short, engaging social media post to promote a new product.
             The post should be exciting and encourage users to check out the product.
@@ -25,10 +26,10 @@ class SocialMediaAgent:
 
             Return the response as a JSON object with a "ad_copy" key.
             """
-            response = model.generate_content([prompt])
+            response_text = llm_cache.generate_text(model, [prompt])
             
             import json
-            clean_response = response.text.strip().replace("```json", "").replace("```", "")
+            clean_response = response_text.strip().replace("```json", "").replace("```", "")
             ad_copy_data = json.loads(clean_response)
             
             return ad_copy_data.get("ad_copy")
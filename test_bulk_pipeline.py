@@ -0,0 +1,143 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+from bulk_pipeline import BulkPipeline, creator_stages, updater_stages, parse_variants_and_prices, failure_log_lock, fcntl
+from rate_limiter import RateLimiter
+from payload_templates import ProductTemplate
+
+CREATOR_ROW = {
+    "title": "Galaxy Dog T-Shirt",
+    "description": "A comfy tee.",
+    "blueprint_id": "3",
+    "print_provider_id": "1",
+    "image_id": "img-1",
+    "variants_and_prices": "12158:2499,12159:2599",
+}
+
+def silent(job):
+    pass
+
+class TestBulkPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmpdir.name, "failed.csv")
+        self.limiter = RateLimiter(rate_per_second=10000)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_parse_variants_and_prices(self):
+        self.assertEqual(parse_variants_and_prices("1:100,2:200"), [(1, 100), (2, 200)])
+
+    def test_creator_sends_payloads_and_logs_failures(self):
+        sent = []
+
+        def create_product(payload):
+            sent.append(payload)
+            return {"id": str(len(sent)), "title": payload["title"]}
+
+        bad_row = dict(CREATOR_ROW, title="Broken", variants_and_prices="not-a-variant")
+        rows = [dict(CREATOR_ROW, title=f"Shirt {i}") for i in range(20)] + [bad_row]
+        pipeline = BulkPipeline("creator", creator_stages(create_product, self.limiter), log_file=self.log_file, queue_size=2, on_result=silent)
+        summary = pipeline.run(rows)
+
+        self.assertEqual(summary["success"], 20)
+        self.assertEqual(summary["failure"], 1)
+        self.assertEqual(len(sent), 20)
+        self.assertEqual(sent[0]["variants"][0], {"id": 12158, "price": 2499, "is_enabled": True})
+        self.assertEqual(sent[0]["print_areas"][0]["variant_ids"], [12158, 12159])
+        self.assertEqual(summary["metrics"]["send"]["processed"], 20)
+        self.assertEqual(summary["metrics"]["parse"]["failed"], 1)
+
+        with open(self.log_file, newline='', encoding='utf-8') as f:
+            logged = list(csv.DictReader(f))
+        self.assertEqual(len(logged), 1)
+        self.assertEqual(logged[0]["title"], "Broken")
+
+    def test_updater_applies_margin(self):
+        updates = {}
+
+        def get_product(product_id):
+            return {"variants": [{"id": 1, "cost": 1000}]}
+
+        def update_product(product_id, payload):
+            updates[product_id] = payload
+            return {"id": product_id}
+
+        rows = [{"product_id": "p1", "margin": "50"}, {"product_id": "p2", "margin": "120"}, {"product_id": "p3"}]
+        pipeline = BulkPipeline("updater", updater_stages(get_product, update_product, self.limiter), log_file=self.log_file, on_result=silent)
+        summary = pipeline.run(rows)
+
+        self.assertEqual(summary["success"], 2)
+        self.assertEqual(summary["failure"], 1)
+        self.assertEqual(updates, {"p1": {"variants": [{"id": 1, "price": 2000}]}})
+
+    def test_failure_log_appends_under_existing_header(self):
+        def create_product(payload):
+            return None
+
+        for _ in range(2):
+            pipeline = BulkPipeline("creator", creator_stages(create_product, self.limiter), log_file=self.log_file, on_result=silent)
+            pipeline.run([dict(CREATOR_ROW)])
+
+        with open(self.log_file, newline='', encoding='utf-8') as f:
+            logged = list(csv.DictReader(f))
+        self.assertEqual(len(logged), 2)
+        self.assertTrue(all(row["error"].startswith("API call failed") for row in logged))
+
+    def test_missing_file_is_reraised(self):
+        def rows():
+            raise FileNotFoundError("missing.csv")
+            yield
+
+        pipeline = BulkPipeline("creator", creator_stages(lambda payload: None, self.limiter), on_result=silent)
+        with self.assertRaises(FileNotFoundError):
+            pipeline.run(rows())
+
+    @unittest.skipIf(fcntl is None, "needs fcntl")
+    def test_failure_log_lock_excludes_other_processes(self):
+        def locked_elsewhere():
+            # A separate open file description contends like another process would.
+            fd = os.open(self.log_file + ".lock", os.O_RDWR | os.O_CREAT)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                return False
+            except BlockingIOError:
+                return True
+            finally:
+                os.close(fd)
+
+        lock = failure_log_lock(self.log_file)
+        with lock:
+            with lock:  # re-entrant, as when the retry runner's pipeline writes the log
+                self.assertTrue(locked_elsewhere())
+            self.assertTrue(locked_elsewhere())
+        self.assertFalse(locked_elsewhere())
+
+class TestProductTemplate(unittest.TestCase):
+
+    def test_render_json_matches_render(self):
+        template = ProductTemplate(3, 1, placeholders=[
+            {"position": "front", "x": 0.5, "y": 0.4, "scale": 0.9, "angle": 0},
+            {"position": "back"},
+        ])
+        row = dict(CREATOR_ROW, title='Quote "Tee"', image_id_back="img-back")
+        variants = parse_variants_and_prices(row["variants_and_prices"])
+        payload = template.render(row, variants)
+
+        self.assertEqual(json.loads(template.render_json(row, variants)), payload)
+        placeholders = payload["print_areas"][0]["placeholders"]
+        self.assertEqual(placeholders[0]["images"][0], {"id": "img-1", "x": 0.5, "y": 0.4, "scale": 0.9, "angle": 0})
+        self.assertEqual(placeholders[1]["images"][0]["id"], "img-back")
+
+    def test_rejects_variants_outside_template(self):
+        template = ProductTemplate(3, 1, variant_ids=[12158])
+        with self.assertRaises(ValueError):
+            template.render(CREATOR_ROW, parse_variants_and_prices(CREATOR_ROW["variants_and_prices"]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from fulfillment_engine import FulfillmentEngine, CANCELED, CONFIRMED, FAILED, SUBMITTED
+
+class NoLimit:
+    def acquire(self):
+        pass
+
+class FakeShop:
+    """On-hold orders served two per page; an order leaves on-hold once it is sent."""
+    def __init__(self, order_ids, fail_sends=0, lose_responses=0):
+        self.orders = {order_id: "on-hold" for order_id in order_ids}
+        self.fail_sends = fail_sends
+        self.lose_responses = lose_responses
+        self.sent = []
+        self.fetched = []
+        self.lock = threading.Lock()
+
+    def fetch_pending_page(self, page):
+        on_hold = [{"id": order_id, "created_at": order_id} for order_id, status in self.orders.items() if status == "on-hold"]
+        # Every order is listed twice, as a page boundary shifting mid-crawl would.
+        listed = on_hold + on_hold
+        return {"data": listed[(page - 1) * 2:page * 2], "last_page": max(1, -(-len(listed) // 2))}
+
+    def send_to_production(self, order_id):
+        with self.lock:
+            if self.fail_sends:
+                self.fail_sends -= 1
+                raise ConnectionError("Connection refused")
+            self.sent.append(order_id)
+            self.orders[order_id] = "in-production"
+            if self.lose_responses:
+                self.lose_responses -= 1
+                raise TimeoutError("Read timed out")
+        return {"id": order_id}
+
+    def fetch_order(self, order_id):
+        self.fetched.append(order_id)
+        return {"id": order_id, "status": self.orders[order_id]}
+
+class TestFulfillmentEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "fulfillment.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def engine(self, shop, **kwargs):
+        return FulfillmentEngine(shop.fetch_pending_page, shop.send_to_production, shop.fetch_order,
+                                 db_path=self.db_path, workers=4, rate_limiter=NoLimit(), **kwargs)
+
+    def test_orders_listed_twice_are_sent_once(self):
+        shop = FakeShop(["o1", "o2", "o3"])
+        summary = self.engine(shop).run()
+        self.assertEqual(summary, {CONFIRMED: 3, FAILED: 0, CANCELED: 0, "skipped": 0})
+        self.assertEqual(sorted(shop.sent), ["o1", "o2", "o3"])
+
+    def test_claims_are_exclusive_across_engines(self):
+        shop = FakeShop(["o1"])
+        first, second = self.engine(shop), self.engine(shop)
+        first.discover()
+        self.assertEqual(first.claim("o1"), "seen")
+        self.assertIsNone(second.claim("o1"))
+        self.assertIsNone(first.claim("o1"))
+        # Overlapping runs never send the same order twice.
+        shop = FakeShop([f"o{i}" for i in range(20)])
+        self.db_path = os.path.join(self.tmpdir.name, "overlap.db")
+        engines = [self.engine(shop) for _ in range(3)]
+        threads = [threading.Thread(target=engine.run) for engine in engines]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(shop.sent), sorted(set(shop.sent)))
+        self.assertEqual(len(shop.sent), 20)
+
+    def test_expired_lease_is_checked_before_resending(self):
+        shop = FakeShop(["o1", "o2"])
+        crashed = self.engine(shop, lease_seconds=0.05)
+        crashed.discover()
+        crashed.claim("o1")
+        crashed.claim("o2")
+        shop.send_to_production("o1")  # o1 went through before the crash, o2 did not
+        self.assertIsNone(self.engine(shop).claim("o1"))  # lease still held
+        time.sleep(0.1)
+
+        summary = self.engine(shop).run()
+        self.assertEqual(summary[CONFIRMED], 2)
+        self.assertEqual(sorted(shop.fetched), ["o1", "o2"])
+        self.assertEqual(sorted(shop.sent), ["o1", "o2"])
+
+    def test_failed_send_is_checked_before_retrying(self):
+        shop = FakeShop(["o1", "o2"], fail_sends=1, lose_responses=1)
+        engine = self.engine(shop)
+        self.assertEqual(engine.run()[FAILED], 2)
+        self.assertEqual(len(shop.sent), 1)  # one refused, one sent but its response was lost
+
+        summary = engine.run()
+        self.assertEqual(summary, {CONFIRMED: 2, FAILED: 0, CANCELED: 0, "skipped": 0})
+        self.assertEqual(sorted(shop.sent), ["o1", "o2"])
+        self.assertEqual(engine.counts(), {CONFIRMED: 2})
+        self.assertNotIn(SUBMITTED, engine.counts())
+
+    def test_cancelled_orders_are_not_confirmed(self):
+        shop = FakeShop(["o1"], fail_sends=1)
+        engine = self.engine(shop)
+        self.assertEqual(engine.run()[FAILED], 1)
+        shop.orders["o1"] = "canceled"
+
+        summary = engine.run()
+        self.assertEqual(summary, {CONFIRMED: 0, FAILED: 0, CANCELED: 1, "skipped": 0})
+        self.assertEqual(shop.sent, [])
+        self.assertEqual(engine.counts(), {CANCELED: 1})
+
+    def test_orders_left_from_a_crashed_run_are_checked_before_sending(self):
+        shop = FakeShop(["o1", "o2", "o3"])
+        self.engine(shop).discover()  # crashed before claiming anything
+        shop.orders["o1"] = "canceled"
+        shop.orders["o2"] = "in-production"  # sent by hand in the meantime
+
+        summary = self.engine(shop).run()
+        self.assertEqual(summary, {CONFIRMED: 2, FAILED: 0, CANCELED: 1, "skipped": 0})
+        self.assertEqual(shop.sent, ["o3"])
+        self.assertEqual(sorted(shop.fetched), ["o1", "o2"])
+
+if __name__ == '__main__':
+    unittest.main()
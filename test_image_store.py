@@ -0,0 +1,67 @@
+import io
+import os
+import tempfile
+import unittest
+from PIL import Image
+from image_store import ImageStore, hamming_distance, is_allowed_url, perceptual_hash
+
+def png_bytes(image, image_format="PNG"):
+    buf = io.BytesIO()
+    image.save(buf, format=image_format)
+    return buf.getvalue()
+
+def gradient(size=256, reverse=False):
+    image = Image.new("RGB", (size, size))
+    image.putdata([((255 - x) if reverse else x, y, 128) for y in range(size) for x in range(size)])
+    return image
+
+class TestImageStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = ImageStore(root=os.path.join(self.tmpdir.name, "images"),
+                                db_path=os.path.join(self.tmpdir.name, "images.db"), thumbnail_sizes=(64, 128))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_store_is_content_addressed_with_thumbnails(self):
+        data = png_bytes(gradient())
+        record = self.store.store_bytes(data)
+        self.assertEqual(self.store.store_bytes(data)["digest"], record["digest"])
+        self.assertEqual((record["width"], record["height"], record["format"]), (256, 256, "PNG"))
+        with open(self.store.path(record["digest"]), "rb") as f:
+            self.assertEqual(f.read(), data)
+        with Image.open(self.store.thumbnail_path(record["digest"], 64)) as thumbnail:
+            self.assertEqual(thumbnail.size, (64, 64))
+        self.assertIsNone(self.store.thumbnail_path(record["digest"], 999))
+        self.assertIsNone(self.store.path("../etc/passwd"))
+
+    def test_near_duplicates_are_found(self):
+        original = self.store.store_bytes(png_bytes(gradient()))
+        reencoded = self.store.store_bytes(png_bytes(gradient(), "JPEG"))
+        different = self.store.store_bytes(png_bytes(gradient(reverse=True)))
+        self.assertNotEqual(original["digest"], reencoded["digest"])
+        duplicates = [d["digest"] for d in self.store.find_duplicates(original["digest"])]
+        self.assertEqual(duplicates, [reencoded["digest"]])
+        self.assertNotIn(original["digest"], [d["digest"] for d in self.store.find_duplicates(different["digest"])])
+
+    def test_perceptual_hash_ignores_resizing(self):
+        self.assertLessEqual(hamming_distance(perceptual_hash(gradient(256)), perceptual_hash(gradient(96))), 2)
+
+    def test_rejects_non_images(self):
+        with self.assertRaises(ValueError):
+            self.store.store_bytes(b"not an image")
+
+    def test_only_provider_urls_are_fetched(self):
+        self.assertTrue(is_allowed_url("https://replicate.delivery/pbxt/abc/out.png"))
+        self.assertTrue(is_allowed_url("https://pbxt.replicate.delivery/abc/out.png"))
+        for url in ("http://replicate.delivery/out.png", "https://169.254.169.254/latest/meta-data",
+                    "https://localhost/out.png", "https://replicate.delivery.evil.com/out.png",
+                    "https://user@replicate.delivery/out.png", "file:///etc/passwd", None):
+            self.assertFalse(is_allowed_url(url), url)
+        with self.assertRaises(ValueError):
+            self.store.store_url("http://127.0.0.1:8080/admin")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import csv
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import image_uploader
+from image_uploader import ImageIndex, ingest_image_folder, write_image_ids_to_csv
+
+class NoLimit:
+    def acquire(self):
+        pass
+
+class FakeClient:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.uploads = []
+        self.lock = threading.Lock()
+
+    def upload_image(self, file_name, contents):
+        with self.lock:
+            self.uploads.append(file_name)
+            if file_name in self.fail:
+                return None
+            return {"id": f"img-{len(self.uploads)}"}
+
+class TestImageUploader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self.tmpdir.name, "art")
+        self.index_path = os.path.join(self.tmpdir.name, "image_index.json")
+        self._write("cats/logo.png", b"cat logo")
+        self._write("dogs/logo.png", b"dog logo")
+        self._write("dogs/copy.png", b"dog logo")
+        self._write("notes.txt", b"not an image")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, relative, contents):
+        path = os.path.join(self.folder, *relative.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(contents)
+
+    def ingest(self, client):
+        return ingest_image_folder(self.folder, client=client, index=ImageIndex(self.index_path), rate_limiter=NoLimit())
+
+    def test_same_name_in_subfolders_and_duplicate_content(self):
+        client = FakeClient()
+        resolved = self.ingest(client)
+        self.assertEqual(sorted(resolved), ["cats/logo.png", "dogs/copy.png", "dogs/logo.png"])
+        self.assertEqual(len(client.uploads), 2)
+        self.assertNotEqual(resolved["cats/logo.png"], resolved["dogs/logo.png"])
+        self.assertEqual(resolved["dogs/copy.png"], resolved["dogs/logo.png"])
+
+        # A second run reuses the saved index and uploads nothing.
+        again = FakeClient()
+        self.assertEqual(self.ingest(again), resolved)
+        self.assertEqual(again.uploads, [])
+
+    def test_index_is_saved_during_the_run_and_failures_are_retried(self):
+        saves = []
+        original_save = ImageIndex.save
+
+        def recording_save(index):
+            saves.append(sorted(entry["file_name"] for entry in index.images.values()))
+            original_save(index)
+        with mock.patch.object(image_uploader, "SAVE_EVERY", 1), mock.patch.object(ImageIndex, "save", recording_save):
+            resolved = self.ingest(FakeClient(fail={"logo.png"}))
+        self.assertEqual(sorted(resolved), ["dogs/copy.png", "dogs/logo.png"])
+        # Saved right after the upload, then once more at the end.
+        self.assertEqual(saves, [["dogs/copy.png"], ["dogs/copy.png"]])
+
+        client = FakeClient()
+        resolved = self.ingest(client)
+        self.assertEqual(client.uploads, ["logo.png"])
+        self.assertEqual(len(resolved), 3)
+        with open(self.index_path) as f:
+            self.assertEqual(len(json.load(f)["images"]), 2)
+
+    def test_csv_rows_match_relative_paths_and_unambiguous_names(self):
+        image_ids = {"cats/logo.png": "img-cat", "dogs/logo.png": "img-dog", "dogs/copy.png": "img-dog",
+                     "solo/Sunset.png": "img-sun"}
+        csv_path = os.path.join(self.tmpdir.name, "products.csv")
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["title", "image_file", "blueprint_id"])
+            writer.writeheader()
+            writer.writerow({"title": "Cat Tee", "image_file": "cats/logo.png"})
+            writer.writerow({"title": "Dog Tee", "image_file": "./dogs/logo.png"})
+            writer.writerow({"title": "Ambiguous", "image_file": "logo.png"})
+            writer.writerow({"title": "Copy", "image_file": "copy.png"})
+            writer.writerow({"title": "sunset", "image_file": ""})
+
+        self.assertEqual(write_image_ids_to_csv(csv_path, image_ids, defaults={"blueprint_id": "3"}), 4)
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            rows = {row["title"]: row for row in csv.DictReader(f)}
+        self.assertEqual({title: row["image_id"] for title, row in rows.items()},
+                         {"Cat Tee": "img-cat", "Dog Tee": "img-dog", "Ambiguous": "", "Copy": "img-dog", "sunset": "img-sun"})
+        self.assertTrue(all(row["blueprint_id"] == "3" for row in rows.values()))
+
+if __name__ == '__main__':
+    unittest.main()
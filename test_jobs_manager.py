@@ -0,0 +1,264 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from job_store import JobStore, RUNNING, PENDING
+from jobs_manager import JobsManager, JobQueueFull, PRIORITY_HIGH, PRIORITY_LOW, CPU
+from job_progress import ProgressReporter, current_progress, MAX_ITEMS
+
+def worker_pid(payload):
+    # Module-level so the process pool can import it.
+    return [os.getpid(), len(payload)]
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+class TestJobsManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "jobs.db")
+        self.manager = JobsManager(self.db_path, max_workers=1, max_queue=2, poll_interval=0.05, cpu_workers=1)
+        self.gate = threading.Event()
+        self.order = []
+        self.manager.register_task("wait", lambda: self.gate.wait(5))
+        self.manager.register_task("record", self.order.append)
+        self.manager.register_task("sleep", time.sleep)
+        # Occupy the only worker so later jobs stay queued until the gate opens.
+        self.blocker = self.manager.submit("wait")
+        wait_for(lambda: self.manager.get_job(self.blocker)["status"] == RUNNING)
+
+    def tearDown(self):
+        self.gate.set()
+        self.manager.shutdown()
+        self.tmpdir.cleanup()
+
+    def status(self, job_id):
+        return self.manager.get_job(job_id)["status"]
+
+    def test_runs_by_priority(self):
+        low = self.manager.submit("record", ("low",), priority=PRIORITY_LOW)
+        self.manager.submit(self.order.append, ("high",), priority=PRIORITY_HIGH)
+        self.gate.set()
+        self.assertTrue(wait_for(lambda: self.status(low) == "completed"))
+        self.assertEqual(self.order, ["high", "low"])
+
+    def test_bounded_queue_and_cancel(self):
+        self.manager.submit("record", ("a",))
+        queued = self.manager.submit("record", ("b",))
+        with self.assertRaises(JobQueueFull):
+            self.manager.submit("record", ("c",))
+        self.assertTrue(self.manager.cancel(queued))
+        self.assertEqual(self.status(queued), "cancelled")
+        self.manager.submit("record", ("d",))  # the cancelled job freed its slot
+
+    def test_unregistered_callable_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.manager.submit(print)
+
+    def test_timeout_marks_failed_and_replaces_worker(self):
+        self.manager.cancel(self.blocker)
+        slow = self.manager.submit("sleep", (3,), timeout=0.2)
+        self.assertTrue(wait_for(lambda: self.status(slow) == "failed"))
+        self.assertIn("timed out", self.manager.get_job(slow)["result"])
+        quick = self.manager.submit("record", ("quick",))
+        self.assertTrue(wait_for(lambda: self.status(quick) == "completed", timeout=2))
+
+    def test_replacement_threads_are_capped(self):
+        with mock.patch("jobs_manager.MAX_DETACHED_WORKERS", 1):
+            self.assertTrue(wait_for(lambda: self.blocker in self.manager._running))
+            self.manager.cancel(self.blocker)  # its thread is detached and replaced
+            stuck = self.manager.submit("wait", timeout=0.1)
+            self.assertTrue(wait_for(lambda: self.status(stuck) == "failed"))
+            queued = self.manager.submit("record", ("queued",))
+            time.sleep(0.3)
+            self.assertEqual(self.status(queued), PENDING)  # both threads are still stuck
+            self.gate.set()
+            self.assertTrue(wait_for(lambda: self.status(queued) == "completed"))
+
+    def test_watchdog_survives_a_deleted_job(self):
+        self.manager.cancel(self.blocker)
+        slow = self.manager.submit("sleep", (1,), timeout=0.2)
+        self.assertTrue(wait_for(lambda: self.status(slow) == RUNNING))
+        self.manager.store.connection().execute("DELETE FROM jobs WHERE id = ?", (slow,))
+        time.sleep(0.6)
+        self.assertTrue(self.manager._watchdog.is_alive())
+        quick = self.manager.submit("record", ("quick",))
+        self.assertTrue(wait_for(lambda: self.status(quick) == "completed"))
+
+    def test_status_is_shared_across_processes(self):
+        other = JobStore(self.db_path)
+        job_id = self.manager.submit("record", ("shared",))
+        self.assertEqual(other.get(job_id)["status"], PENDING)
+        self.gate.set()
+        self.assertTrue(wait_for(lambda: other.get(job_id)["status"] == "completed"))
+
+    def test_progress_events_stream_until_done(self):
+        def count_rows(n):
+            progress = current_progress()
+            progress.set_total(n)
+            for i in range(n):
+                progress.advance(error="bad row" if i == 0 else None)
+            return n
+        self.manager.register_task("count", count_rows)
+        job_id = self.manager.submit("count", (50,))
+        self.gate.set()
+        events = list(self.manager.events(job_id, poll_interval=0.02))
+        self.assertEqual(events[-1][0], "done")
+        self.assertEqual(events[-1][1]["result"], 50)
+        last_progress = [data for event, data in events if event == "progress"][-1]
+        self.assertEqual((last_progress["done"], last_progress["total"], last_progress["failed"]), (50, 50, 1))
+        self.assertEqual(last_progress["errors"], ["bad row"])
+
+    def test_events_stop_after_max_duration_and_resume(self):
+        job_id = self.manager.submit("record", ("queued",))
+        events = list(self.manager.events(job_id, poll_interval=0.02, max_duration=0.1))
+        self.assertNotIn("done", [event for event, _ in events])
+        seen = max([data["seq"] for event, data in events if event == "progress"], default=0)
+        self.gate.set()
+        resumed = list(self.manager.events(job_id, poll_interval=0.02, since_seq=seen))
+        self.assertEqual(resumed[-1][0], "done")
+        self.assertTrue(all(data["seq"] > seen for event, data in resumed if event == "progress"))
+
+    def test_workers_only_claim_registered_tasks(self):
+        other = JobStore(self.db_path)
+        job_id = other.enqueue("not_registered_here")
+        self.gate.set()
+        time.sleep(0.3)
+        self.assertEqual(self.status(job_id), PENDING)
+
+    def test_cpu_tasks_run_in_process_lane(self):
+        self.manager.register_task("pid", worker_pid, kind=CPU)
+        self.manager.process_lane.inline_bytes = 10  # force the file hand-off
+        job_id = self.manager.submit("pid", ("x" * 100,))
+        # The I/O worker is still blocked, so this ran on the separate CPU lane.
+        self.assertTrue(wait_for(lambda: self.status(job_id) == "completed", timeout=60))
+        pid, size = self.manager.get_job(job_id)["result"]
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(size, 100)
+
+class TestProgressReporter(unittest.TestCase):
+
+    def test_publishes_are_throttled(self):
+        published = []
+        reporter = ProgressReporter(published.append, total=1000, min_interval=60)
+        for _ in range(1000):
+            reporter.advance()
+        self.assertEqual(len(published), 1)  # only the first advance was due
+        reporter.flush()
+        self.assertEqual(published[-1]["done"], 1000)
+        self.assertEqual(published[-1]["eta_seconds"], 0)
+
+    def test_partial_results_are_published(self):
+        published = []
+        reporter = ProgressReporter(published.append, total=2, min_interval=0)
+        reporter.advance(item={"index": 1})
+        reporter.advance(error="failed")
+        self.assertEqual(published[-1]["items"], [{"index": 1}])
+        self.assertEqual(published[-1]["failed"], 1)
+
+    def test_partial_results_are_capped(self):
+        published = []
+        reporter = ProgressReporter(published.append, min_interval=60)
+        for i in range(MAX_ITEMS + 10):
+            reporter.advance(item=i)
+        reporter.flush()
+        self.assertEqual(published[-1]["items"], list(range(10, MAX_ITEMS + 10)))
+
+class TestJobStoreLeases(unittest.TestCase):
+
+    def test_expired_lease_is_reclaimed_once(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = JobStore(os.path.join(tmpdir, "jobs.db"), lease_seconds=0)
+            job_id = store.enqueue("task")
+            self.assertEqual(store.claim("dead-worker")["id"], job_id)
+            time.sleep(0.01)
+            self.assertEqual(store.claim("live-worker")["id"], job_id)
+            self.assertFalse(store.finish(job_id, "dead-worker", "completed", "late"))
+            self.assertTrue(store.finish(job_id, "live-worker", "completed", "ok"))
+            self.assertEqual(store.get(job_id)["result"], "ok")
+
+    def test_single_attempt_jobs_are_not_rerun(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = JobStore(os.path.join(tmpdir, "jobs.db"), lease_seconds=0)
+            job_id = store.enqueue("create", max_attempts=1)
+            self.assertTrue(store.has_claimable(["create"]))
+            self.assertFalse(store.has_claimable(["other"]))
+            self.assertEqual(store.claim("dead-worker")["id"], job_id)
+            time.sleep(0.01)
+            self.assertIsNone(store.claim("live-worker"))
+            self.assertEqual(store.get(job_id)["status"], "failed")
+            self.assertFalse(store.has_claimable())
+
+    def test_released_job_is_claimable_again(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = JobStore(os.path.join(tmpdir, "jobs.db"))
+            job_id = store.enqueue("task", max_attempts=1)
+            store.claim("worker")
+            self.assertFalse(store.has_claimable())
+            store.release(job_id, "worker")
+            job = store.claim("worker")
+            self.assertEqual((job["id"], job["attempts"]), (job_id, 0))
+
+class TestJobRetention(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = JobStore(os.path.join(self.tmpdir.name, "jobs.db"),
+                              results_dir=os.path.join(self.tmpdir.name, "results"), spill_bytes=100)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_job(self, result, status="completed"):
+        job_id = self.store.enqueue("task")
+        self.store.claim("worker")
+        self.store.finish(job_id, "worker", status, result)
+        return job_id
+
+    def test_counts_follow_status_changes(self):
+        self.run_job("ok")
+        self.run_job("boom", status="failed")
+        self.store.enqueue("task")
+        self.assertEqual(self.store.counts(), {"completed": 1, "failed": 1, "pending": 1})
+        # A fresh store on the same file starts from reconciled counts.
+        self.assertEqual(JobStore(self.store.db_path).count("failed"), 1)
+
+    def test_owner_is_recorded(self):
+        job_id = self.store.enqueue("task", owner="alice")
+        self.assertEqual(self.store.get(job_id)["owner"], "alice")
+        self.assertIsNone(self.store.get(self.store.enqueue("task"))["owner"])
+
+    def test_database_is_created_on_first_use(self):
+        db_path = os.path.join(self.tmpdir.name, "lazy.db")
+        manager = JobsManager(db_path, max_workers=1, cpu_workers=1)
+        self.assertFalse(os.path.exists(db_path))
+        self.assertEqual(manager.store.count("pending"), 0)
+        self.assertTrue(os.path.exists(db_path))
+
+    def test_large_results_spill_to_disk_and_are_purged(self):
+        job_id = self.run_job("x" * 500)
+        job = self.store.get(job_id)
+        self.assertEqual(job["result"], "x" * 500)
+        self.assertTrue(os.path.exists(job["result_path"]))
+        self.assertEqual(self.store.purge(ttl_seconds=0), 1)
+        self.assertIsNone(self.store.get(job_id))
+        self.assertFalse(os.path.exists(job["result_path"]))
+        self.assertEqual(self.store.count("completed"), 0)
+
+    def test_purge_caps_finished_jobs(self):
+        job_ids = [self.run_job(i) for i in range(5)]
+        self.store.enqueue("task")
+        self.assertEqual(self.store.purge(max_finished=2), 3)
+        self.assertEqual([self.store.get(job_id) is not None for job_id in job_ids], [False, False, False, True, True])
+        self.assertEqual(self.store.count("pending"), 1)
+
+if __name__ == "__main__":
+    unittest.main()
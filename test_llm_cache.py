@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from image_store import image_store
+from llm_cache import LLMCache, cache_key
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeModel:
+    def __init__(self, model_name="models/gemini-pro", text="answer"):
+        self.model_name = model_name
+        self.text = text
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        return FakeResponse(self.text)
+
+class TestLLMCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "llm_cache.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_repeated_prompt_is_served_from_cache(self):
+        cache = LLMCache(disk_path=self.db_path)
+        model = FakeModel()
+        self.assertEqual(cache.generate_text(model, ["disclaimer for T-Shirt"], cache=True), "answer")
+        self.assertEqual(cache.generate_text(model, ["disclaimer for T-Shirt"], cache=True), "answer")
+        self.assertEqual(model.calls, 1)
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    def test_disk_layer_is_shared(self):
+        model = FakeModel()
+        LLMCache(disk_path=self.db_path).generate_text(model, ["prompt"], cache=True)
+        self.assertEqual(LLMCache(disk_path=self.db_path).generate_text(model, ["prompt"], cache=True), "answer")
+        self.assertEqual(model.calls, 1)
+
+    def test_key_covers_model_and_image_content(self):
+        image_path = os.path.join(self.tmpdir.name, "image.png")
+        with open(image_path, "wb") as f:
+            f.write(b"first")
+        first = cache_key(FakeModel(), ["prompt", {"path": image_path}])
+        with open(image_path, "wb") as f:
+            f.write(b"second")
+        self.assertNotEqual(first, cache_key(FakeModel(), ["prompt", {"path": image_path}]))
+        self.assertNotEqual(cache_key(FakeModel("a"), "prompt"), cache_key(FakeModel("b"), "prompt"))
+
+    def test_image_urls_are_keyed_on_content(self):
+        digests = {"https://replicate.delivery/a.png": "same", "https://replicate.delivery/b.png": "same",
+                   "https://replicate.delivery/c.png": "other"}
+        with mock.patch.object(image_store, "store_url", lambda url: {"digest": digests[url]}):
+            first = cache_key(FakeModel(), ["prompt", {"url": "https://replicate.delivery/a.png"}])
+            self.assertEqual(first, cache_key(FakeModel(), ["prompt", {"url": "https://replicate.delivery/b.png"}]))
+            self.assertNotEqual(first, cache_key(FakeModel(), ["prompt", {"url": "https://replicate.delivery/c.png"}]))
+
+    def test_empty_responses_are_not_cached(self):
+        cache = LLMCache(disk_path=self.db_path)
+        model = FakeModel(text="")
+        cache.generate_text(model, ["prompt"], cache=True)
+        cache.generate_text(model, ["prompt"], cache=True)
+        self.assertEqual(model.calls, 2)
+
+    def test_uncached_calls_always_reach_the_model(self):
+        cache = LLMCache(disk_path=self.db_path)
+        model = FakeModel()
+        cache.generate_text(model, ["write ad copy"])
+        cache.generate_text(model, ["write ad copy"])
+        self.assertEqual(model.calls, 2)
+        self.assertEqual(cache.stats()["hits"] + cache.stats()["misses"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
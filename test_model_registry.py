@@ -0,0 +1,72 @@
+import threading
+import time
+import unittest
+from model_registry import ModelRegistry
+
+class FakeModel:
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        if prompt == "fail":
+            raise RuntimeError("boom")
+        return prompt
+
+class TestModelRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.created = []
+
+        def factory(model_name):
+            time.sleep(0.01)  # widen the window for a creation race
+            model = FakeModel(model_name)
+            self.created.append(model)
+            return model
+        self.registry = ModelRegistry({"text": "text-model", "vision": "vision-model"},
+                                      {"text": 2, "vision": 1}, factory=factory)
+
+    def test_models_are_created_lazily_once_per_kind(self):
+        self.assertEqual(self.created, [])
+        threads = [threading.Thread(target=self.registry.get, args=("text",)) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([model.model_name for model in self.created], ["text-model"])
+        self.assertIs(self.registry.get("text"), self.registry.get("text"))
+        self.assertEqual(self.registry.get("vision").model_name, "vision-model")
+        with self.assertRaises(KeyError):
+            self.registry.get("audio")
+
+    def test_concurrency_limit_and_metrics(self):
+        model = self.registry.get("text")
+        threads = [threading.Thread(target=model.generate_content, args=("hi",)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with self.assertRaises(RuntimeError):
+            model.generate_content("fail")
+        self.assertEqual(self.created[0].peak, 2)
+        metrics = self.registry.metrics()["text"]
+        self.assertEqual((metrics["model"], metrics["calls"], metrics["errors"]), ("text-model", 7, 1))
+        self.assertGreaterEqual(metrics["p50_ms"], 15)
+        self.assertNotIn("vision", self.registry.metrics())
+
+    def test_warm_up_reports_failures(self):
+        def broken(model_name):
+            raise ValueError("no key")
+        self.assertFalse(ModelRegistry({"text": "t"}, factory=broken).warm_up())
+        self.assertTrue(self.registry.warm_up())
+
+if __name__ == '__main__':
+    unittest.main()
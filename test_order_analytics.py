@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from order_analytics import OrderAnalytics
+from order_store import OrderStore
+
+def make_order(order_id, created_at, customer, title, quantity, price, cost, status="fulfilled"):
+    return {
+        "id": order_id,
+        "status": status,
+        "created_at": created_at,
+        "total_price": price * quantity,
+        "address_to": {"email": customer},
+        "line_items": [{"product_id": title.lower(), "variant_id": 1, "blueprint_id": 3, "print_provider_id": 1,
+                        "quantity": quantity, "cost": cost, "metadata": {"title": title, "price": price}}],
+    }
+
+# Two January customers, one of whom orders again in February, plus a cancelled order that must not count.
+FIXTURE = [
+    make_order("o1", "2024-01-05T10:00:00Z", "a@example.com", "Dog Tee", 2, 1000, 400),
+    make_order("o2", "2024-01-20T10:00:00Z", "b@example.com", "Cat Mug", 1, 3000, 1000),
+    make_order("o3", "2024-02-10T10:00:00Z", "a@example.com", "Dog Tee", 1, 1000, 400),
+    make_order("o4", "2024-02-11T10:00:00Z", "c@example.com", "Cat Mug", 5, 3000, 1000, status="canceled"),
+]
+
+class TestOrderAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = OrderStore(os.path.join(self.tmpdir.name, "orders.db"))
+        self.store.upsert_orders(FIXTURE)
+        self.analytics = OrderAnalytics(self.store)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_summary(self):
+        self.assertEqual(self.analytics.summary(), {
+            "total_orders": 3,
+            "total_revenue": 6000,
+            "total_cost": 2200,
+            "gross_profit": 3800,
+            "gross_margin_pct": 63.33,
+            "average_order_value": 2000.0,
+        })
+
+    def test_margin_by_title(self):
+        margins = self.analytics.margin_by("title")
+        self.assertEqual(margins.loc["Dog Tee", ["units", "revenue", "cost", "margin"]].tolist(), [3, 3000, 1200, 1800])
+        self.assertEqual(margins.loc["Cat Mug", ["units", "revenue", "cost", "margin"]].tolist(), [1, 3000, 1000, 2000])
+        self.assertAlmostEqual(margins.loc["Dog Tee", "margin_pct"], 60.0)
+        self.assertAlmostEqual(margins.loc["Cat Mug", "margin_pct"], 66.6667, places=3)
+
+        by_week = self.analytics.margin_by("week")
+        self.assertEqual(list(by_week.index), ["2024-01-01", "2024-01-15", "2024-02-05"])
+
+    def test_cohort_retention(self):
+        retention = self.analytics.cohort_retention()
+        self.assertEqual(list(retention.index), ["2024-01"])
+        self.assertEqual(retention.loc["2024-01"].tolist(), [1.0, 0.5])
+
+    def test_results_are_cached_until_orders_change(self):
+        version = self.store.version()
+        first = self.analytics.summary()
+        self.assertIs(self.analytics.summary(), first)
+
+        self.store.upsert_orders([make_order("o5", "2024-03-01T10:00:00Z", "b@example.com", "Cat Mug", 1, 3000, 1000)])
+        self.assertEqual(self.store.version(), version + 1)
+        self.assertEqual(self.analytics.summary()["total_orders"], 4)
+        self.assertEqual(self.analytics.cohort_retention().loc["2024-01"].tolist(), [1.0, 0.5, 0.5])
+
+if __name__ == '__main__':
+    unittest.main()
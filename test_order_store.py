@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+from order_store import OrderStore, OrderIngester
+from rate_limiter import RateLimiter
+from sales_rollup import SalesRollup
+
+def make_order(order_id, created_at, status="fulfilled", price=2000, quantity=1, title="Galaxy Dog T-Shirt"):
+    return {
+        "id": order_id,
+        "status": status,
+        "created_at": created_at,
+        "total_price": price,
+        "line_items": [{"product_id": "p1", "variant_id": 1, "quantity": quantity, "cost": 800,
+                        "metadata": {"title": title, "price": price}}],
+    }
+
+class FakeShop:
+    def __init__(self, orders, page_size=2):
+        self.orders = orders
+        self.page_size = page_size
+        self.pages_fetched = []
+
+    def fetch_page(self, page):
+        self.pages_fetched.append(page)
+        ordered = sorted(self.orders.values(), key=lambda o: o["created_at"], reverse=True)
+        start = (page - 1) * self.page_size
+        last_page = max(1, -(-len(ordered) // self.page_size))
+        return {"data": ordered[start:start + self.page_size], "last_page": last_page}
+
+    def fetch_order(self, order_id):
+        return self.orders.get(order_id)
+
+class TestOrderStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = OrderStore(os.path.join(self.tmpdir.name, "orders.db"))
+        self.limiter = RateLimiter(rate_per_second=10000)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_incremental_ingest_and_status_refresh(self):
+        shop = FakeShop({
+            "o1": make_order("o1", "2099-01-01T10:00:00Z"),
+            "o2": make_order("o2", "2099-01-02T10:00:00Z", status="on-hold"),
+            "o3": make_order("o3", "2099-01-03T10:00:00Z"),
+        })
+        ingester = OrderIngester(self.store, shop.fetch_page, shop.fetch_order, rate_limiter=self.limiter)
+        self.assertEqual(ingester.ingest()["new_orders"], 3)
+        self.assertEqual(shop.pages_fetched, [1, 2])
+
+        shop.orders["o4"] = make_order("o4", "2099-01-04T10:00:00Z")
+        shop.orders["o2"]["status"] = "fulfilled"
+        shop.pages_fetched.clear()
+        result = ingester.ingest()
+
+        self.assertEqual(result, {"new_orders": 1, "refreshed": 1})
+        self.assertEqual(shop.pages_fetched, [1])
+        self.assertEqual(self.store.count_by_status(), {"fulfilled": 4})
+
+    def test_failed_page_does_not_advance_cursor(self):
+        shop = FakeShop({f"o{i}": make_order(f"o{i}", f"2099-01-0{i}T10:00:00Z") for i in range(1, 6)})
+        failing_pages = {2}
+        ingester = OrderIngester(self.store, lambda page: None if page in failing_pages else shop.fetch_page(page),
+                                 rate_limiter=self.limiter)
+        result = ingester.ingest()
+        self.assertIn("error", result)
+        self.assertIsNone(self.store.get_meta("orders_cursor"))
+
+        failing_pages.clear()
+        result = ingester.ingest()
+        self.assertNotIn("error", result)
+        self.assertEqual(self.store.count_by_status(), {"fulfilled": 5})
+        self.assertEqual(self.store.get_meta("orders_cursor"), self.store.latest_created_at())
+
+    def test_window_queries(self):
+        self.store.upsert_orders([
+            make_order("o1", "2024-01-01 10:00:00+00:00"),
+            make_order("o2", "2024-01-05T10:00:00Z", status="canceled"),
+            make_order("o3", "2024-02-01T10:00:00Z", quantity=3),
+        ])
+        january = self.store.orders_between("2024-01-01T00:00:00Z", "2024-02-01T00:00:00Z")
+        self.assertEqual([order["id"] for order in january], ["o2", "o1"])
+        items = self.store.line_items_between(status="fulfilled")
+        self.assertEqual(sum(item["quantity"] for item in items), 4)
+        self.assertEqual(self.store.orders_between(status="fulfilled")[0]["total_cost"], 2400)
+
+    def test_rollups_follow_status_changes(self):
+        rollup = SalesRollup(self.store)
+        self.store.upsert_orders([
+            make_order("o1", "2024-01-31T23:00:00Z", title="Mug"),
+            make_order("o2", "2024-02-01T10:00:00Z", quantity=3),
+            make_order("o3", "2024-03-15T10:00:00Z", status="on-hold"),
+        ])
+        self.store.upsert_orders([make_order("o3", "2024-03-15T10:00:00Z")])
+
+        self.assertEqual(rollup.summary(), {"orders": 3, "revenue": 6000, "cost": 4000, "profit": 2000})
+        february_onwards = rollup.summary(start="2024-02-01", end="2024-03-16")
+        self.assertEqual(february_onwards["orders"], 2)
+        self.assertEqual(rollup.summary(start="2024-01-15", end="2024-02-10")["orders"], 2)
+        self.assertEqual(rollup.summary(status="on-hold")["orders"], 0)
+        self.assertEqual(rollup.top_products(1), [("Galaxy Dog T-Shirt", 4)])
+
+        # A store opened later rebuilds nothing and sees the same totals.
+        reopened = SalesRollup(OrderStore(self.store.db_path))
+        self.assertEqual(reopened.summary()["revenue"], 6000)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from prediction_manager import PredictionManager, verify_webhook
+
+SECRET = "whsec_" + base64.b64encode(b"replicate-signing-key").decode()
+
+def sign(body, webhook_id="msg_1", timestamp=None, secret=SECRET):
+    timestamp = str(int(time.time()) if timestamp is None else timestamp)
+    key = base64.b64decode(secret.split("_", 1)[1])
+    signature = base64.b64encode(hmac.new(key, f"{webhook_id}.{timestamp}.".encode() + body, hashlib.sha256).digest())
+    return {"webhook-id": webhook_id, "webhook-timestamp": timestamp, "webhook-signature": f"v1,{signature.decode()}"}
+
+class TestVerifyWebhook(unittest.TestCase):
+
+    def setUp(self):
+        self.body = json.dumps({"id": "p1", "status": "succeeded", "output": ["https://example.com/a.png"]}).encode()
+
+    def test_accepts_a_valid_signature(self):
+        self.assertTrue(verify_webhook(SECRET, sign(self.body), self.body))
+        headers = sign(self.body)
+        headers["webhook-signature"] = "v1,b2xkLXNpZ25hdHVyZQ== " + headers["webhook-signature"]
+        self.assertTrue(verify_webhook(SECRET, headers, self.body))
+
+    def test_rejects_tampered_stale_or_unsigned_webhooks(self):
+        self.assertFalse(verify_webhook(SECRET, sign(self.body), self.body.replace(b"a.png", b"b.png")))
+        other = "whsec_" + base64.b64encode(b"another-key").decode()
+        self.assertFalse(verify_webhook(SECRET, sign(self.body, secret=other), self.body))
+        self.assertFalse(verify_webhook(SECRET, sign(self.body, timestamp=time.time() - 3600), self.body))
+        self.assertFalse(verify_webhook(SECRET, {}, self.body))
+        self.assertFalse(verify_webhook(None, sign(self.body), self.body))
+
+class FakePredictions:
+    """Replicate's predictions API; each prediction succeeds on its `finish_after`-th poll (never when None)."""
+    def __init__(self, finish_after=None):
+        self.finish_after = finish_after
+        self.created = 0
+        self.polls = {}
+        self.cancelled = []
+
+    def create(self, version, **options):
+        self.created += 1
+        return {"id": f"p{self.created}", "status": "starting"}
+
+    def get(self, prediction_id):
+        self.polls.setdefault(prediction_id, []).append(time.monotonic())
+        if self.finish_after is not None and len(self.polls[prediction_id]) >= self.finish_after:
+            return {"id": prediction_id, "status": "succeeded", "output": ["https://example.com/out.png"]}
+        return {"id": prediction_id, "status": "processing"}
+
+    def cancel(self, prediction_id):
+        self.cancelled.append(prediction_id)
+
+class FakeReplicate:
+    def __init__(self, finish_after=None):
+        self.predictions = FakePredictions(finish_after)
+
+class TestPredictionManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "predictions.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def manager(self, client):
+        return PredictionManager(client, db_path=self.db_path, poll_initial=0.02, poll_max=0.1)
+
+    def test_polls_with_backoff_until_done(self):
+        client = FakeReplicate(finish_after=4)
+        manager = self.manager(client)
+        prediction = manager.wait(manager.create("owner/model:v1", "a cat"))
+        self.assertEqual((prediction["status"], prediction["output"]), ("succeeded", ["https://example.com/out.png"]))
+        polls = client.predictions.polls["p1"]
+        gaps = [later - earlier for earlier, later in zip(polls, polls[1:])]
+        self.assertEqual(len(polls), 4)
+        self.assertGreater(gaps[-1], gaps[0])
+
+    def test_webhook_completes_without_waiting_for_the_next_poll(self):
+        client = FakeReplicate()
+        manager = PredictionManager(client, db_path=self.db_path, poll_initial=30, poll_max=30)
+        prediction_id = manager.create("owner/model:v1", "a cat")
+        deliver = threading.Timer(0.1, manager.handle_webhook, args=({"id": prediction_id, "status": "succeeded", "output": ["x"]},))
+        deliver.start()
+        started = time.monotonic()
+        prediction = manager.wait(prediction_id, max_wait=10)
+        self.assertEqual(prediction["status"], "succeeded")
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(client.predictions.polls, {})
+        self.assertFalse(manager.handle_webhook({"id": "unknown", "status": "succeeded"}))
+
+    def test_predictions_past_the_deadline_are_cancelled(self):
+        client = FakeReplicate()
+        manager = self.manager(client)
+        prediction = manager.wait(manager.create("owner/model:v1", "a cat"), max_wait=0.2)
+        self.assertEqual(prediction["status"], "canceled")
+        self.assertIn("Timed out", prediction["error"])
+        self.assertEqual(client.predictions.cancelled, ["p1"])
+
+    def test_one_poller_tracks_many_predictions(self):
+        client = FakeReplicate()
+        manager = self.manager(client)
+        ids = [manager.create("owner/model:v1", f"cat {i}") for i in range(3)]
+        threading.Timer(0.1, manager.handle_webhook, args=({"id": ids[2], "status": "succeeded", "output": ["c"]},)).start()
+        threading.Timer(0.3, manager.handle_webhook, args=({"id": ids[0], "status": "failed", "error": "nsfw"},)).start()
+        finished = manager.iter_completed(ids, max_wait=0.6)
+        self.assertEqual([prediction["id"] for prediction in finished], [ids[2], ids[0], ids[1]])
+        self.assertEqual(client.predictions.cancelled, [ids[1]])
+
+    def test_job_key_reuses_started_predictions(self):
+        client = FakeReplicate()
+        manager = self.manager(client)
+        first = manager.create("owner/model:v1", "a cat", job_key="job-1:0")
+        # A retried job (or a restarted process) asks for the same prediction again.
+        retried = self.manager(client)
+        self.assertEqual(retried.create("owner/model:v1", "a cat", job_key="job-1:0"), first)
+        self.assertNotEqual(retried.create("owner/model:v1", "a dog", job_key="job-1:0"), first)
+        self.assertNotEqual(retried.create("owner/model:v1", "a cat", job_key="job-1:1"), first)
+        retried.handle_webhook({"id": first, "status": "failed", "error": "boom"})
+        self.assertNotEqual(retried.create("owner/model:v1", "a cat", job_key="job-1:0"), first)
+
+if __name__ == '__main__':
+    unittest.main()
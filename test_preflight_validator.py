@@ -0,0 +1,108 @@
+import csv
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from preflight_validator import CatalogCache, PreflightValidator, validate_csv
+
+ROW = {
+    "title": "Galaxy Dog T-Shirt",
+    "description": "A comfy tee.",
+    "blueprint_id": "3",
+    "print_provider_id": "1",
+    "image_id": "img-1",
+    "variants_and_prices": "12158:2499,12159:2499",
+}
+
+class TestPreflightValidator(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.catalog = CatalogCache(cache_path=os.path.join(self.tmpdir.name, "catalog.json"))
+        self.catalog.store(3, 1, [{"id": 12158}, {"id": 12159}, {"id": 12160}])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_valid_row(self):
+        self.assertEqual(PreflightValidator(self.catalog).validate_row(dict(ROW)), [])
+
+    def test_rejects_bad_rows(self):
+        validator = PreflightValidator(self.catalog)
+        validator.validate_row(dict(ROW))
+        errors = validator.validate_row(dict(ROW, image_id="YOUR_IMAGE_ID_1", variants_and_prices="99999:0"))
+        self.assertEqual(len(errors), 4)
+        self.assertIn("Duplicate title", errors[0])
+        self.assertIn("placeholder", errors[1])
+        self.assertIn("outside", errors[2])
+        self.assertIn("[99999]", errors[3])
+
+    def test_failed_catalog_fetch_skips_variant_check_once(self):
+        calls = []
+
+        def fetch(blueprint_id, provider_id):
+            calls.append((blueprint_id, provider_id))
+            return None
+
+        catalog = CatalogCache(cache_path=os.path.join(self.tmpdir.name, "empty.json"), fetch=fetch)
+        validator = PreflightValidator(catalog)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            for i in range(3):
+                self.assertEqual(validator.validate_row(dict(ROW, title=f"Shirt {i}", variants_and_prices="99999:2500")), [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(output.getvalue().count("skipping its variant check"), 1)
+        # Prices are still checked without the catalog.
+        self.assertIn("outside", validator.validate_row(dict(ROW, title="Shirt 4", variants_and_prices="99999:0"))[0])
+
+    def test_concurrent_lookups_share_one_fetch(self):
+        calls = []
+        release = threading.Event()
+
+        def fetch(blueprint_id, provider_id):
+            calls.append((blueprint_id, provider_id))
+            release.wait(5)
+            raise ConnectionError("Connection reset")
+
+        catalog = CatalogCache(cache_path=os.path.join(self.tmpdir.name, "empty.json"), fetch=fetch)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(catalog.variant_ids(3, 1))) for _ in range(4)]
+        with redirect_stdout(io.StringIO()):
+            for thread in threads:
+                thread.start()
+            time.sleep(0.1)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [None] * 4)
+
+    def test_only_valid_rows_claim_their_title(self):
+        validator = PreflightValidator(self.catalog)
+        self.assertIn("placeholder", validator.validate_row(dict(ROW, image_id="YOUR_IMAGE_ID_1"))[0])
+        self.assertEqual(validator.validate_row(dict(ROW)), [])
+        self.assertIn("Duplicate title", validator.validate_row(dict(ROW))[0])
+
+    def test_cache_persists_to_disk(self):
+        reloaded = CatalogCache(cache_path=self.catalog.cache_path)
+        self.assertEqual(reloaded.variant_ids(3, 1), frozenset({12158, 12159, 12160}))
+
+    def test_validate_large_csv_quickly(self):
+        file_path = os.path.join(self.tmpdir.name, "products.csv")
+        with open(file_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(ROW))
+            writer.writeheader()
+            for i in range(100000):
+                writer.writerow(dict(ROW, title=f"Shirt {i}"))
+
+        start = time.monotonic()
+        report = validate_csv(file_path, self.catalog)
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(report["total"], 100000)
+        self.assertEqual(report["invalid"], [])
+
+if __name__ == '__main__':
+    unittest.main()
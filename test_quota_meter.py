@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+from quota_meter import QuotaMeter
+
+class TestQuotaMeter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "usage.db")
+        self.meter = QuotaMeter(self.db_path, flush_interval=3600)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_limited_tier_stops_at_limit(self):
+        results = [self.meter.consume("alice", "free", "seo_optimizations") for _ in range(4)]
+        self.assertEqual(results, [(True, 2), (True, 1), (True, 0), (False, 0)])
+        # Another process sees the same counter.
+        other = QuotaMeter(self.db_path)
+        self.assertEqual(other.consume("alice", "free", "seo_optimizations"), (False, 0))
+        self.assertEqual(other.consume("bob", "free", "seo_optimizations"), (True, 2))
+
+    def test_unlimited_tier_is_counted_in_memory_until_flush(self):
+        for _ in range(5):
+            self.assertEqual(self.meter.consume("carol", "pro", "seo_optimizations"), (True, None))
+        self.assertEqual(self.meter.usage("carol", "seo_optimizations"), 5)
+        self.assertEqual(QuotaMeter(self.db_path).usage("carol", "seo_optimizations"), 0)
+        self.meter.flush()
+        self.assertEqual(QuotaMeter(self.db_path).usage("carol", "seo_optimizations"), 5)
+
+    def test_refund_gives_back_uses(self):
+        for _ in range(3):
+            self.meter.consume("dave", "free", "seo_optimizations")
+        self.meter.refund("dave", "free", "seo_optimizations")
+        self.assertEqual(self.meter.usage("dave", "seo_optimizations"), 2)
+        self.assertEqual(self.meter.consume("dave", "free", "seo_optimizations"), (True, 0))
+        self.meter.consume("erin", "pro", "seo_optimizations")
+        self.meter.refund("erin", "pro", "seo_optimizations")
+        self.assertEqual(self.meter.usage("erin", "seo_optimizations"), 0)
+
+if __name__ == "__main__":
+    unittest.main()
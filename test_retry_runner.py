@@ -0,0 +1,88 @@
+import csv
+import os
+import tempfile
+import threading
+import unittest
+from bulk_pipeline import FailureLog
+from retry_runner import classify_error, run_retry_runner, TRANSIENT, VALIDATION, PERMANENT
+
+FIELDS = ["title", "description", "blueprint_id", "print_provider_id", "image_id", "variants_and_prices", "error"]
+
+class FakeClient:
+    def __init__(self):
+        self.created = []
+
+    def create_product(self, payload):
+        self.created.append(payload["title"])
+        if payload["title"] == "Still Down":
+            return None
+        return {"id": "1", "title": payload["title"]}
+
+class TestRetryRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmpdir.name, "failed_creation_jobs.csv")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _row(self, title, error):
+        return {"title": title, "description": "d", "blueprint_id": "3", "print_provider_id": "1",
+                "image_id": "img", "variants_and_prices": "1:100", "error": error}
+
+    def test_classify_error(self):
+        self.assertEqual(classify_error("API call failed. Response: None"), TRANSIENT)
+        self.assertEqual(classify_error("503 Server Error"), TRANSIENT)
+        self.assertEqual(classify_error("'image_id' column is missing or empty"), VALIDATION)
+        self.assertEqual(classify_error("404 Client Error: Not Found"), PERMANENT)
+        self.assertEqual(classify_error("400 Client Error: Validation failed."), VALIDATION)
+        self.assertEqual(classify_error("422 Unprocessable Entity"), VALIDATION)
+        self.assertEqual(classify_error("Something unexpected happened"), PERMANENT)
+        self.assertEqual(classify_error("HTTP 503 for POST /shops/1/products.json: upstream error"), TRANSIENT)
+        self.assertEqual(classify_error("HTTP 422 for POST /shops/1/products.json: price 500 too low"), VALIDATION)
+        self.assertEqual(classify_error("HTTP 401 for POST /shops/1/products.json: Unauthenticated"), PERMANENT)
+
+    def test_replays_transient_and_rewrites_log(self):
+        with open(self.log_file, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerow(self._row("Recovered", "API call failed. Response: None"))
+            writer.writerow(self._row("Recovered", "API call failed. Response: None"))
+            writer.writerow(self._row("Still Down", "API call failed. Response: None"))
+            writer.writerow(self._row("Bad Row", "'image_id' column is missing or empty"))
+
+        client = FakeClient()
+        result = run_retry_runner("creator", self.log_file, client=client)
+
+        self.assertEqual(sorted(client.created), ["Recovered", "Still Down"])
+        self.assertEqual(result, {"retried": 2, "recovered": 1, "still_failing": 2})
+        with open(self.log_file, newline="", encoding="utf-8") as f:
+            remaining = sorted(row["title"] for row in csv.DictReader(f))
+        self.assertEqual(remaining, ["Bad Row", "Still Down"])
+
+    def test_rewrite_waits_for_an_open_failure_log(self):
+        with open(self.log_file, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerow(self._row("Recovered", "API call failed. Response: None"))
+
+        # A bulk run still appending to the log while the retry runner starts.
+        failure_log = FailureLog(self.log_file)
+        failure_log.write({key: value for key, value in self._row("Late", "").items() if key != "error"},
+                          "API call failed. Response: None")
+        client = FakeClient()
+        results = []
+        retry = threading.Thread(target=lambda: results.append(run_retry_runner("creator", self.log_file, client=client)))
+        retry.start()
+        retry.join(0.2)
+        self.assertTrue(retry.is_alive())
+        failure_log.close()
+        retry.join(5)
+
+        self.assertEqual(sorted(client.created), ["Late", "Recovered"])
+        self.assertEqual(results, [{"retried": 2, "recovered": 2, "still_failing": 0}])
+        self.assertFalse(os.path.exists(self.log_file))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from scheduler import LeaderScheduler, ScheduleLocks, LEADER_LOCK, start_scheduler
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "scheduler.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_one_leader_and_handoff_after_lease_expiry(self):
+        first = LeaderScheduler(ScheduleLocks(self.db_path), jobs=[], leader_lease=0.2)
+        second = LeaderScheduler(ScheduleLocks(self.db_path), jobs=[], leader_lease=0.2)
+        first._heartbeat()
+        second._heartbeat()
+        self.assertTrue(first.is_leader)
+        self.assertFalse(second.is_leader)
+
+        # Renewals keep the lease; once the leader stops renewing, another process takes over.
+        first._heartbeat()
+        self.assertTrue(first.is_leader)
+        time.sleep(0.3)
+        second._heartbeat()
+        first._heartbeat()
+        self.assertTrue(second.is_leader)
+        self.assertFalse(first.is_leader)
+
+        # A clean shutdown hands over immediately.
+        second.locks.release(LEADER_LOCK)
+        first._heartbeat()
+        self.assertTrue(first.is_leader)
+
+    def test_job_lock_prevents_overlap_and_is_renewed(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow_job():
+            calls.append(time.time())
+            started.set()
+            release.wait(5)
+
+        leader = LeaderScheduler(ScheduleLocks(self.db_path), jobs=[])
+        leader.is_leader = True
+        other = LeaderScheduler(ScheduleLocks(self.db_path), jobs=[])
+        other.is_leader = True  # e.g. a new leader right after a hand-over
+        lease = 0.3
+        run = leader._guarded("report", slow_job, {"seconds": 0}, lease)
+        overlapping = other._guarded("report", slow_job, {"seconds": 0}, lease)
+
+        worker = threading.Thread(target=run)
+        worker.start()
+        self.assertTrue(started.wait(5))
+        time.sleep(lease * 2)  # well past the original lease; renewals keep it held
+        overlapping()
+        release.set()
+        worker.join(5)
+
+        self.assertEqual(len(calls), 1)
+        metrics = leader.locks.metrics()["report"]
+        self.assertEqual((metrics["successes"], metrics["skipped"]), (1, 1))
+        # The lock is released once the run finishes.
+        self.assertTrue(other.locks.acquire("job:report", lease))
+
+    def test_start_scheduler_with_injected_jobs(self):
+        scheduler = start_scheduler(jobs=[("report", lambda: None, {"hours": 1}, 0, 60)],
+                                    locks=ScheduleLocks(self.db_path))
+        try:
+            self.assertTrue(scheduler.is_leader)
+            self.assertIsNotNone(scheduler.scheduler.get_job("report"))
+        finally:
+            scheduler.shutdown()
+        self.assertTrue(ScheduleLocks(self.db_path).acquire(LEADER_LOCK, 60))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+import unittest
+from seo_batch import SeoBatch, SeoRunStore
+
+def make_product(i):
+    return {"id": f"p{i}", "title": f"Shirt {i}", "description": "Old", "images": [{"src": f"https://img/{i}.png"}]}
+
+class FakePrintify:
+    def __init__(self, products, page_size=3):
+        self.products = {product["id"]: product for product in products}
+        self.page_size = page_size
+        self.pages_fetched = []
+        self.products_fetched = []
+        self.updates = []
+
+    def get_products_page(self, page, limit):
+        self.pages_fetched.append(page)
+        products = list(self.products.values())
+        start = (page - 1) * self.page_size
+        return {"data": products[start:start + self.page_size], "total": len(products),
+                "last_page": max(1, -(-len(products) // self.page_size))}
+
+    def get_product(self, product_id):
+        self.products_fetched.append(product_id)
+        return self.products.get(product_id)
+
+    def update_product(self, product_id, payload):
+        self.updates.append(product_id)
+        return {"id": product_id}
+
+class FakeGemini:
+    """Rewrites even-numbered products, leaves odd ones as they are, and fails those in `failing`."""
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = 0
+
+    def generate_content_with_image(self, prompt, image_url):
+        self.calls += 1
+        i = int(image_url.rsplit("/", 1)[1].split(".")[0])
+        if i in self.failing:
+            return None
+        if i % 2:
+            return json.dumps({"new_title": f"Shirt {i}", "new_description": "Old"})
+        return json.dumps({"new_title": f"Better Shirt {i}", "new_description": "New"})
+
+class TestSeoBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.runs = SeoRunStore(os.path.join(self.tmpdir.name, "seo.db"))
+        self.printify = FakePrintify([make_product(i) for i in range(1, 8)])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def batch(self, gemini):
+        return SeoBatch(self.runs, concurrency=2, printify_client=self.printify, gemini_client=gemini)
+
+    def test_only_changed_products_are_updated_and_resume_skips_finished(self):
+        run_id = self.runs.create(owner="alice")
+        summary = self.batch(FakeGemini(failing={4})).run(run_id)
+        self.assertEqual((summary["updated"], summary["unchanged"], summary["failed"]), (2, 4, 1))
+        self.assertEqual(sorted(self.printify.updates), ["p2", "p6"])
+
+        gemini = FakeGemini()
+        summary = self.batch(gemini).run(run_id)
+        self.assertEqual((summary["updated"], summary["skipped"], gemini.calls), (1, 6, 1))
+        self.assertEqual(sorted(self.printify.updates), ["p2", "p4", "p6"])
+        self.assertEqual(self.runs.status(run_id)["counts"], {"updated": 3, "unchanged": 4})
+        self.assertEqual(self.runs.status(run_id)["owner"], "alice")
+
+    def test_dry_run_records_without_writing(self):
+        run_id = self.runs.create(title_contains="shirt 2", dry_run=True)
+        summary = self.batch(FakeGemini()).run(run_id)
+        self.assertEqual(summary["updated"], 1)
+        self.assertEqual(self.printify.updates, [])
+
+    def test_product_ids_are_fetched_directly(self):
+        run_id = self.runs.create(product_ids=["p2", "p3", "missing"])
+        summary = self.batch(FakeGemini()).run(run_id)
+        self.assertEqual((summary["updated"], summary["unchanged"], summary["failed"]), (1, 1, 1))
+        self.assertEqual(self.printify.pages_fetched, [])
+        self.assertEqual(sorted(self.printify.products_fetched), ["missing", "p2", "p3"])
+
+    def test_stops_when_quota_runs_out(self):
+        run_id = self.runs.create()
+        remaining = [3]
+
+        def allow():
+            remaining[0] -= 1
+            return remaining[0] >= 0
+        summary = self.batch(FakeGemini()).run(run_id, allow=allow)
+        self.assertEqual(summary["status"], "quota_exceeded")
+        self.assertEqual(summary["updated"] + summary["unchanged"], 3)
+
+if __name__ == '__main__':
+    unittest.main()
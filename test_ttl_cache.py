@@ -0,0 +1,61 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from ttl_cache import TTLCache, FRESH, STALE
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("b"), (None, None))
+        self.assertEqual(cache.get("a"), (1, FRESH))
+
+    def test_stale_value_is_served_while_refreshing(self):
+        cache = TTLCache(ttl=0.05, stale_ttl=60)
+        cache.set("k", "old")
+        time.sleep(0.06)
+        refreshed = threading.Event()
+
+        def loader():
+            refreshed.set()
+            return "new"
+        self.assertEqual(cache.get_or_load("k", loader), "old")
+        self.assertTrue(refreshed.wait(2))
+        for _ in range(100):
+            if cache.get("k") == ("new", FRESH):
+                break
+            time.sleep(0.01)
+        self.assertEqual(cache.get("k"), ("new", FRESH))
+
+    def test_concurrent_misses_load_once_and_failures_are_not_cached(self):
+        cache = TTLCache(ttl=60)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return "value"
+        threads = [threading.Thread(target=cache.get_or_load, args=("k", loader)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(cache.get_or_load("missing", lambda: None))
+        self.assertEqual(cache.get("missing"), (None, None))
+
+    def test_disk_layer_survives_a_new_instance(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "cache.db")
+            TTLCache(ttl=60, disk_path=path, namespace="n").set("k", {"x": 1})
+            self.assertEqual(TTLCache(ttl=60, disk_path=path, namespace="n").get("k"), ({"x": 1}, FRESH))
+            self.assertEqual(TTLCache(ttl=60, disk_path=path, namespace="other").get("k"), (None, None))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+# ttl_cache.py
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+FRESH = "fresh"
+STALE = "stale"
+
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+
+class DiskLayer:
+    """A SQLite key/value table behind the in-memory cache, shared across processes and restarts."""
+    def __init__(self, db_path, namespace):
+        self.db_path = db_path
+        self.namespace = namespace
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        """Creates the cache table on first use."""
+        with self._schema_lock:
+            if not self._schema_ready:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                    "stored_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+                )
+                self._schema_ready = True
+
+    def get(self, key):
+        row = self.connection().execute(
+            "SELECT value, stored_at FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, key, value, stored_at):
+        self.connection().execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, stored_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(value), stored_at),
+        )
+
+    def prune(self, older_than):
+        self.connection().execute("DELETE FROM cache WHERE namespace = ? AND stored_at < ?", (self.namespace, older_than))
+
+
+class TTLCache:
+    """
+    A thread-safe LRU cache whose entries are fresh for `ttl` seconds and may be
+    served stale for a further `stale_ttl` seconds while they are refreshed in the
+    background. Keys are strings; with `disk_path` set, JSON-serializable values
+    are also kept in SQLite so they survive restarts and are shared by processes.
+    """
+    def __init__(self, maxsize=256, ttl=300, stale_ttl=0, disk_path=None, namespace="default"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.disk = DiskLayer(disk_path, namespace) if disk_path else None
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+        self._loading = {}  # key -> Event, so concurrent misses load once
+        self._refreshing = set()
+
+    def _state(self, stored_at, now):
+        age = now - stored_at
+        if age < self.ttl:
+            return FRESH
+        if age < self.ttl + self.stale_ttl:
+            return STALE
+        return None
+
+    def get(self, key):
+        """Returns (value, FRESH|STALE), or (None, None) on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                state = self._state(entry[1], now)
+                if state is not None:
+                    self._entries.move_to_end(key)
+                    return entry[0], state
+                del self._entries[key]
+        if self.disk is not None:
+            stored = self.disk.get(key)
+            if stored is not None:
+                state = self._state(stored[1], now)
+                if state is not None:
+                    self._remember(key, stored[0], stored[1])
+                    return stored[0], state
+        return None, None
+
+    def set(self, key, value):
+        stored_at = time.time()
+        self._remember(key, value, stored_at)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, stored_at)
+            except (TypeError, ValueError, sqlite3.Error) as e:
+                print(f"⚠️ Could not persist cache entry: {e}")
+
+    def _remember(self, key, value, stored_at):
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drops one key (or everything) from memory."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def get_or_load(self, key, loader, cache_if=lambda value: value is not None):
+        """
+        Returns the cached value for `key`, calling `loader()` on a miss.
+        A stale hit is returned immediately and refreshed in the background.
+        Results for which `cache_if(value)` is false (e.g. failed calls) are not cached.
+        """
+        value, state = self.get(key)
+        if state == FRESH:
+            return value
+        if state == STALE:
+            self._refresh_in_background(key, loader, cache_if)
+            return value
+
+        with self._lock:
+            event = self._loading.get(key)
+            leader = event is None
+            if leader:
+                event = self._loading[key] = threading.Event()
+        if not leader:
+            event.wait()
+            value, state = self.get(key)
+            if state is not None:
+                return value
+        try:
+            value = loader()
+            if cache_if(value):
+                self.set(key, value)
+            return value
+        finally:
+            if leader:
+                with self._lock:
+                    self._loading.pop(key, None)
+                event.set()
+
+    def _refresh_in_background(self, key, loader, cache_if):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                value = loader()
+                if cache_if(value):
+                    self.set(key, value)
+            except Exception as e:
+                print(f"⚠️ Background cache refresh failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+        _refresh_executor.submit(refresh)
@@ -9,6 +9,8 @@ from PyQt6.QtCore import Qt
 
 # Import the backend agent
 from seo_agent import SEOAgent
+from image_uploader import ingest_image_folder, write_image_ids_to_csv
+from product_creator import run_bulk_creator
 
 class CreatePage(QWidget):
     """
@@ -147,15 +149,32 @@ class CreatePage(QWidget):
             self.seo_button.setText("✨ Generate SEO Title & Description")
 
     def generate_products(self):
-        """Placeholder for the final product generation logic."""
+        """
+        Uploads any new artwork from the image folder, writes the resolved image IDs
+        into the data CSV, then runs the bulk creator on it.
+        """
+        csv_file = self.csv_input.text()
+        image_folder = self.image_folder_input.text()
+        if not csv_file:
+            print("🚨 Please select a Data CSV File.")
+            return
+
         print("--- Initiating Product Generation ---")
-        print(f"Blueprint ID: {self.blueprint_input.text()}")
-        print(f"Provider ID: {self.provider_input.text()}")
-        print(f"CSV File: {self.csv_input.text()}")
-        print(f"Image Folder: {self.image_folder_input.text()}")
-        print("\n--- Using SEO Content ---")
-        # You can now access the generated content for your next steps
-        print(self.seo_results_display.toPlainText())
+        self.generate_button.setEnabled(False)
+        self.generate_button.setText("Generating...")
+        try:
+            if image_folder:
+                image_ids = ingest_image_folder(image_folder)
+                write_image_ids_to_csv(csv_file, image_ids, defaults={
+                    'blueprint_id': self.blueprint_input.text(),
+                    'print_provider_id': self.provider_input.text(),
+                })
+            run_bulk_creator(csv_file)
+        except Exception as e:
+            print(f"An error occurred: {e}")
+        finally:
+            self.generate_button.setEnabled(True)
+            self.generate_button.setText("🚀 Generate Products")
 
 # This is for standalone testing of the page
 if __name__ == '__main__':
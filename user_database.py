@@ -2,6 +2,8 @@
 
 import json
 import hashlib
+import os
+import threading
 
 class User:
     def __init__(self, username, password, role='user', subscription_tier='free', otp_secret=None):
@@ -20,8 +22,28 @@ class User:
 class UserDB:
     def __init__(self, db_path='users.json'):
         self.db_path = db_path
+        self._lock = threading.Lock()
+        self._loaded_version = self.version()
         self.users = self._load_users()
 
+    def version(self):
+        """A cheap stamp of users.json (mtime and size) that changes on every save, in any process."""
+        try:
+            stat = os.stat(self.db_path)
+        except FileNotFoundError:
+            return (0, 0)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload_if_changed(self):
+        """Reloads users.json if another process (or this one) has saved it since it was read."""
+        version = self.version()
+        if version != self._loaded_version:
+            with self._lock:
+                if version != self._loaded_version:
+                    self.users = self._load_users()
+                    self._loaded_version = version
+        return version
+
     def _load_users(self):
         try:
             with open(self.db_path, 'r') as f:
@@ -31,9 +53,13 @@ class UserDB:
             return {}
 
     def _save_users(self):
-        with open(self.db_path, 'w') as f:
+        # Write-then-rename so other processes never read a half-written file.
+        tmp_path = f"{self.db_path}.tmp"
+        with open(tmp_path, 'w') as f:
             users_data = {username: {'password_hash': user.password_hash, 'role': user.role, 'subscription_tier': user.subscription_tier, 'otp_secret': user.otp_secret} for username, user in self.users.items()}
             json.dump(users_data, f)
+        os.replace(tmp_path, self.db_path)
+        self._loaded_version = self.version()
 
     def add_user(self, username, password, role='user', subscription_tier='free'):
         if username in self.users: